@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Разделы rewards по месяцам и архив завершённых соревнований.
+
+rewards - секционированная таблица (PARTITION BY RANGE (awarded_at)): раздел на каждый
+месяц (rewards_p2025_01) и rewards_default для строк вне созданных разделов. Первичный
+ключ (id, awarded_at), поэтому изменение и удаление награды через ORM затрагивает только
+её раздел. Разделы создаются на REWARD_PARTITION_MONTHS_AHEAD месяцев вперёд при каждом
+старте (apply_schema) и командой ниже.
+
+Месяцы, в которых не осталось наград, учитываемых в total_points (награды текущих
+соревнований пользователей), отсоединяются в схему archive за O(1): DETACH PARTITION и
+SET SCHEMA не копируют строки.
+
+Задачи секционировать нельзя без смены ключей task_tags, поэтому при переводе пользователя
+в другое соревнование его задачи одним запросом переносятся в tasks_archive (archive_user_tasks).
+
+    python archive.py                      - создать разделы на месяцы вперёд
+    python archive.py --archive            - отсоединить неиспользуемые месяцы в схему archive
+    python archive.py --archive --before 2025-06   - не трогать месяцы начиная с июня 2025
+"""
+import os
+import argparse
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+REWARD_PARTITION_MONTHS_AHEAD = int(os.getenv("REWARD_PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_SCHEMA = "archive"
+
+logger = logging.getLogger("archive")
+
+_ARCHIVE_TASKS = """
+    WITH moved AS (
+        DELETE FROM tasks WHERE user_id = :user_id
+        RETURNING *
+    ), moved_tags AS (
+        DELETE FROM task_tags tt USING moved WHERE tt.task_id = moved.id
+        RETURNING tt.task_id, tt.tag_id
+    )
+    INSERT INTO tasks_archive (
+        id, user_id, competition_id, status_id, title, description, ai_analysis_metadata,
+        estimated_points, awarded_points, due_date, completed_at, created_at, updated_at, tag_ids
+    )
+    SELECT m.id, m.user_id, :competition_id, m.status_id, m.title, m.description, m.ai_analysis_metadata,
+           m.estimated_points, m.awarded_points, m.due_date, m.completed_at, m.created_at, m.updated_at,
+           COALESCE((SELECT array_agg(mt.tag_id ORDER BY mt.tag_id) FROM moved_tags mt WHERE mt.task_id = m.id), '{}')
+    FROM moved m
+"""
+
+# Самый ранний месяц, в котором есть награды, ещё учитываемые в total_points
+_OLDEST_LIVE_REWARD = """
+    SELECT min(r.awarded_at)
+    FROM rewards r
+    JOIN users u ON u.id = r.user_id AND r.competition_id IS NOT DISTINCT FROM u.cur_comp
+"""
+
+
+def month_start(moment) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"rewards_p{month.year}_{month.month:02d}"
+
+
+def _month_of_partition(name: str) -> date:
+    year, month = name[len("rewards_p"):].split("_")
+    return date(int(year), int(month), 1)
+
+
+def reward_partitions(conn) -> list:
+    """Месячные разделы rewards (без rewards_default), по возрастанию."""
+    names = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'rewards'::regclass AND c.relname LIKE 'rewards\\_p%'
+    """)).scalars()
+    return sorted(names)
+
+
+def ensure_reward_partitions(conn, first: date, last: date):
+    """
+    Создаёт месячные разделы с first по last включительно. Строки этих месяцев, уже
+    попавшие в rewards_default, переносятся в новый раздел до его подключения.
+    """
+    conn.execute(text("CREATE TABLE IF NOT EXISTS rewards_default PARTITION OF rewards DEFAULT"))
+    existing = set(reward_partitions(conn))
+    month = first
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            bounds = {"start": month, "end": add_months(month, 1)}
+            conn.execute(text(f"CREATE TABLE {name} (LIKE rewards INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            conn.execute(text(f"""
+                WITH moved AS (
+                    DELETE FROM rewards_default WHERE awarded_at >= :start AND awarded_at < :end
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """), bounds)
+            conn.execute(text(
+                f"ALTER TABLE rewards ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+            ))
+        month = add_months(month, 1)
+
+
+# Соревнование наград, записанных до появления rewards.competition_id (один раз при добавлении колонки)
+_BACKFILL_COMPETITIONS = """
+    UPDATE {table} r SET competition_id = u.cur_comp
+    FROM users u
+    WHERE r.user_id = u.id AND r.competition_id IS NULL
+"""
+
+
+def migrate_unpartitioned_rewards(conn) -> bool:
+    """
+    Переименовывает обычную таблицу rewards (до секционирования), чтобы create_all создал
+    секционированную. Возвращает True, если данные нужно перенести (copy_unpartitioned_rewards).
+    """
+    kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('public.rewards')")).scalar()
+    if kind != "r":
+        return False
+    conn.execute(text("ALTER TABLE rewards RENAME TO rewards_unpartitioned"))
+    conn.execute(text("ALTER TABLE rewards_unpartitioned RENAME CONSTRAINT rewards_pkey TO rewards_unpartitioned_pkey"))
+    conn.execute(text("ALTER SEQUENCE IF EXISTS rewards_id_seq RENAME TO rewards_unpartitioned_id_seq"))
+    conn.execute(text("ALTER INDEX IF EXISTS ix_rewards_user_id RENAME TO ix_rewards_unpartitioned_user_id"))
+    return True
+
+
+def copy_unpartitioned_rewards(conn):
+    """Переносит награды из rewards_unpartitioned в секционированную rewards и удаляет старую таблицу."""
+    has_competition = conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = 'public' "
+        "AND table_name = 'rewards_unpartitioned' AND column_name = 'competition_id')"
+    )).scalar()
+    if not has_competition:
+        # Награды из версий без competition_id входили в total_points текущего соревнования пользователя
+        conn.execute(text("ALTER TABLE rewards_unpartitioned ADD COLUMN competition_id INTEGER"))
+        conn.execute(text(_BACKFILL_COMPETITIONS.format(table="rewards_unpartitioned")))
+    bounds = conn.execute(text("SELECT min(awarded_at), max(awarded_at) FROM rewards_unpartitioned")).first()
+    if bounds[0] is not None:
+        ensure_reward_partitions(conn, month_start(bounds[0]), month_start(bounds[1]))
+    conn.execute(text("""
+        INSERT INTO rewards (id, user_id, type_id, points_amount, awarded_at, reason, competition_id)
+        SELECT id, user_id, type_id, points_amount, awarded_at, reason, competition_id FROM rewards_unpartitioned
+    """))
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('rewards', 'id'), COALESCE((SELECT max(id) FROM rewards), 0) + 1, false)"
+    ))
+    conn.execute(text("DROP TABLE rewards_unpartitioned"))
+
+
+def ensure_upcoming_partitions(conn, today: Optional[date] = None):
+    month = month_start(today or datetime.utcnow())
+    ensure_reward_partitions(conn, month, add_months(month, REWARD_PARTITION_MONTHS_AHEAD))
+
+
+def archive_reward_partitions(conn, before: Optional[date] = None) -> list:
+    """
+    Отсоединяет месячные разделы, в которых нет наград, учитываемых в total_points, и
+    переносит их в схему archive. before ограничивает архивацию месяцами раньше него.
+    Возвращает имена перенесённых разделов.
+    """
+    oldest_live = conn.execute(text(_OLDEST_LIVE_REWARD)).scalar()
+    cutoff = month_start(oldest_live) if oldest_live else month_start(datetime.utcnow())
+    if before:
+        cutoff = min(cutoff, month_start(before))
+
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    archived = []
+    for name in reward_partitions(conn):
+        if _month_of_partition(name) >= cutoff:
+            break
+        conn.execute(text(f"ALTER TABLE rewards DETACH PARTITION {name}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        archived.append(name)
+    return archived
+
+
+def archive_user_tasks(db: Session, user_id: int, competition_id: Optional[int]) -> int:
+    """
+    Переносит все задачи пользователя (с тегами) в tasks_archive одним запросом, помечая
+    соревнованием, в котором они были созданы. commit делает вызывающий код.
+    """
+    return db.execute(text(_ARCHIVE_TASKS), {"user_id": user_id, "competition_id": competition_id}).rowcount
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    parser = argparse.ArgumentParser(description="Разделы rewards и архив завершённых соревнований")
+    parser.add_argument("--archive", action="store_true", help="отсоединить неиспользуемые месяцы в схему archive")
+    parser.add_argument("--before", help="архивировать только месяцы раньше указанного (ГГГГ-ММ)")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        ensure_upcoming_partitions(conn)
+        if args.archive:
+            before = datetime.strptime(args.before, "%Y-%m").date() if args.before else None
+            archived = archive_reward_partitions(conn, before)
+            print(f"Перенесено в схему {ARCHIVE_SCHEMA}: {', '.join(archived) or 'нет разделов'}")
+    print(f"Разделы rewards: созданы на {REWARD_PARTITION_MONTHS_AHEAD} мес. вперёд")
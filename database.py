@@ -1,15 +1,33 @@
+import os
+import time
+import logging
+
 from sqlalchemy import (
-    Column, String, Integer, Text, ForeignKey, JSON, DateTime, text
+    Column, String, Integer, BigInteger, Float, Text, ForeignKey, JSON, Date, DateTime, Computed, LargeBinary, text
 )
+from sqlalchemy.dialects.postgresql import insert, ARRAY, TSVECTOR
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 
+import archive
 from auth import get_password_hash
 from db import engine
 from sqlalchemy.orm import Session
 
 Base = declarative_base()
 
+logger = logging.getLogger("db")
+
+# Поисковые векторы (см. search.py): вычисляются Postgres при каждой записи строки
+USER_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(email, '')), 'B')"
+)
+TASK_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -22,6 +40,7 @@ class User(Base):
     cur_comp = Column(Integer, ForeignKey("competitions.id"), nullable=True)
     created_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
     updated_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"), onupdate=text("CURRENT_TIMESTAMP"))
+    search_vector = deferred(Column(TSVECTOR, Computed(USER_SEARCH_VECTOR, persisted=True)))
     #boards = relationship("Board", back_populates="user")
     tasks = relationship("Task", back_populates="user")
     #categories = relationship("Category", back_populates="user")
@@ -71,6 +90,7 @@ class Task(Base):
     completed_at = Column(DateTime)
     created_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
     updated_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"), onupdate=text("CURRENT_TIMESTAMP"))
+    search_vector = deferred(Column(TSVECTOR, Computed(TASK_SEARCH_VECTOR, persisted=True)))
     user = relationship("User", back_populates="tasks")
     #board = relationship("Board", back_populates="tasks")
     status = relationship("TaskStatus")
@@ -86,155 +106,258 @@ class RewardType(Base):
     rewards = relationship("Reward", back_populates="type")
 
 class Reward(Base):
+    """Секционирована по месяцам awarded_at (см. archive.py): ключ включает awarded_at."""
     __tablename__ = "rewards"
+    __table_args__ = {"postgresql_partition_by": "RANGE (awarded_at)"}
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     type_id = Column(Integer, ForeignKey("reward_types.id"), nullable=False)
     points_amount = Column(Integer, nullable=False)
-    awarded_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    awarded_at = Column(DateTime, primary_key=True, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
     reason = Column(Text)
+    # Соревнование, в котором начислена награда: total_points обнуляется при смене соревнования
+    competition_id = Column(Integer, ForeignKey("competitions.id", ondelete="SET NULL"), nullable=True)
     user = relationship("User", back_populates="rewards")
     type = relationship("RewardType", back_populates="rewards")
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+class LeaderboardSnapshot(Base):
+    """Рейтинг соревнования на момент taken_at (только добавление, см. leaderboard_history.py)."""
+    __tablename__ = "leaderboard_snapshots"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    competition_id = Column(Integer, ForeignKey("competitions.id", ondelete="CASCADE"), nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+    # Участники по местам: user_ids[i] занимает место i + 1 с points[i] баллами
+    user_ids = Column(ARRAY(Integer), nullable=False)
+    points = Column(ARRAY(Integer), nullable=False)
+
+class TaskArchive(Base):
+    """Задачи прошлых соревнований пользователя (только добавление, см. archive.archive_user_tasks)."""
+    __tablename__ = "tasks_archive"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    competition_id = Column(Integer, ForeignKey("competitions.id", ondelete="SET NULL"), nullable=True)
+    status_id = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)
+    description = Column(Text)
+    ai_analysis_metadata = Column(JSON)
+    estimated_points = Column(Integer)
+    awarded_points = Column(Integer)
+    due_date = Column(DateTime)
+    completed_at = Column(DateTime)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    tag_ids = Column(ARRAY(Integer), nullable=False, server_default=text("'{}'"))
+    archived_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+
+class IdempotencyKey(Base):
+    """Idempotency-Key запроса пользователя и сохранённый ответ (см. idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    # in_progress - запрос выполняется, completed - ответ сохранён
+    status = Column(String(16), nullable=False)
+    response_status = Column(Integer)
+    response_body = Column(LargeBinary)
+    response_content_type = Column(String)
+    created_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class AIResult(Base):
+    """Результат вызова AI, общий для воркеров на короткое время (см. ml/singleflight.py)."""
+    __tablename__ = "ai_results"
+    key = Column(String(64), primary_key=True)
+    kind = Column(String(32), nullable=False)
+    # pending - вызов выполняется ведущим воркером, done - результат записан
+    status = Column(String(16), nullable=False)
+    result = Column(JSON)
+    created_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class AIRateBucket(Base):
+    """Token bucket запросов к AI в минуту: пользователя (user:<id>) или общий (global), см. rate_limit.py."""
+    __tablename__ = "ai_rate_buckets"
+    key = Column(String(64), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class AIUsage(Base):
+    """Расход AI пользователя за день: запросы к AI-эндпоинтам, вызовы модели и токены Yandex."""
+    __tablename__ = "ai_usage"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    requests = Column(Integer, nullable=False, default=0)
+    llm_calls = Column(Integer, nullable=False, default=0)
+    tokens = Column(BigInteger, nullable=False, default=0)
+
+# Ключ advisory lock, под которым реплики по очереди применяют схему
+SCHEMA_LOCK_ID = 72_001
+
+# Идемпотентные миграции схемы, выполняются после create_all при каждом старте
+MIGRATIONS = [
+    "CREATE INDEX IF NOT EXISTS ix_tasks_user_id ON tasks (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_rewards_user_id ON rewards (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_cur_comp_points ON users (cur_comp, total_points DESC)",
+    # Награды до появления competition_id входили в total_points текущего соревнования пользователя
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = 'public'
+                       AND table_name = 'rewards' AND column_name = 'competition_id') THEN
+            ALTER TABLE rewards ADD COLUMN competition_id INTEGER REFERENCES competitions (id) ON DELETE SET NULL;
+            UPDATE rewards r SET competition_id = u.cur_comp FROM users u WHERE r.user_id = u.id;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_leaderboard_snapshots_comp_taken ON leaderboard_snapshots (competition_id, taken_at DESC)",
+    # Полнотекстовый и нечёткий поиск (search.py)
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"ALTER TABLE users ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({USER_SEARCH_VECTOR}) STORED",
+    f"ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({TASK_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_users_search ON users USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING GIN (first_name gin_trgm_ops, last_name gin_trgm_ops, email gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search ON tasks USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_title_trgm ON tasks USING GIN (title gin_trgm_ops)",
+]
+
+TASK_STATUSES = [
+    {"code": "todo", "name": "К выполнению"},
+    {"code": "in_progress", "name": "В работе"},
+    {"code": "done", "name": "Выполнено"},
+]
+
+TAGS = [
+    {"name": "несрочно"},
+    {"name": "срочно"},
+    {"name": "очень срочно"},
+]
+
+REWARD_TYPES = [
+    {"code": "bonus1", "name": "bonus1"},
+    {"code": "bonus2", "name": "bonus2"},
+    {"code": "bonus3", "name": "bonus3"},
+]
+
+# Демо-данные, создаются только при SEED_DEMO_DATA=true
+DEMO_USERS = [
+    {"first_name": "admin", "last_name": "admin", "email": "admin@admin.com",
+     "password": "maximadmin", "total_points": 52, "role": "admin"},
+    {"first_name": "u1_name", "last_name": "u1_lastname", "email": "u1@user.com",
+     "password": "rost_user", "total_points": 228, "role": "user"},
+    {"first_name": "u2_name", "last_name": "u2_lastname", "email": "u2@user.com",
+     "password": "rost_user", "total_points": 42, "role": "user"},
+    {"first_name": "sss", "last_name": "ssss", "email": "sss@ss.s",
+     "password": "999999", "total_points": 32, "role": "admin"},
+    {"first_name": "Анна", "last_name": "Иванова", "email": "manager@work.com",
+     "password": "999999", "total_points": 150, "role": "manager"},
+    {"first_name": "Дмитрий", "last_name": "Сидоров", "email": "dmitry@work.com",
+     "password": "999999", "total_points": 180, "role": "user"},
+    {"first_name": "Елена", "last_name": "Петрова", "email": "elena@work.com",
+     "password": "password123", "total_points": 210, "role": "user"},
+    {"first_name": "Михаил", "last_name": "Козлов", "email": "mikhail@work.com",
+     "password": "password123", "total_points": 95, "role": "user"},
+    {"first_name": "Ольга", "last_name": "Смирнова", "email": "olga@work.com",
+     "password": "password123", "total_points": 300, "role": "user"},
+    {"first_name": "Сергей", "last_name": "Волков", "email": "sergey@work.com",
+     "password": "password123", "total_points": 110, "role": "user"},
+]
+
+DEMO_COMPETITIONS = [
+    {"title": "Ирниту марафон 2025", "start_date": "2025-06-01 00:00:00", "end_date": "2025-08-31 23:59:59"},
+    {"title": "Кучка умников", "start_date": "2025-01-15 00:00:00", "end_date": "2025-03-15 23:59:59"},
+    {"title": "Майский марафон", "start_date": "2025-04-20 00:00:00", "end_date": "2025-05-31 23:59:59"},
+]
+
+
+def apply_schema():
+    """
+    Создаёт таблицы, разделы rewards на ближайшие месяцы и применяет MIGRATIONS под advisory lock.
+    Одновременно стартующие реплики выполняют DDL по очереди, а не наперегонки.
+    Несекционированная rewards из прошлых версий переносится в секционированную один раз.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": SCHEMA_LOCK_ID})
+        legacy_rewards = archive.migrate_unpartitioned_rewards(conn)
+        Base.metadata.create_all(bind=conn)
+        if legacy_rewards:
+            archive.copy_unpartitioned_rewards(conn)
+        archive.ensure_upcoming_partitions(conn)
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+
+
+def _upsert_reference_data(db: Session):
+    """Добавляет недостающие статусы, теги и типы наград, не трогая существующие."""
+    db.execute(insert(TaskStatus).values(TASK_STATUSES).on_conflict_do_nothing(index_elements=["code"]))
+    db.execute(insert(Tag).values(TAGS).on_conflict_do_nothing(index_elements=["name"]))
+    db.execute(insert(RewardType).values(REWARD_TYPES).on_conflict_do_nothing(index_elements=["code"]))
+    db.commit()
+
+
+def _seed_demo_data(db: Session):
+    """
+    Создаёт демо-пользователей и соревнования, которых ещё нет в базе.
+    Пароли хэшируются только для отсутствующих пользователей, каждый уникальный пароль один раз.
+    Баллы демо-пользователя записываются наградой его текущего соревнования, чтобы total_points
+    сходился с rewards при сверке (ledger.py).
+    """
+    existing_emails = {email for (email,) in db.query(User.email).filter(
+        User.email.in_([u["email"] for u in DEMO_USERS])
+    )}
+    hashes = {}
+    rows = []
+    for demo_user in DEMO_USERS:
+        if demo_user["email"] in existing_emails:
+            continue
+        password = demo_user["password"]
+        if password not in hashes:
+            hashes[password] = get_password_hash(password)
+        row = {key: value for key, value in demo_user.items() if key != "password"}
+        row["password_hash"] = hashes[password]
+        rows.append(row)
+    if rows:
+        created = db.execute(
+            insert(User).values(rows).on_conflict_do_nothing(index_elements=["email"])
+            .returning(User.id, User.total_points, User.cur_comp)
+        ).all()
+        type_id = db.query(RewardType.id).filter(RewardType.code == REWARD_TYPES[0]["code"]).scalar()
+        rewards = [
+            {"user_id": user_id, "type_id": type_id, "points_amount": points,
+             "reason": "Демо-данные", "competition_id": cur_comp}
+            for user_id, points, cur_comp in created if points
+        ]
+        if rewards:
+            db.execute(insert(Reward).values(rewards))
+
+    existing_titles = {title for (title,) in db.query(Competition.title)}
+    competitions = [c for c in DEMO_COMPETITIONS if c["title"] not in existing_titles]
+    if competitions:
+        db.execute(insert(Competition).values(competitions))
+    db.commit()
+
+
+def init_db() -> dict:
+    """
+    Идемпотентная инициализация базы: схема, справочники и (опционально) демо-данные.
+    Существующие данные не удаляются, поэтому повторный запуск контейнера безопасен.
+    Возвращает длительность этапов в миллисекундах.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    apply_schema()
+    timings["schema_ms"] = (time.perf_counter() - started) * 1000
+
+    stage_started = time.perf_counter()
     with Session(engine) as db:
-        db.execute(text("TRUNCATE TABLE users, reward_types, tasks, task_status, tags, task_tags, rewards, competitions RESTART IDENTITY CASCADE;"))
-        db.commit()
-
-        if not db.query(TaskStatus).first():
-            statuses = [
-                TaskStatus(code="todo", name="К выполнению"),
-                TaskStatus(code="in_progress", name="В работе"),
-                TaskStatus(code="done", name="Выполнено")
-            ]
-            db.add_all(statuses)
-            db.commit()
-
-        if not db.query(Tag).first():
-            tag = [
-                Tag(name="несрочно"),
-                Tag(name="срочно"),
-                Tag(name="очень срочно")
-            ]
-            db.add_all(tag)
-            db.commit()
-
-        if not db.query(User).first():
-            users = [
-                User(
-              first_name="admin",
-                    last_name="admin",
-                    email="admin@admin.com",
-                    password_hash=get_password_hash("maximadmin"),
-                    total_points=52,
-                    role="admin"
-                ),
-                User(
-                    first_name="u1_name",
-                    last_name="u1_lastname",
-                    email="u1@user.com",
-                    password_hash=get_password_hash("rost_user"),
-                    total_points=228,
-                    role="user"
-                ),
-                User(
-                    first_name="u2_name",
-                    last_name="u2_lastname",
-                    email="u2@user.com",
-                    password_hash=get_password_hash("rost_user"),
-                    total_points=42,
-                    role="user"
-                ),
-                User(
-                    first_name="sss",
-                    last_name="ssss",
-                    email="sss@ss.s",
-                    password_hash=get_password_hash("999999"),
-                    total_points=32,
-                    role="admin"
-                ),
-                # Добавленные пользователи
-                User(
-                    first_name="Анна",
-                    last_name="Иванова",
-                    email="manager@work.com",
-                    password_hash=get_password_hash("999999"),
-                    total_points=150,
-                    role="manager"
-                ),
-                User(
-                    first_name="Дмитрий",
-                    last_name="Сидоров",
-                    email="dmitry@work.com",
-                    password_hash=get_password_hash("999999"),
-                    total_points=180,
-                    role="user"
-                ),
-                User(
-                    first_name="Елена",
-                    last_name="Петрова",
-                    email="elena@work.com",
-                    password_hash=get_password_hash("password123"),
-                    total_points=210,
-                    role="user"
-                ),
-                User(
-                    first_name="Михаил",
-                    last_name="Козлов",
-                    email="mikhail@work.com",
-                    password_hash=get_password_hash("password123"),
-                    total_points=95,
-                    role="user"
-                ),
-                User(
-                    first_name="Ольга",
-                    last_name="Смирнова",
-                    email="olga@work.com",
-                    password_hash=get_password_hash("password123"),
-                    total_points=300,
-                    role="user"
-                ),
-                User(
-                    first_name="Сергей",
-                    last_name="Волков",
-                    email="sergey@work.com",
-
-                    password_hash=get_password_hash("password123"),
-                    total_points=110,
-                    role="user"
-                )
-            ]
-            db.add_all(users)
-            db.commit()
-
-            reward_types = [
-                RewardType(code="bonus1", name="bonus1"),
-                RewardType(code="bonus2", name="bonus2"),
-                RewardType(code="bonus3", name="bonus3"),
-            ]
-            db.add_all(reward_types)
-            db.commit()
-
-            if not db.query(Competition).first():
-                competitions = [
-                    Competition(
-                        title="Ирниту марафон 2025",
-                        start_date="2025-06-01 00:00:00",
-                        end_date="2025-08-31 23:59:59"
-                    ),
-                    Competition(
-                        title="Кучка умников",
-                        start_date="2025-01-15 00:00:00",
-                        end_date="2025-03-15 23:59:59"
-                    ),
-                    Competition(
-                        title="Майский марафон",
-                        start_date="2025-04-20 00:00:00",
-                        end_date="2025-05-31 23:59:59"
-                    )
-                ]
-                db.add_all(competitions)
-                db.commit()
+        _upsert_reference_data(db)
+        timings["reference_ms"] = (time.perf_counter() - stage_started) * 1000
 
+        if os.getenv("SEED_DEMO_DATA", "false").lower() == "true":
+            stage_started = time.perf_counter()
+            _seed_demo_data(db)
+            timings["demo_ms"] = (time.perf_counter() - stage_started) * 1000
 
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    logger.info("init_db: %s", ", ".join(f"{name}={value:.0f}" for name, value in timings.items()))
+    return timings
@@ -1,23 +1,50 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 import os
+import sys
+import time
+import logging
+import itertools
+import threading
+from collections import Counter
+from http.cookies import SimpleCookie
+from contextvars import ContextVar
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
 TESTING = os.getenv("TESTING", "False").lower() == "true"
+# В режиме отладки ответы получают заголовки X-DB-Queries и Server-Timing
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+# Запросы дольше порога (мс) пишутся в лог медленных запросов
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# Сколько одинаковых шаблонов запроса за один HTTP-запрос считать вероятным N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "3"))
+# Реплики для чтения: DB_REPLICA_HOSTS=replica1:5432,replica2:5432 (пользователь, пароль и база как у основной)
+REPLICA_HOSTS = [host.strip() for host in os.getenv("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+# Как часто (с) можно спрашивать реплику о её позиции WAL, пока она отстаёт от записи клиента
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "0.5"))
+# Cookie с позицией WAL последней записи клиента и время её жизни (с)
+LSN_COOKIE = "db_lsn"
+LSN_COOKIE_SECONDS = int(os.getenv("DB_LSN_COOKIE_SECONDS", "60"))
 
 if TESTING:
     DB_NAME = os.getenv("DB_NAME_TEST", "tests")
 else:
     DB_NAME = os.getenv("DB_NAME", "Database")
 
-DATABASE_URL = (
-    f"postgresql://{os.getenv('DB_USER')}:"
-    f"{os.getenv('DB_PASSWORD')}@"
-    f"{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/"
-    f"{DB_NAME}"
-)
+
+def _database_url(host_port: str) -> str:
+    return (
+        f"postgresql://{os.getenv('DB_USER')}:"
+        f"{os.getenv('DB_PASSWORD')}@"
+        f"{host_port}/"
+        f"{DB_NAME}"
+    )
+
+
+DATABASE_URL = _database_url(f"{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}")
 
 engine = create_engine(
     DATABASE_URL,
@@ -26,10 +53,211 @@ engine = create_engine(
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Сессии только для чтения; движок (основная база или реплика) выбирает get_read_db
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+logger = logging.getLogger("db")
+
+
+def parse_lsn(value: str) -> int:
+    """Позиция WAL вида '16/B374D848' в число для сравнения."""
+    high, low = value.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class Replica:
+    """Реплика для чтения и последняя известная позиция воспроизведения WAL."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._replay_lsn = -1
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def caught_up(self, min_lsn: int) -> bool:
+        """Воспроизвела ли реплика WAL до min_lsn; позиция переспрашивается не чаще REPLICA_LAG_CHECK_SECONDS."""
+        if self._replay_lsn >= min_lsn:
+            return True
+        if time.monotonic() - self._checked_at < REPLICA_LAG_CHECK_SECONDS or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked_at = time.monotonic()
+            with self.engine.connect() as conn:
+                lsn = conn.execute(text("SELECT pg_last_wal_replay_lsn()::text")).scalar()
+            # NULL - сервер не в режиме восстановления (не реплика), отставания нет
+            self._replay_lsn = parse_lsn(lsn) if lsn else sys.maxsize
+        except Exception as e:
+            logger.warning("Реплика %s недоступна: %s", self.engine.url.host, e)
+        finally:
+            self._lock.release()
+        return self._replay_lsn >= min_lsn
+
+
+replicas = [Replica(create_engine(_database_url(host), pool_pre_ping=True, echo=False)) for host in REPLICA_HOSTS]
+_replica_counter = itertools.count()
+
+
+class RequestQueryStats:
+    """Статистика SQL-запросов в рамках одного HTTP-запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.templates = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.templates[statement] += 1
+
+    def repeated_templates(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        """Шаблоны, выполненные не менее threshold раз: вероятный N+1."""
+        return [(statement, count) for statement, count in self.templates.items() if count >= threshold]
+
+
+# Статистика текущего HTTP-запроса; задаётся middleware, недоступна вне запроса
+request_query_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+class ReadConsistency:
+    """Позиции WAL текущего HTTP-запроса: минимальная для чтения (из cookie) и после его записи."""
+
+    def __init__(self, min_lsn: Optional[int]):
+        self.min_lsn = min_lsn
+        self.commit_lsn = None
+
+
+# Задаётся ReadYourWritesMiddleware, только если настроены реплики
+request_consistency: ContextVar[Optional[ReadConsistency]] = ContextVar("request_consistency", default=None)
+
+
+def _parameter_shape(parameters):
+    """Типы связанных параметров без значений, чтобы не писать в лог персональные данные."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"{len(parameters)} x {_parameter_shape(parameters[0])}"
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    stats = request_query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Медленный запрос %.1f мс: %s | параметры: %s",
+            elapsed * 1000, " ".join(statement.split()), _parameter_shape(parameters)
+        )
+
+
+for _engine in [engine] + [replica.engine for replica in replicas]:
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _detect_writes(session):
+    if request_consistency.get() is None:
+        return
+    # До commit изменения ORM могут быть ещё не отправлены; иначе проверяем, получила ли транзакция txid
+    session.info["wrote"] = bool(session.new or session.dirty or session.deleted) or session.execute(
+        text("SELECT txid_current_if_assigned() IS NOT NULL")
+    ).scalar()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_commit_lsn(session):
+    consistency = request_consistency.get()
+    if consistency is None or not session.info.pop("wrote", False):
+        return
+    # Позиция после commit: реплика, воспроизведшая WAL до неё, уже видит запись
+    with engine.connect() as conn:
+        consistency.commit_lsn = conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+
+
+def read_engine(min_lsn: Optional[int] = None):
+    """Реплика по кругу, пропуская отстающие от min_lsn; основная база, если подходящей реплики нет."""
+    if not replicas:
+        return engine
+    start = next(_replica_counter)
+    for offset in range(len(replicas)):
+        replica = replicas[(start + offset) % len(replicas)]
+        if min_lsn is None or replica.caught_up(min_lsn):
+            return replica.engine
+    return engine
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Сессия для GET-эндпоинтов: реплика, которая уже видит последние записи клиента, или основная база."""
+    consistency = request_consistency.get()
+    db = ReadSessionLocal(bind=read_engine(consistency.min_lsn if consistency else None))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _lsn_from_headers(headers) -> Optional[int]:
+    """Позиция из заголовка X-DB-LSN или cookie db_lsn запроса."""
+    value = None
+    for name, raw in headers:
+        if name == b"x-db-lsn":
+            value = raw.decode("latin-1")
+        elif name == b"cookie" and value is None:
+            morsel = SimpleCookie(raw.decode("latin-1")).get(LSN_COOKIE)
+            value = morsel.value if morsel else None
+    try:
+        return parse_lsn(value) if value else None
+    except ValueError:
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Чтение своих записей при репликах: после запроса с записью клиент получает позицию WAL
+    (cookie db_lsn и заголовок X-DB-LSN), и пока она действует, get_read_db отправляет его
+    чтения только на реплики, которые до неё дошли. Без реплик middleware ничего не делает.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas:
+            await self.app(scope, receive, send)
+            return
+
+        consistency = ReadConsistency(_lsn_from_headers(scope["headers"]))
+        token = request_consistency.set(consistency)
+
+        async def send_with_lsn(message):
+            if message["type"] == "http.response.start" and consistency.commit_lsn:
+                lsn = consistency.commit_lsn
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-lsn", lsn.encode()))
+                headers.append((b"set-cookie", (
+                    f"{LSN_COOKIE}={lsn}; Max-Age={LSN_COOKIE_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                ).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_lsn)
+        finally:
+            request_consistency.reset(token)
@@ -9,11 +9,11 @@ export const useApi = () => {
     const url = endpoint.startsWith('http') ? endpoint : `${API_BASE_URL}${endpoint}`;
 
     const config = {
+      ...options,
       headers: {
         'Content-Type': 'application/json',
         ...options.headers
-      },
-      ...options
+      }
     };
 
     if (token) {
@@ -54,9 +54,30 @@ export const useApi = () => {
     }
   };
 
+  // POST с Idempotency-Key: при обрыве связи запрос повторяется с тем же ключом,
+  // и сервер возвращает уже готовый ответ вместо повторного вызова AI
+  const postIdempotent = async (endpoint, body, retries = 2) => {
+    const key = crypto.randomUUID();
+    for (let attempt = 0; ; attempt++) {
+      try {
+        return await request(endpoint, {
+          method: 'POST',
+          body: JSON.stringify(body),
+          headers: { 'Idempotency-Key': key }
+        });
+      } catch (error) {
+        if (attempt >= retries || error.message !== 'Нет подключения к серверу') {
+          throw error;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+      }
+    }
+  };
+
   return {
     get: (endpoint) => request(endpoint, { method: 'GET' }),
     post: (endpoint, body) => request(endpoint, { method: 'POST', body: JSON.stringify(body) }),
+    postIdempotent,
     put: (endpoint, body) => request(endpoint, { method: 'PUT', body: JSON.stringify(body) }),
     delete: (endpoint) => request(endpoint, { method: 'DELETE' })
   };
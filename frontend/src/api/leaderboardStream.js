@@ -0,0 +1,32 @@
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || '';
+
+// Применяет diff к рейтингу: строки с новым местом или баллами заменяются, ушедшие удаляются
+export const applyLeaderboardDiff = (rows, diff) => {
+  const byId = new Map(rows.map((row) => [row.user_id, row]));
+  diff.removed.forEach((userId) => byId.delete(userId));
+  diff.changed.forEach((row) => byId.set(row.user_id, row));
+  return [...byId.values()].sort((a, b) => a.rank - b.rank);
+};
+
+// Подписка на GET /leaderboard/{id}/stream (SSE): onRows получает весь рейтинг после каждого изменения.
+// Возвращает функцию отписки; EventSource сам переподключается и получает свежий снимок.
+export const subscribeLeaderboard = (competitionId, onRows) => {
+  if (typeof EventSource === 'undefined') {
+    return () => {};
+  }
+
+  let rows = [];
+  const source = new EventSource(`${API_BASE_URL}/leaderboard/${competitionId}/stream`);
+
+  source.addEventListener('snapshot', (event) => {
+    rows = JSON.parse(event.data);
+    onRows(rows);
+  });
+
+  source.addEventListener('diff', (event) => {
+    rows = applyLeaderboardDiff(rows, JSON.parse(event.data));
+    onRows(rows);
+  });
+
+  return () => source.close();
+};
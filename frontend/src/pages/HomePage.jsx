@@ -57,7 +57,7 @@ const getTimeRemaining = (endDate) => {
 
 const HomePage = () => {
   const api = useApi();
-  const { user } = useAuth();
+  const { user, updateUser } = useAuth();
   const navigate = useNavigate();
 
   const [competition, setCompetition] = useState(null);
@@ -220,62 +220,19 @@ const HomePage = () => {
     loadDashboardData();
   }, [user?.role]);
 
-  const markTaskAsCompleted = async (taskId, estimatedPoints = 0) => {
-    if (!completedStatusId) {
-      setError('Статус "Выполнено" не найден');
-      return;
-    }
-
+  const markTaskAsCompleted = async (taskId) => {
     try {
-      // Проверка даты начала соревнования
-      if (competition && competition.start_date) {
-        const startDate = new Date(competition.start_date);
-        const now = new Date();
-        
-        if (now < startDate) {
-          const formattedDate = startDate.toLocaleString('ru-RU', {
-            day: '2-digit',
-            month: '2-digit',
-            year: 'numeric',
-            hour: '2-digit',
-            minute: '2-digit'
-          });
-          setError(`Нельзя пометить задачу выполненной до начала соревнования. Соревнование начинается ${formattedDate}`);
-          return;
-        }
-      }
-
-      const allTasks = await api.get('/tasks');
-      const task = allTasks.find(t => t.id === taskId);
-      if (!task) {
-        setError('Задача не найдена');
-        return;
-      }
-      if (task.status_id === completedStatusId) {
-        setError('Задача уже выполнена');
-        return;
-      }
-
-      await api.put(`/tasks/${taskId}`, {
-        status_id: completedStatusId,
-        completed_at: new Date().toISOString(),
-        title: task.title,
-        description: task.description,
-        ai_analysis_metadata: task.ai_analysis_metadata,
-        estimated_points: task.estimated_points,
-        due_date: task.due_date,
-      });
+      // Сервер проверяет период соревнования, ставит статус и начисляет баллы одной транзакцией
+      const result = await api.post(`/tasks/${taskId}/complete`);
 
-      if (estimatedPoints > 0) {
-        await api.post('/rewards', {
-          type_id: "1",
-          points_amount: estimatedPoints,
-          reason: `Выполнена задача (ID: ${taskId})`,
+      setTasks((prev) => {
+        const next = {};
+        Object.entries(prev).forEach(([dateKey, dayTasks]) => {
+          next[dateKey] = dayTasks.map((t) => (t.id === taskId ? result.task : t));
         });
-      }
-
-      const tasksResp = await api.get('/tasks');
-      setTasks(mapTasksByDate(tasksResp || []));
+        return next;
+      });
+      updateUser({ total_points: result.total_points });
     } catch (err) {
       console.error('Ошибка завершения задачи:', err);
       let errorMessage = 'Не удалось завершить задачу';
@@ -723,7 +680,7 @@ const HomePage = () => {
                                   onClick={(e) => {
                                     e.stopPropagation();
                                     if (task.id) {
-                                      markTaskAsCompleted(task.id, task.estimated_points || 10);
+                                      markTaskAsCompleted(task.id);
                                     }
                                   }}
                                   className="text-green-600 dark:text-green-400 hover:text-green-800 dark:hover:text-green-300 transition-colors"
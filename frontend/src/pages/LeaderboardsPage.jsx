@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useApi } from '../api/client.js';
 import { useAuth } from '../context/AuthContext.jsx';
+import { subscribeLeaderboard } from '../api/leaderboardStream.js';
 
 const LeaderboardsPage = () => {
   const [users, setUsers] = useState([]);
@@ -30,6 +31,9 @@ const LeaderboardsPage = () => {
     link.href = '/favicon-trophy.svg';
     document.head.appendChild(link);
 
+    let cancelled = false;
+    let unsubscribe = () => {};
+
     const fetchLeaderboard = async () => {
       try {
         setLoading(true);
@@ -65,6 +69,11 @@ const LeaderboardsPage = () => {
           .sort((a, b) => b.total_points - a.total_points);
 
         setUsers(sortedUsers);
+
+        // Дальше рейтинг приходит через поток: снимок при подключении и изменения мест
+        if (!cancelled) {
+          unsubscribe = subscribeLeaderboard(resolvedCompId, setUsers);
+        }
       } catch (err) {
         console.error('Ошибка загрузки лидеров:', err);
         setError(err.message || 'Не удалось загрузить лидеров');
@@ -74,6 +83,11 @@ const LeaderboardsPage = () => {
     };
 
     fetchLeaderboard();
+
+    return () => {
+      cancelled = true;
+      unsubscribe();
+    };
   }, [isAuthenticated, user?.role, navigate]);
 
   const getRankIcon = (rank) => {
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext.jsx';
 import { useApi } from '../api/client.js';
+import { subscribeLeaderboard } from '../api/leaderboardStream.js';
 
 const ManagerPage = () => {
   const { isAuthenticated, user } = useAuth();
@@ -29,6 +30,7 @@ const ManagerPage = () => {
   const [leaderboardData, setLeaderboardData] = useState({});
   const [loadingLeaderboard, setLoadingLeaderboard] = useState(false);
   const [searchText, setSearchText] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [managingParticipants, setManagingParticipants] = useState(null);
   const [competitionParticipants, setCompetitionParticipants] = useState({});
   const [loadingParticipants, setLoadingParticipants] = useState(false);
@@ -327,7 +329,7 @@ const ManagerPage = () => {
         
         setSuccess(`Создание задач: ${i + 1} из ${validTasks.length}...`);
         
-        const chatResponse = await api.post('/chat', { 
+        const chatResponse = await api.postIdempotent('/chat', { 
           message,
           user_ids: task.user_ids
         });
@@ -524,7 +526,7 @@ const ManagerPage = () => {
           
           setSuccess(`Обновление соревнования и создание задач: ${i + 1} из ${validEditTasks.length}...`);
           
-          const chatResponse = await api.post('/chat', { 
+          const chatResponse = await api.postIdempotent('/chat', { 
             message,
             user_ids: task.user_ids
           });
@@ -632,6 +634,16 @@ const ManagerPage = () => {
     }
   };
 
+  // Открытый рейтинг обновляется через поток изменений вместо повторных запросов /leaderboard/{id}
+  useEffect(() => {
+    if (expandedCompetitionId == null) {
+      return undefined;
+    }
+    return subscribeLeaderboard(expandedCompetitionId, (rows) => {
+      setLeaderboardData(prev => ({ ...prev, [expandedCompetitionId]: rows }));
+    });
+  }, [expandedCompetitionId]);
+
   const toggleLeaderboard = async (competitionId) => {
     if (expandedCompetitionId === competitionId) {
       setExpandedCompetitionId(null);
@@ -656,17 +668,26 @@ const ManagerPage = () => {
     }
   };
 
-  const filteredUsers = allUsers.filter((user) => {
-    if (!searchText.trim()) {
-      return true;
+  // Поиск участников на сервере (GET /users/search) с задержкой после ввода
+  useEffect(() => {
+    const query = searchText.trim();
+    if (query.length < 2) {
+      setSearchResults(null);
+      return undefined;
     }
 
-    const query = searchText.trim().toLowerCase();
-    const fullName = `${user.first_name} ${user.last_name}`.toLowerCase();
-    const email = (user.email || '').toLowerCase();
-    
-    return fullName.includes(query) || email.includes(query);
-  });
+    const timer = setTimeout(async () => {
+      try {
+        const users = await api.get(`/users/search?q=${encodeURIComponent(query)}&role=user&limit=100`);
+        setSearchResults(users || []);
+      } catch (err) {
+        console.error('Ошибка поиска пользователей:', err);
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchText]);
+
+  const filteredUsers = searchResults ?? allUsers;
 
   if (!isAuthenticated || (user?.role !== 'admin' && user?.role !== 'manager')) {
     return null;
@@ -0,0 +1,218 @@
+"""
+Идемпотентные POST-запросы с заголовком Idempotency-Key.
+
+POST /tasks, POST /tasks/{user_id} и POST /chat (он же /api/chat) вызывают языковую модель. Если клиент или
+прокси повторяет запрос после таймаута, повтор с тем же Idempotency-Key не выполняет его
+заново:
+    - первый запрос занимает ключ (строка idempotency_keys со статусом in_progress),
+      выполняется и сохраняет код и тело ответа;
+    - повтор, пришедший во время выполнения, ждёт его завершения (до IDEMPOTENCY_WAIT_SECONDS);
+    - повтор после завершения получает сохранённый ответ с заголовком Idempotent-Replayed: true;
+    - тот же ключ с другим телом запроса - 422.
+Ключ действует IDEMPOTENCY_TTL_SECONDS (по умолчанию час) и принадлежит пользователю из токена.
+Ответы 5xx и 429 не сохраняются: ошибка AI не должна закрепляться за ключом, повтор выполнит
+запрос снова. Ключ, занятый упавшим воркером, освобождается через IDEMPOTENCY_LOCK_SECONDS.
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+from datetime import timedelta
+from typing import Optional
+
+import orjson
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from auth import bearer_claims
+from db import engine
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "120"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+# Эндпоинты с вызовом языковой модели
+IDEMPOTENT_ROUTES = [
+    re.compile(r"^/tasks/?$"),
+    re.compile(r"^/tasks/\d+/?$"),
+    re.compile(r"^/chat/?$"),
+    re.compile(r"^/api/chat/?$"),
+]
+
+_CLAIM = """
+    INSERT INTO idempotency_keys (user_id, key, request_hash, status, expires_at)
+    VALUES (:user_id, :key, :request_hash, 'in_progress', now() + CAST(:lock AS interval))
+    ON CONFLICT (user_id, key) DO UPDATE SET
+        request_hash = EXCLUDED.request_hash, status = 'in_progress', response_status = NULL,
+        response_body = NULL, response_content_type = NULL, created_at = now(), expires_at = EXCLUDED.expires_at
+    WHERE idempotency_keys.expires_at < now()
+    RETURNING key
+"""
+
+_LOOKUP = """
+    SELECT request_hash, status, response_status, response_body, response_content_type
+    FROM idempotency_keys
+    WHERE user_id = :user_id AND key = :key AND expires_at >= now()
+"""
+
+_COMPLETE = """
+    UPDATE idempotency_keys
+    SET status = 'completed', response_status = :status, response_body = :body,
+        response_content_type = :content_type, expires_at = now() + CAST(:ttl AS interval)
+    WHERE user_id = :user_id AND key = :key
+"""
+
+_RELEASE = "DELETE FROM idempotency_keys WHERE user_id = :user_id AND key = :key"
+
+_PURGE = "DELETE FROM idempotency_keys WHERE expires_at < now()"
+
+_last_purge = 0.0
+
+
+def _claim(user_id: int, key: str, request_hash: str) -> bool:
+    global _last_purge
+    with engine.begin() as conn:
+        # Просроченные ключи удаляются не чаще раза за TTL на воркер
+        if time.monotonic() - _last_purge > IDEMPOTENCY_TTL_SECONDS:
+            _last_purge = time.monotonic()
+            conn.execute(text(_PURGE))
+        return conn.execute(text(_CLAIM), {
+            "user_id": user_id, "key": key, "request_hash": request_hash,
+            "lock": timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        }).first() is not None
+
+
+def _lookup(user_id: int, key: str):
+    with engine.connect() as conn:
+        return conn.execute(text(_LOOKUP), {"user_id": user_id, "key": key}).first()
+
+
+def _complete(user_id: int, key: str, status: int, body: bytes, content_type: Optional[str]):
+    with engine.begin() as conn:
+        conn.execute(text(_COMPLETE), {
+            "user_id": user_id, "key": key, "status": status, "body": body,
+            "content_type": content_type, "ttl": timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        })
+
+
+def _release(user_id: int, key: str):
+    with engine.begin() as conn:
+        conn.execute(text(_RELEASE), {"user_id": user_id, "key": key})
+
+
+def _user_id(headers: dict) -> Optional[int]:
+    """Пользователь из Bearer-токена; без валидного токена ключ не используется (эндпоинт вернёт 401)."""
+    claims = bearer_claims(headers.get(b"authorization", b"").decode("latin-1"))
+    try:
+        return int(claims["sub"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _should_store(status: int) -> bool:
+    return status < 500 and status != 429
+
+
+async def _send_json(send, status: int, body: dict, headers: list = ()):
+    payload = orjson.dumps(body)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def _replay(send, row):
+    body = bytes(row.response_body or b"")
+    headers = [(b"content-length", str(len(body)).encode()), (b"idempotent-replayed", b"true")]
+    if row.response_content_type:
+        headers.append((b"content-type", row.response_content_type.encode("latin-1")))
+    await send({"type": "http.response.start", "status": row.response_status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Выполняет POST к IDEMPOTENT_ROUTES с заголовком Idempotency-Key не больше одного раза."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        raw_key = headers.get(IDEMPOTENCY_HEADER)
+        if raw_key is None or not any(route.match(scope["path"]) for route in IDEMPOTENT_ROUTES):
+            await self.app(scope, receive, send)
+            return
+        user_id = _user_id(headers)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+        key = raw_key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, {"detail": f"Idempotency-Key должен содержать от 1 до {MAX_KEY_LENGTH} символов"})
+            return
+
+        # Тело читается целиком, чтобы сравнивать повторы, и затем отдаётся приложению
+        messages = []
+        digest = hashlib.sha256(f"{scope['method']} {scope['path']}?{scope['query_string'].decode()}\n".encode())
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            digest.update(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        request_hash = digest.hexdigest()
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.05
+        while not await run_in_threadpool(_claim, user_id, key, request_hash):
+            row = await run_in_threadpool(_lookup, user_id, key)
+            if row is None:
+                continue  # Ключ только что освобождён или просрочен - пробуем занять снова
+            if row.request_hash != request_hash:
+                await _send_json(send, 422, {"detail": "Idempotency-Key уже использован с другим запросом"})
+                return
+            if row.status == "completed":
+                await _replay(send, row)
+                return
+            if time.monotonic() >= deadline:
+                await _send_json(send, 409, {"detail": "Запрос с этим Idempotency-Key ещё выполняется"},
+                                 [(b"retry-after", b"1")])
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        response = {"status": 500, "content_type": None, "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["content_type"] = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1") or None
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(_release, user_id, key)
+            raise
+        if _should_store(response["status"]):
+            await run_in_threadpool(_complete, user_id, key, response["status"],
+                                    b"".join(response["body"]), response["content_type"])
+        else:
+            await run_in_threadpool(_release, user_id, key)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+История лидербордов: периодические снимки рейтингов и ряды мест по интервалам.
+
+users.total_points - один изменяемый счётчик, поэтому раз в LEADERBOARD_SNAPSHOT_SECONDS
+(по умолчанию 300) рейтинг каждого идущего соревнования записывается в
+leaderboard_snapshots одной строкой: массивы user_ids и points в порядке мест.
+Снимок пропускается, если рейтинг не изменился с предыдущего, и пишется не больше
+одного раза за интервал, сколько бы воркеров ни запускали снимок одновременно.
+
+История (GET /leaderboard/{id}/history) строится только по снимкам: для каждого
+интервала берётся последний снимок до его конца - один поиск по индексу
+(competition_id, taken_at) на интервал, журнал наград не читается.
+
+    python leaderboard_history.py   - записать снимок вручную
+"""
+import os
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from database import User
+
+SNAPSHOT_SECONDS = int(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", "300"))
+# Ключ advisory lock: снимок пишет один воркер, остальные пропускают интервал
+SNAPSHOT_LOCK_ID = 72_002
+# Интервалы истории и ограничение на число точек в одном ответе
+HISTORY_BUCKETS = {
+    "5m": timedelta(minutes=5),
+    "15m": timedelta(minutes=15),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+MAX_HISTORY_BUCKETS = 500
+
+logger = logging.getLogger("leaderboard")
+
+_EPOCH = datetime(1970, 1, 1)
+
+_TAKE_SNAPSHOTS = """
+    INSERT INTO leaderboard_snapshots (competition_id, taken_at, user_ids, points)
+    SELECT cur.competition_id, :now, cur.user_ids, cur.points
+    FROM (
+        SELECT u.cur_comp AS competition_id,
+               array_agg(u.id ORDER BY COALESCE(u.total_points, 0) DESC, u.id) AS user_ids,
+               array_agg(COALESCE(u.total_points, 0) ORDER BY COALESCE(u.total_points, 0) DESC, u.id) AS points
+        FROM users u
+        JOIN competitions c ON c.id = u.cur_comp
+        -- Идущие соревнования и только что завершившиеся: последний снимок фиксирует итог
+        WHERE c.start_date <= :now AND c.end_date >= :active_since
+        GROUP BY u.cur_comp
+    ) cur
+    LEFT JOIN LATERAL (
+        SELECT s.taken_at, s.user_ids, s.points
+        FROM leaderboard_snapshots s
+        WHERE s.competition_id = cur.competition_id
+        ORDER BY s.taken_at DESC
+        LIMIT 1
+    ) last ON true
+    WHERE (last.taken_at IS NULL OR last.taken_at < :slot_start)
+      AND (last.user_ids IS DISTINCT FROM cur.user_ids OR last.points IS DISTINCT FROM cur.points)
+"""
+
+_HISTORY = """
+    SELECT b.bucket, s.taken_at, s.user_ids[1:(:top)] AS user_ids, s.points[1:(:top)] AS points
+    FROM unnest(CAST(:buckets AS timestamp[])) AS b(bucket)
+    JOIN LATERAL (
+        SELECT taken_at, user_ids, points
+        FROM leaderboard_snapshots
+        WHERE competition_id = :competition_id AND taken_at < b.bucket + CAST(:step AS interval)
+        ORDER BY taken_at DESC
+        LIMIT 1
+    ) s ON true
+    ORDER BY b.bucket
+"""
+
+
+def floor_time(moment: datetime, step: timedelta) -> datetime:
+    """Начало интервала длиной step, в который попадает moment (интервалы отсчитываются от эпохи)."""
+    return _EPOCH + (moment - _EPOCH) // step * step
+
+
+def take_snapshots(db: Session, now: datetime = None) -> int:
+    """
+    Записывает снимки рейтингов всех идущих соревнований одним запросом и делает commit.
+    Возвращает число записанных снимков (0, если интервал уже записан другим воркером).
+    """
+    now = now or datetime.utcnow()
+    step = timedelta(seconds=SNAPSHOT_SECONDS)
+    locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {"lock_id": SNAPSHOT_LOCK_ID}).scalar()
+    if not locked:
+        db.rollback()
+        return 0
+    result = db.execute(text(_TAKE_SNAPSHOTS), {
+        "now": now,
+        "slot_start": floor_time(now, step),
+        "active_since": now - step,
+    })
+    db.commit()
+    return result.rowcount
+
+
+def rank_history(db: Session, competition_id: int, start: datetime, end: datetime,
+                 bucket: timedelta, top: int) -> dict:
+    """Места top участников на конец каждого интервала bucket от start до end по снимкам."""
+    buckets = []
+    moment = floor_time(start, bucket)
+    while moment <= end:
+        buckets.append(moment)
+        moment += bucket
+    rows = db.execute(text(_HISTORY), {
+        "buckets": buckets,
+        "step": bucket,
+        "competition_id": competition_id,
+        "top": top,
+    }).all()
+
+    user_ids = {user_id for row in rows for user_id in row.user_ids}
+    users = (
+        db.query(User.id, User.first_name, User.last_name).filter(User.id.in_(user_ids)).order_by(User.id)
+        if user_ids else []
+    )
+    return {
+        "competition_id": competition_id,
+        "users": [{"user_id": u.id, "first_name": u.first_name, "last_name": u.last_name} for u in users],
+        "series": [
+            {
+                "bucket": row.bucket,
+                "taken_at": row.taken_at,
+                "standings": [
+                    {"user_id": user_id, "rank": rank, "total_points": points}
+                    for rank, (user_id, points) in enumerate(zip(row.user_ids, row.points), start=1)
+                ],
+            }
+            for row in rows
+        ],
+    }
+
+
+class SnapshotScheduler:
+    """Поток воркера, запускающий take_snapshots на границе каждого интервала."""
+
+    def __init__(self, interval_seconds: int):
+        self.interval = timedelta(seconds=interval_seconds)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leaderboard-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            now = datetime.utcnow()
+            # Воркеры стартуют одновременно: небольшой разброс, чтобы они не ждали блокировку вместе
+            delay = (floor_time(now, self.interval) + self.interval - now).total_seconds() + random.uniform(0, 5)
+            if self._stop.wait(delay):
+                return
+            db = SessionLocal()
+            try:
+                count = take_snapshots(db)
+                if count:
+                    logger.info("Записано снимков лидербордов: %d", count)
+            except Exception:
+                logger.exception("Не удалось записать снимки лидербордов")
+            finally:
+                db.close()
+
+
+snapshot_scheduler = SnapshotScheduler(SNAPSHOT_SECONDS)
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Записано снимков: {take_snapshots(db)}")
+    finally:
+        db.close()
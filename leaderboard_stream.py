@@ -0,0 +1,199 @@
+"""
+Лидерборд в реальном времени: GET /leaderboard/{id}/stream (Server-Sent Events).
+
+Изменения баллов и состава соревнования публикуют NOTIFY leaderboard с id соревнования
+(ledger.notify_points_changed). Каждый воркер держит одну ленту (LeaderboardFeed) на
+соревнование, которое кто-то смотрит: уведомление только помечает рейтинг устаревшим,
+а лента не чаще LEADERBOARD_MAX_UPDATES_PER_SECOND раз в секунду перечитывает его одним
+запросом и рассылает зрителям изменившиеся строки. Сколько бы зрителей ни было у воркера,
+пачка начислений стоит одного запроса на интервал.
+
+События потока:
+    snapshot - полный рейтинг при подключении (и после переполнения очереди медленного клиента):
+               [{"user_id", "rank", "first_name", "last_name", "total_points"}, ...]
+    diff     - {"changed": [строки с новым местом или баллами], "removed": [user_id, ...]}
+"""
+import os
+import asyncio
+import logging
+
+import orjson
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+
+from db import SessionLocal
+from database import User
+from ledger import LEADERBOARD_CHANNEL
+from notifications import listener
+from reference_cache import competition_by_id
+
+MAX_UPDATES_PER_SECOND = float(os.getenv("LEADERBOARD_MAX_UPDATES_PER_SECOND", "2"))
+# Комментарий-пинг не даёт прокси закрыть простаивающее соединение
+KEEPALIVE_SECONDS = 15
+# Сколько событий копится для медленного клиента, прежде чем он получит снимок заново
+VIEWER_QUEUE_SIZE = 32
+
+logger = logging.getLogger("leaderboard")
+
+
+def load_standings(competition_id: int) -> list:
+    """Рейтинг соревнования одним запросом; при равных баллах порядок по id пользователя."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(User.id, User.first_name, User.last_name,
+                     func.coalesce(User.total_points, 0).label("total_points"))
+            .filter(User.cur_comp == competition_id)
+            .order_by(User.total_points.desc(), User.id)
+            .all()
+        )
+    finally:
+        db.close()
+    return [
+        {"user_id": row.id, "rank": rank, "first_name": row.first_name,
+         "last_name": row.last_name, "total_points": row.total_points}
+        for rank, row in enumerate(rows, start=1)
+    ]
+
+
+def competition_exists(competition_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return competition_by_id(db, competition_id) is not None
+    finally:
+        db.close()
+
+
+def diff_standings(old: list, new: list) -> dict:
+    """Строки, у которых изменилось место, баллы или имя, и пользователи, покинувшие рейтинг."""
+    old_by_id = {row["user_id"]: row for row in old}
+    new_ids = {row["user_id"] for row in new}
+    return {
+        "changed": [row for row in new if old_by_id.get(row["user_id"]) != row],
+        "removed": [user_id for user_id in old_by_id if user_id not in new_ids],
+    }
+
+
+def format_event(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+class LeaderboardFeed:
+    """Рейтинг одного соревнования и его зрители внутри воркера; работает в цикле событий."""
+
+    def __init__(self, competition_id: int, standings: list):
+        self.competition_id = competition_id
+        self.standings = standings
+        self.viewers = set()
+        self._dirty = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    def add_viewer(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+        queue.put_nowait(("snapshot", self.standings))
+        self.viewers.add(queue)
+        return queue
+
+    def close(self):
+        self._task.cancel()
+
+    def _send(self, queue: asyncio.Queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: вместо накопленных diff отдаём актуальный снимок
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(("snapshot", self.standings))
+
+    async def _run(self):
+        interval = 1 / MAX_UPDATES_PER_SECOND
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            try:
+                standings = await run_in_threadpool(load_standings, self.competition_id)
+            except Exception:
+                logger.exception("Не удалось обновить лидерборд %s", self.competition_id)
+                standings = self.standings
+            diff = diff_standings(self.standings, standings)
+            self.standings = standings
+            if diff["changed"] or diff["removed"]:
+                for queue in list(self.viewers):
+                    self._send(queue, ("diff", diff))
+            # Уведомления, пришедшие за интервал, схлопываются в одно обновление
+            await asyncio.sleep(interval)
+
+
+class LeaderboardBroadcaster:
+    """Ленты всех просматриваемых соревнований воркера."""
+
+    def __init__(self):
+        self._feeds = {}
+        self._loop = None
+        self._lock = None
+
+    def on_notify(self, payload):
+        """Обработчик NOTIFY leaderboard; вызывается из потока слушателя или после commit запроса."""
+        loop = self._loop
+        if loop is None or not self._feeds:
+            return
+        try:
+            loop.call_soon_threadsafe(self._mark_dirty, payload)
+        except RuntimeError:
+            # Цикл событий уже закрыт (остановка воркера)
+            pass
+
+    def _mark_dirty(self, payload):
+        if payload is None:
+            feeds = list(self._feeds.values())
+        else:
+            try:
+                feed = self._feeds.get(int(payload))
+            except ValueError:
+                return
+            feeds = [feed] if feed else []
+        for feed in feeds:
+            feed.mark_dirty()
+
+    async def subscribe(self, competition_id: int):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый цикл событий (перезапуск приложения в тестах): ленты старого цикла недействительны
+            self._loop, self._feeds, self._lock = loop, {}, asyncio.Lock()
+        async with self._lock:
+            feed = self._feeds.get(competition_id)
+            if feed is None:
+                standings = await run_in_threadpool(load_standings, competition_id)
+                feed = self._feeds[competition_id] = LeaderboardFeed(competition_id, standings)
+                # Уведомления, пришедшие во время загрузки, ещё некому было получить - перечитываем один раз
+                feed.mark_dirty()
+        return feed, feed.add_viewer()
+
+    def unsubscribe(self, feed: LeaderboardFeed, queue: asyncio.Queue):
+        feed.viewers.discard(queue)
+        if not feed.viewers and self._feeds.get(feed.competition_id) is feed:
+            del self._feeds[feed.competition_id]
+            feed.close()
+
+    async def stream(self, competition_id: int):
+        """Тело ответа text/event-stream; завершается при отключении клиента."""
+        feed, queue = await self.subscribe(competition_id)
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield format_event(event, data)
+        finally:
+            self.unsubscribe(feed, queue)
+
+
+broadcaster = LeaderboardBroadcaster()
+listener.subscribe(LEADERBOARD_CHANNEL, broadcaster.on_notify)
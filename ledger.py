@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Журнал баллов: начисление и списание на стороне БД.
+
+users.total_points меняется только выражением total_points = total_points + :delta
+в той же транзакции, что и запись в rewards. Строка пользователя блокируется первым
+же UPDATE, поэтому параллельные начисления выстраиваются в очередь, а не теряются,
+как при чтении-изменении-записи ORM-объекта в Python.
+
+total_points - сумма наград текущего соревнования пользователя: при смене соревнования
+счётчик обнуляется, поэтому каждая награда помечается competition_id. Сверка
+(reconcile_totals) пересчитывает суммы по rewards одним запросом.
+
+Каждое изменение баллов публикует NOTIFY leaderboard с id соревнования
+(notify_points_changed): по нему обновляются лидерборды в реальном времени.
+
+
+    python ledger.py            - показать расхождения
+    python ledger.py --apply    - исправить их
+"""
+import argparse
+from typing import Optional, Tuple
+
+from sqlalchemy import func, text, update
+from sqlalchemy.orm import Session
+
+from database import User, Reward
+from notifications import publish
+
+# Сколько пользователей исправлять за одну транзакцию при сверке
+RECONCILE_BATCH_SIZE = 1000
+# Канал уведомлений об изменении рейтинга соревнования (payload - id соревнования)
+LEADERBOARD_CHANNEL = "leaderboard"
+
+_TOTALS_DRIFT = """
+    SELECT u.id AS user_id, u.total_points AS stored, COALESCE(SUM(r.points_amount), 0) AS actual
+    FROM users u
+    LEFT JOIN rewards r ON r.user_id = u.id AND r.competition_id IS NOT DISTINCT FROM u.cur_comp
+    -- Вне соревнования total_points сохраняет итог последнего соревнования: такие
+    -- пользователи сверяются, только если у них нет наград ни в одном соревновании
+    WHERE (u.cur_comp IS NOT NULL OR NOT EXISTS (
+        SELECT 1 FROM rewards pr WHERE pr.user_id = u.id AND pr.competition_id IS NOT NULL
+    )) {where}
+    GROUP BY u.id, u.total_points
+    HAVING u.total_points IS DISTINCT FROM COALESCE(SUM(r.points_amount), 0)
+"""
+
+_FIX_DRIFT = f"""
+    UPDATE users u SET total_points = d.actual
+    FROM ({_TOTALS_DRIFT.format(where="AND u.id = ANY(:user_ids)")}) d
+    WHERE u.id = d.user_id
+    RETURNING d.user_id, d.stored, d.actual
+"""
+
+
+def notify_points_changed(db: Session, competition_id: Optional[int]):
+    """Уведомляет воркеры об изменении рейтинга соревнования после commit транзакции db."""
+    if competition_id is not None:
+        publish(db, LEADERBOARD_CHANNEL, str(competition_id))
+
+
+def _add_points(db: Session, user_id: int, delta: int, competition_id=None, match_competition: bool = False):
+    """
+    UPDATE users SET total_points = total_points + :delta RETURNING total_points, cur_comp.
+    С match_competition=True баллы меняются только если награда относится к текущему
+    соревнованию пользователя; иначе возвращается None.
+    """
+    statement = (
+        update(User)
+        .where(User.id == user_id)
+        .values(total_points=func.coalesce(User.total_points, 0) + delta)
+        .returning(User.total_points, User.cur_comp)
+        # Значение в сессии устаревает после commit; вычислять его в Python нельзя - это и есть гонка
+        .execution_options(synchronize_session=False)
+    )
+    if match_competition:
+        statement = statement.where(User.cur_comp.is_not_distinct_from(competition_id))
+    return db.execute(statement).first()
+
+
+def award_points(db: Session, user_id: int, type_id: int, points: int,
+                 reason: Optional[str] = None) -> Tuple[Reward, int]:
+    """
+    Записывает награду и начисляет баллы в текущей транзакции (commit делает вызывающий код).
+    Возвращает награду и новое значение total_points.
+    """
+    total_points, competition_id = _add_points(db, user_id, points)
+    reward = Reward(
+        user_id=user_id,
+        type_id=type_id,
+        points_amount=points,
+        reason=reason,
+        competition_id=competition_id
+    )
+    db.add(reward)
+    db.flush()
+    notify_points_changed(db, competition_id)
+    return reward, total_points
+
+
+def change_reward_points(db: Session, reward: Reward, new_points: int) -> Optional[int]:
+    """
+    Меняет сумму награды и применяет разницу к total_points.
+    Награда должна быть загружена с блокировкой (with_for_update), иначе две
+    одновременные правки посчитают разницу от одного и того же старого значения.
+    """
+    delta = new_points - reward.points_amount
+    reward.points_amount = new_points
+    if not delta:
+        return None
+    row = _add_points(db, reward.user_id, delta, reward.competition_id, match_competition=True)
+    if not row:
+        return None
+    notify_points_changed(db, row.cur_comp)
+    return row.total_points
+
+
+def revoke_reward(db: Session, reward: Reward) -> Optional[int]:
+    """Удаляет награду и списывает её баллы, если она относится к текущему соревнованию пользователя."""
+    row = _add_points(db, reward.user_id, -reward.points_amount, reward.competition_id, match_competition=True)
+    db.delete(reward)
+    if not row:
+        return None
+    notify_points_changed(db, row.cur_comp)
+    return row.total_points
+
+
+def find_drift(db: Session, user_ids=None) -> list:
+    """Пользователи, у которых total_points не совпадает с суммой наград текущего соревнования."""
+    where = "AND u.id = ANY(:user_ids)" if user_ids is not None else ""
+    params = {"user_ids": list(user_ids)} if user_ids is not None else {}
+    statement = text(_TOTALS_DRIFT.format(where=where) + "ORDER BY u.id")
+    return [dict(row._mapping) for row in db.execute(statement, params)]
+
+
+def reconcile_totals(db: Session, apply: bool = False) -> list:
+    """
+    Находит расхождения одним агрегирующим запросом и, если apply=True, исправляет их пачками.
+    Перед пересчётом строки пользователей пачки блокируются (FOR UPDATE в порядке id):
+    начисление тоже сначала блокирует строку пользователя, поэтому сверка не затирает
+    баллы, начисленные между поиском расхождений и исправлением.
+    """
+    drift = find_drift(db)
+    db.rollback()  # Не держим снимок поиска открытым во время исправления
+    if not apply:
+        return drift
+
+    fixed = []
+    user_ids = [row["user_id"] for row in drift]
+    for start in range(0, len(user_ids), RECONCILE_BATCH_SIZE):
+        batch = user_ids[start:start + RECONCILE_BATCH_SIZE]
+        db.execute(text("SELECT id FROM users WHERE id = ANY(:user_ids) ORDER BY id FOR UPDATE"),
+                   {"user_ids": batch})
+        fixed.extend(dict(row._mapping) for row in db.execute(text(_FIX_DRIFT), {"user_ids": batch}))
+        db.commit()
+    return fixed
+
+
+if __name__ == "__main__":
+    from db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Сверка users.total_points с суммой наград")
+    parser.add_argument("--apply", action="store_true", help="исправить найденные расхождения")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = reconcile_totals(db, apply=args.apply)
+    finally:
+        db.close()
+    for row in rows:
+        print(f"user {row['user_id']}: total_points={row['stored']}, по наградам={row['actual']}")
+    action = "исправлено" if args.apply else "найдено"
+    print(f"Расхождений {action}: {len(rows)}")
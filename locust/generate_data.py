@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Генератор тестовых данных для нагрузочных сценариев (locust/scenarios.py).
+
+Создает пользователей bench_<N>@bench.local (пароль benchpass), менеджера
+bench_manager@bench.local, соревнования, задачи и награды. Данные пишутся
+через COPY пачками, поэтому 1M строк загружаются за минуты. Награды относятся к текущему
+соревнованию пользователя, а total_points считается по ним - сверка ledger.py не видит расхождений.
+
+Примеры:
+    python locust/generate_data.py --users 1000 --tasks-per-user 10
+    python locust/generate_data.py --users 20000 --tasks-per-user 40 --rewards-per-user 10
+    python locust/generate_data.py --reset
+"""
+
+import argparse
+import io
+import csv
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Скрипт находится в locust/, корень проекта на уровень выше
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy import text  # noqa: E402
+
+from auth import get_password_hash  # noqa: E402
+from db import engine  # noqa: E402
+from database import init_db  # noqa: E402
+
+BENCH_PASSWORD = "benchpass"
+BENCH_EMAIL_PATTERN = "bench\\_%@bench.local"
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_state.json")
+COPY_CHUNK_ROWS = 50_000
+
+
+def _copy_rows(cursor, table: str, columns: list, rows):
+    """Загружает строки через COPY пачками по COPY_CHUNK_ROWS."""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % COPY_CHUNK_ROWS == 0:
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+    if buffer.tell():
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+    return count
+
+
+def reset_bench_data():
+    """Удаляет все данные, созданные генератором."""
+    with engine.begin() as conn:
+        params = {"pattern": BENCH_EMAIL_PATTERN}
+        bench_users = "SELECT id FROM users WHERE email LIKE :pattern"
+        conn.execute(text(f"DELETE FROM task_tags WHERE task_id IN (SELECT id FROM tasks WHERE user_id IN ({bench_users}))"), params)
+        conn.execute(text(f"DELETE FROM tasks WHERE user_id IN ({bench_users})"), params)
+        conn.execute(text(f"DELETE FROM rewards WHERE user_id IN ({bench_users})"), params)
+        conn.execute(text("DELETE FROM users WHERE email LIKE :pattern"), params)
+        conn.execute(text("DELETE FROM competitions WHERE title LIKE 'Bench %'"))
+    if os.path.exists(STATE_FILE):
+        os.remove(STATE_FILE)
+    print("Данные бенчмарка удалены")
+
+
+def generate(users: int, tasks_per_user: int, rewards_per_user: int, competitions: int, seed: int):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    init_db()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    password_hash = get_password_hash(BENCH_PASSWORD)
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+
+        # Соревнования: первое идет сейчас, остальные уже завершены
+        competition_rows = []
+        for i in range(competitions):
+            if i == 0:
+                start, end = now - timedelta(days=1), now + timedelta(days=30)
+            else:
+                start = now - timedelta(days=60 * (i + 1))
+                end = start + timedelta(days=30)
+            competition_rows.append((f"Bench {seed}-{i}", start, end))
+        competition_ids = []
+        for title, start, end in competition_rows:
+            cursor.execute(
+                "INSERT INTO competitions (title, start_date, end_date) VALUES (%s, %s, %s) RETURNING id",
+                (title, start, end)
+            )
+            competition_ids.append(cursor.fetchone()[0])
+        active_competition = competition_ids[0]
+
+        def user_rows():
+            yield ("Bench", "Manager", "bench_manager@bench.local", password_hash, 0, "manager", None)
+            for i in range(users):
+                yield (
+                    f"Bench{i}", "User", f"bench_{i}@bench.local", password_hash,
+                    0, "user", competition_ids[i % len(competition_ids)]
+                )
+
+        user_count = _copy_rows(
+            cursor, "users",
+            ["first_name", "last_name", "email", "password_hash", "total_points", "role", "cur_comp"],
+            user_rows()
+        )
+
+        cursor.execute("SELECT id, cur_comp FROM users WHERE email LIKE %s AND role = 'user' ORDER BY id",
+                       (BENCH_EMAIL_PATTERN,))
+        user_competitions = cursor.fetchall()
+        user_ids = [user_id for user_id, _ in user_competitions]
+        cursor.execute("SELECT id FROM task_status ORDER BY id")
+        status_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM reward_types ORDER BY id LIMIT 1")
+        reward_type_id = cursor.fetchone()[0]
+
+        def task_rows():
+            for user_id in user_ids:
+                for n in range(tasks_per_user):
+                    yield (
+                        user_id, rng.choice(status_ids), f"Bench task {user_id}-{n}",
+                        "Сгенерированная задача для нагрузочного тестирования",
+                        rng.randint(1, 100), 0, now + timedelta(days=rng.randint(1, 29))
+                    )
+
+        task_count = _copy_rows(
+            cursor, "tasks",
+            ["user_id", "status_id", "title", "description", "estimated_points", "awarded_points", "due_date"],
+            task_rows()
+        )
+
+        def reward_rows():
+            for user_id, competition_id in user_competitions:
+                for n in range(rewards_per_user):
+                    yield (
+                        user_id, reward_type_id, rng.randint(1, 100),
+                        now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)), f"Bench reward {n}", competition_id
+                    )
+
+        reward_count = _copy_rows(
+            cursor, "rewards",
+            ["user_id", "type_id", "points_amount", "awarded_at", "reason", "competition_id"],
+            reward_rows()
+        )
+
+        # total_points - сумма наград текущего соревнования, как его поддерживает ledger.py
+        cursor.execute(
+            "UPDATE users u SET total_points = r.total "
+            "FROM (SELECT user_id, SUM(points_amount) AS total FROM rewards GROUP BY user_id) r "
+            "WHERE u.id = r.user_id AND u.email LIKE %s",
+            (BENCH_EMAIL_PATTERN,)
+        )
+
+        cursor.execute("ANALYZE users; ANALYZE tasks; ANALYZE rewards;")
+        raw.commit()
+    finally:
+        raw.close()
+
+    state = {
+        "seed": seed,
+        "password": BENCH_PASSWORD,
+        "users": users,
+        "user_id_min": min(user_ids) if user_ids else None,
+        "user_id_max": max(user_ids) if user_ids else None,
+        "competition_ids": competition_ids,
+        "active_competition_id": active_competition,
+    }
+    with open(STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+    elapsed = time.perf_counter() - started
+    total = user_count + task_count + reward_count + len(competition_ids)
+    print(f"Создано строк: {total} (users={user_count}, tasks={task_count}, rewards={reward_count}, "
+          f"competitions={len(competition_ids)}) за {elapsed:.1f} с")
+    print(f"Состояние сохранено в {STATE_FILE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация данных для нагрузочного тестирования")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tasks-per-user", type=int, default=10)
+    parser.add_argument("--rewards-per-user", type=int, default=5)
+    parser.add_argument("--competitions", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="удалить ранее сгенерированные данные")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_bench_data()
+    else:
+        generate(args.users, args.tasks_per_user, args.rewards_per_user, args.competitions, args.seed)
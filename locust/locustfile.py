@@ -78,7 +78,7 @@ class BookingSystemUser(HttpUser):
                 if resp.status_code == 200:
                     try:
                         data = resp.json()
-                        self.current_competition_id = data.get("current_competition_id")
+                        self.current_competition_id = data.get("cur_comp")
                     except Exception:
                         resp.failure("Не удалось распарсить /users/me")
 
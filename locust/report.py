@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Машиночитаемые результаты нагрузочных тестов.
+
+summarize - превращает CSV locust (--csv=<prefix>) в JSON с p50/p95/p99 по эндпоинтам:
+    python locust/report.py summarize bench_results/dashboard --scenario dashboard
+
+compare - сравнивает два JSON (например, с разных коммитов) и завершается с кодом 1,
+если p95 или p99 какого-либо эндпоинта выросли больше порога:
+    python locust/report.py compare base.json head.json --threshold 10
+"""
+
+import argparse
+import csv
+import json
+import subprocess
+import sys
+from datetime import datetime
+
+PERCENTILES = {"p50": "50%", "p95": "95%", "p99": "99%"}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def summarize(prefix: str, scenario: str) -> dict:
+    endpoints = {}
+    with open(f"{prefix}_stats.csv", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            # Строка "Aggregated" не имеет типа запроса
+            name = f"{row['Type']} {row['Name']}" if row["Type"] else row["Name"]
+            endpoints[name] = {
+                **{key: float(row[column] or 0) for key, column in PERCENTILES.items()},
+                "requests": int(row["Request Count"]),
+                "failures": int(row["Failure Count"]),
+                "rps": float(row["Requests/s"] or 0),
+            }
+    result = {
+        "scenario": scenario,
+        "commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "endpoints": endpoints,
+    }
+    output = f"{prefix}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Сводка сохранена в {output}")
+    return result
+
+
+def compare(base_path: str, head_path: str, threshold: float) -> int:
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(head_path, encoding="utf-8") as f:
+        head = json.load(f)
+
+    regressions = 0
+    print(f"{'эндпоинт':<40} {'метрика':<6} {base['commit']:>10} {head['commit']:>10} {'изм.':>8}")
+    for name, head_stats in sorted(head["endpoints"].items()):
+        base_stats = base["endpoints"].get(name)
+        if not base_stats:
+            continue
+        for key in PERCENTILES:
+            before, after = base_stats[key], head_stats[key]
+            change = (after - before) / before * 100 if before else 0.0
+            marker = ""
+            if key != "p50" and change > threshold:
+                regressions += 1
+                marker = "  <- регрессия"
+            print(f"{name:<40} {key:<6} {before:>10.0f} {after:>10.0f} {change:>+7.1f}%{marker}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сводка и сравнение результатов locust")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summarize_parser = subparsers.add_parser("summarize")
+    summarize_parser.add_argument("prefix", help="префикс, переданный в locust --csv")
+    summarize_parser.add_argument("--scenario", default="default")
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="допустимый рост p95/p99, %%")
+
+    args = parser.parse_args()
+    if args.command == "summarize":
+        summarize(args.prefix, args.scenario)
+    else:
+        sys.exit(compare(args.base, args.head, args.threshold))
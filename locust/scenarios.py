@@ -0,0 +1,147 @@
+"""
+Сценарии нагрузочного тестирования на данных из locust/generate_data.py.
+
+Профили (выбираются именем класса):
+    DashboardReader      - чтение дашборда: задачи, профиль, справочники, награды
+    CompetitionKickoff   - старт соревнования: массовая запись участников и создание задач через /chat
+    CompletionStorm      - конец дня: выполнение задач с начислением баллов, как до /complete:
+                           PUT /tasks/{id} со статусом done, затем POST /rewards (сравнимо с базовой версией)
+    CompletionStormComplete - то же одним запросом POST /tasks/{id}/complete
+    LeaderboardPoller    - опрос таблицы лидеров
+
+Пример:
+    locust -f locust/scenarios.py --host=http://127.0.0.1:8000 --headless -u 200 -r 20 -t 2m \
+        --csv=bench_results/dashboard DashboardReader
+    python locust/report.py summarize bench_results/dashboard --scenario dashboard
+"""
+
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from locust import HttpUser, task, between
+
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_state.json")
+
+with open(STATE_FILE, "r", encoding="utf-8") as f:
+    BENCH_STATE = json.load(f)
+
+
+class BenchUser(HttpUser):
+    abstract = True
+    wait_time = between(0.5, 2)
+    email = None
+
+    def on_start(self):
+        if self.email is None:
+            self.email = f"bench_{random.randrange(BENCH_STATE['users'])}@bench.local"
+        resp = self.client.post("/login", json={"email": self.email, "password": BENCH_STATE["password"]},
+                                name="/login")
+        self.headers = {"Authorization": f"Bearer {resp.json()['access_token']}"} if resp.status_code == 200 else {}
+        me = self.client.get("/users/me", headers=self.headers, name="/users/me")
+        self.competition_id = me.json().get("cur_comp") if me.status_code == 200 else None
+
+
+class DashboardReader(BenchUser):
+    @task(5)
+    def tasks(self):
+        self.client.get("/tasks", headers=self.headers, name="/tasks")
+
+    @task(3)
+    def me(self):
+        self.client.get("/users/me", headers=self.headers, name="/users/me")
+
+    @task(2)
+    def latest(self):
+        self.client.get("/tasks/latest", headers=self.headers, name="/tasks/latest")
+
+    @task(2)
+    def rewards(self):
+        self.client.get("/rewards", headers=self.headers, name="/rewards")
+
+    @task(1)
+    def reference_data(self):
+        self.client.get("/task-statuses", name="/task-statuses")
+        self.client.get("/tags", name="/tags")
+
+    @task(1)
+    def competition_dates(self):
+        if self.competition_id:
+            self.client.get(f"/competitions/{self.competition_id}/dates", headers=self.headers,
+                            name="/competitions/{id}/dates")
+
+
+class CompetitionKickoff(BenchUser):
+    email = "bench_manager@bench.local"
+
+    def _random_user_ids(self, count):
+        return random.sample(range(BENCH_STATE["user_id_min"], BENCH_STATE["user_id_max"] + 1), count)
+
+    @task(3)
+    def enroll(self):
+        for user_id in self._random_user_ids(10):
+            self.client.put(f"/users/{user_id}/competition",
+                            json={"competition_id": BENCH_STATE["active_competition_id"]},
+                            headers=self.headers, name="/users/{id}/competition")
+
+    @task(1)
+    def chat_create_task(self):
+        due = (datetime.utcnow() + timedelta(days=random.randint(1, 20))).strftime("%d.%m.%Y")
+        message = f"Создай задачу 'Подготовить отчёт {random.randint(1, 10 ** 6)}' на {due}, статус В работе, тег срочно"
+        self.client.post("/chat", json={"message": message, "user_ids": self._random_user_ids(5)},
+                         headers=self.headers, name="/chat")
+
+
+class CompletionUser(BenchUser):
+    abstract = True
+
+    def on_start(self):
+        super().on_start()
+        statuses = self.client.get("/task-statuses", name="/task-statuses").json()
+        self.done_status_id = next((s["id"] for s in statuses if s["code"] == "done"), None)
+        reward_types = self.client.get("/reward-types", name="/reward-types").json()
+        self.reward_type_id = reward_types[0]["id"] if reward_types else None
+
+    def open_task(self):
+        """Случайная невыполненная задача пользователя или None."""
+        tasks = self.client.get("/tasks", headers=self.headers, name="/tasks").json()
+        open_tasks = [t for t in tasks if t["status_id"] != self.done_status_id]
+        if not open_tasks or self.done_status_id is None:
+            return None
+        return random.choice(open_tasks)
+
+
+class CompletionStorm(CompletionUser):
+    @task
+    def complete_task(self):
+        chosen = self.open_task()
+        if chosen is None or self.reward_type_id is None:
+            return
+        resp = self.client.put(f"/tasks/{chosen['id']}", json={"status_id": self.done_status_id},
+                               headers=self.headers, name="/tasks/{id}")
+        if resp.status_code != 200 or not chosen["estimated_points"]:
+            return
+        self.client.post("/rewards", json={
+            "type_id": self.reward_type_id,
+            "points_amount": chosen["estimated_points"],
+            "reason": f"Выполнена задача (ID: {chosen['id']})",
+        }, headers=self.headers, name="/rewards")
+
+
+class CompletionStormComplete(CompletionUser):
+    @task
+    def complete_task(self):
+        chosen = self.open_task()
+        if chosen is None:
+            return
+        self.client.post(f"/tasks/{chosen['id']}/complete", headers=self.headers, name="/tasks/{id}/complete")
+
+
+class LeaderboardPoller(BenchUser):
+    wait_time = between(1, 3)
+
+    @task
+    def leaderboard(self):
+        competition_id = self.competition_id or BENCH_STATE["active_competition_id"]
+        self.client.get(f"/leaderboard/{competition_id}", name="/leaderboard/{id}")
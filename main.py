@@ -1,17 +1,69 @@
+import time
+
+# Засекаем время старта воркера до импорта роутов
+_BOOT_STARTED = time.perf_counter()
+
 import os
+import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from routes import router
+from ml.provider import ai_provider
+from metrics import MetricsMiddleware, mark_worker_dead
+from db import TESTING, ReadYourWritesMiddleware
+from idempotency import IdempotencyMiddleware
+from rate_limit import RateLimitMiddleware
+from notifications import listener
+from reference_cache import warm_up
+from leaderboard_history import snapshot_scheduler
+from user_import import shutdown_hash_pool
 
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
+
+# Логи приложения (медленные запросы, N+1, тайминги этапов) в stdout рядом с логами uvicorn
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Справочники загружаются до первого запроса; в тестах один процесс и слушатель не нужен
+    warm_up()
+    if not TESTING:
+        listener.start()
+        snapshot_scheduler.start()
+    # Время от импорта main до готовности воркера принимать запросы
+    app.state.boot_seconds = time.perf_counter() - _BOOT_STARTED
+    print(
+        f"Воркер {os.getpid()} запущен за {app.state.boot_seconds * 1000:.0f} мс "
+        f"(AI: {'включён' if ai_provider.enabled else 'отключён'})"
+    )
+    yield
+    listener.stop()
+    snapshot_scheduler.stop()
+    shutdown_hash_pool()
+    mark_worker_dead()
+
 
 app = FastAPI(
     title="Gamification API",
     description="FastAPI + PostgreSQL с автоматическим созданием всех таблиц",
-    version="0.1.0"
+    version="0.1.0",
+    # orjson вместо стандартного json для всех ответов с response_model
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# Последний добавленный middleware - внешний: повтор по Idempotency-Key отвечает, не расходуя лимиты AI
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router)
 
 app.mount("/assets", StaticFiles(directory="frontend/dist/assets"), name="assets")
@@ -0,0 +1,224 @@
+"""
+Метрики приложения в формате Prometheus.
+
+Несколько воркеров uvicorn агрегируются через multiprocess-режим prometheus_client:
+start.py задаёт PROMETHEUS_MULTIPROC_DIR, каждый воркер пишет туда свои значения,
+а /metrics собирает их в один ответ.
+"""
+import os
+import json
+import time
+import logging
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from starlette.routing import Match
+
+from db import engine, DEBUG, RequestQueryStats, request_query_stats
+from timing import RequestTimings, request_timings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Количество HTTP-запросов",
+    ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Длительность обработки HTTP-запроса",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Запросы в обработке",
+    ["method", "route"], multiprocess_mode="livesum"
+)
+DB_POOL = Gauge(
+    "db_pool_connections", "Состояние пула соединений SQLAlchemy",
+    ["state"], multiprocess_mode="livesum"
+)
+DB_QUERIES = Histogram(
+    "db_queries_per_request", "Количество SQL-запросов на один HTTP-запрос",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+YANDEX_REQUESTS = Counter(
+    "yandex_requests_total", "HTTP-запросы к Yandex Cloud API по исходу",
+    ["outcome"]
+)
+YANDEX_LATENCY = Histogram(
+    "yandex_request_duration_seconds", "Длительность HTTP-запроса к Yandex Cloud API",
+    ["outcome"], buckets=LATENCY_BUCKETS
+)
+AI_CALLS = Counter(
+    "ai_calls_total", "Вызовы AI-анализатора по источнику результата (llm, worker, shared)",
+    ["kind", "source"]
+)
+COMMAND_PARSES = Counter(
+    "chat_command_parses_total", "Сообщения чата по исходу разбора правилами (hit - без языковой модели)",
+    ["result"]
+)
+COMMAND_PARSE_LATENCY = Histogram(
+    "chat_command_parse_duration_seconds", "Длительность разбора сообщения чата",
+    ["parser"], buckets=(0.0001, 0.0005, 0.001) + LATENCY_BUCKETS
+)
+MODERATION_REJECTIONS = Counter(
+    "chat_moderation_rejections_total", "Сообщения чата, отклонённые локальной модерацией до вызова AI",
+    ["category"]
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+router = APIRouter()
+
+logger = logging.getLogger("db")
+timing_logger = logging.getLogger("timing")
+
+
+def resolve_route_template(scope) -> str:
+    """
+    Возвращает шаблон маршрута (/leaderboard/{competition_id}) вместо сырого пути,
+    чтобы число рядов метрик не зависело от значений параметров.
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or UNMATCHED_ROUTE
+
+
+def observe_yandex_call(outcome: str, seconds: float):
+    """Фиксирует один HTTP-запрос к Yandex Cloud API (ok, rate_limited, http_error, network_error)."""
+    YANDEX_REQUESTS.labels(outcome=outcome).inc()
+    YANDEX_LATENCY.labels(outcome=outcome).observe(seconds)
+
+
+def observe_ai_call(kind: str, source: str):
+    """
+    Фиксирует вызов анализатора: llm - запрос к модели, worker - результат параллельного
+    вызова в этом воркере, shared - результат другого воркера (см. ml/singleflight.py).
+    """
+    AI_CALLS.labels(kind=kind, source=source).inc()
+
+
+def observe_command_parse(parser: str, seconds: float, hit: bool = None):
+    """
+    Фиксирует разбор сообщения чата: parser - rules (ml/command_parser.py) или llm.
+    Для rules hit показывает, обошлось ли сообщение без модели.
+    """
+    COMMAND_PARSE_LATENCY.labels(parser=parser).observe(seconds)
+    if hit is not None:
+        COMMAND_PARSES.labels(result="hit" if hit else "miss").inc()
+
+
+def observe_moderation_rejection(category: str):
+    """Фиксирует отказ модерации по категории терминов (см. ml/moderation.py)."""
+    MODERATION_REJECTIONS.labels(category=category).inc()
+
+
+def _update_pool_stats():
+    pool = engine.pool
+    DB_POOL.labels(state="size").set(pool.size())
+    DB_POOL.labels(state="checked_out").set(pool.checkedout())
+    DB_POOL.labels(state="overflow").set(max(pool.overflow(), 0))
+
+
+def mark_worker_dead():
+    """Удаляет live-гейджи завершившегося воркера из общего каталога метрик."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def _timing_headers(query_stats: RequestQueryStats, timings: RequestTimings):
+    """
+    Заголовки со временем этапов: Server-Timing со спанами отдаётся всегда, когда они есть,
+    а X-DB-Queries и запись db в Server-Timing без спанов - только в режиме отладки.
+    """
+    headers = []
+    entries = [f"{name};dur={ms:.1f}" for name, ms in timings.as_dict().items()]
+    if entries or DEBUG:
+        entries.append(f'db;dur={query_stats.total_seconds * 1000:.1f};desc="{query_stats.count} queries"')
+        headers.append((b"server-timing", ", ".join(entries).encode()))
+    if DEBUG:
+        headers.append((b"x-db-queries", str(query_stats.count).encode()))
+    return headers
+
+
+def _log_timings(method: str, route: str, status_code: int, seconds: float,
+                 query_stats: RequestQueryStats, timings: RequestTimings):
+    """Одна JSON-строка на запрос со спанами: по ней видно, где ушло время (Yandex, Postgres или наш код)."""
+    timing_logger.info(json.dumps({
+        "event": "request_timing",
+        "method": method,
+        "route": route,
+        "status": status_code,
+        "total_ms": round(seconds * 1000, 2),
+        "db_ms": round(query_stats.total_seconds * 1000, 2),
+        "db_queries": query_stats.count,
+        "spans": timings.as_dict(),
+    }, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: счётчик запросов, гистограмма задержек и in-flight по шаблону маршрута.
+    Также собирает статистику SQL-запросов и спаны этапов, предупреждает о вероятных N+1.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = resolve_route_template(scope)
+        status_code = 500
+        started = time.perf_counter()
+        query_stats = RequestQueryStats()
+        stats_token = request_query_stats.set(query_stats)
+        timings = RequestTimings()
+        timings_token = request_timings.set(timings)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + _timing_headers(query_stats, timings)
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method=method, route=route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_query_stats.reset(stats_token)
+            request_timings.reset(timings_token)
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            DB_QUERIES.labels(route=route).observe(query_stats.count)
+            for statement, count in query_stats.repeated_templates():
+                logger.warning(
+                    "Вероятный N+1 в %s %s: запрос выполнен %d раз: %s",
+                    method, route, count, " ".join(statement.split())
+                )
+            if timings.spans:
+                _log_timings(method, route, status_code, elapsed, query_stats, timings)
+            HTTP_LATENCY.labels(method=method, route=route).observe(elapsed)
+            HTTP_REQUESTS.labels(method=method, route=route, status=str(status_code)).inc()
+            _update_pool_stats()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
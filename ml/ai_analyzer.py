@@ -6,54 +6,105 @@ import requests  # Для выполнения HTTP запросов к Yandex C
 import json  # Для парсинга JSON ответов от API
 import time  # Для реализации задержек при повторных попытках запросов
 from typing import Dict, Any  # Для типизации возвращаемых значений функций
+from functools import lru_cache  # Для однократного чтения файлов с примерами
+
+from ml.errors import YandexRateLimitError, YandexAPIError, AIDisabledError  # Исключения AI-сервиса (реэкспорт для совместимости)
+from metrics import observe_yandex_call  # Метрики задержки и исходов запросов к Yandex Cloud API
+from rate_limit import record_ai_tokens  # Учёт токенов Yandex в дневном бюджете пользователя
+
+# URL эндпоинта Yandex Cloud API для completions (переопределяется для локального стенда, см. ml/fake_yandex.py)
+YANDEX_API_URL = os.getenv("YANDEX_API_URL", "https://llm.api.cloud.yandex.net/foundationModels/v1/completion")
+# Таймаут HTTP-запроса и параметры повторов (для нагрузочных прогонов против стенда)
+YANDEX_TIMEOUT_SECONDS = float(os.getenv("YANDEX_TIMEOUT_SECONDS", "30"))
+YANDEX_MAX_RETRIES = int(os.getenv("YANDEX_MAX_RETRIES", "3"))
+YANDEX_RETRY_DELAY_SECONDS = float(os.getenv("YANDEX_RETRY_DELAY_SECONDS", "2"))
+# Название модели для использования (Llama 3.1 70B Instruct)
+MODEL_NAME = "gpt://b1g58ef69g4uvpd24sk0/yandexgpt/rc"
+
+# Формируем полные пути к файлам с примерами для few-shot learning
+_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "task_examples.txt")
+_COMPLEXITY_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "complexity_examples.txt")
 
 
-class YandexRateLimitError(Exception):
+def _get_api_key() -> str:
     """
-    Специальное исключение для ошибок rate limit Yandex Cloud API.
-    Пробрасывается когда исчерпаны все попытки retry при ошибке 429.
+    Возвращает API ключ Yandex Cloud.
+    Ключ читается при вызове, а не при импорте: без ключа приложение
+    стартует в режиме "AI отключён", а запросы к AI получают AIDisabledError.
     """
-    pass
+    api_key = os.getenv("YANDEX_API_KEY")
+    if not api_key:
+        raise AIDisabledError("YANDEX_API_KEY не задан. AI-сервис отключён.")
+    return api_key
 
 
-class YandexAPIError(Exception):
+@lru_cache(maxsize=None)
+def _read_examples(path: str) -> str:
     """
-    Общее исключение для ошибок Yandex Cloud API.
-    Используется для других ошибок API (не rate limit).
+    Читает файл с примерами один раз за время жизни воркера.
+    Если файл не найден или ошибка чтения, используем пустую строку.
     """
-    pass
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception:
+        return ""
 
-# Получаем API ключ из переменных окружения
-YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 
-# Проверяем наличие ключа, без него работа невозможна
-if not YANDEX_API_KEY:
-    raise EnvironmentError("YANDEX_API_KEY не задан. Установите переменную окружения.")
+def _outcome_for_status(status_code: int) -> str:
+    """Исход HTTP-запроса к Yandex Cloud API для метрик."""
+    if status_code == 200:
+        return "ok"
+    if status_code == 429:
+        return "rate_limited"
+    return "http_error"
 
-# URL эндпоинта Yandex Cloud API для completions
-YANDEX_API_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-# Название модели для использования (Llama 3.1 70B Instruct)
-MODEL_NAME = "gpt://b1g58ef69g4uvpd24sk0/yandexgpt/rc"
 
-# Формируем полный путь к файлу с примерами задач для обучения модели
-_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "task_examples.txt")
-try:
-    # Пытаемся прочитать файл с примерами задач
-    with open(_EXAMPLES_PATH, "r", encoding="utf-8") as f:
-        TASK_EXAMPLES = f.read()
-except Exception:
-    # Если файл не найден или ошибка чтения, используем пустую строку
-    TASK_EXAMPLES = ""
-
-# Формируем полный путь к файлу с примерами оценки сложности
-_COMPLEXITY_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "complexity_examples.txt")
-try:
-    # Пытаемся прочитать файл с примерами оценки сложности
-    with open(_COMPLEXITY_EXAMPLES_PATH, "r", encoding="utf-8") as f:
-        COMPLEXITY_EXAMPLES = f.read()
-except Exception:
-    # Если файл не найден или ошибка чтения, используем пустую строку
-    COMPLEXITY_EXAMPLES = ""
+def _clean_model_json(content: str) -> str:
+    """
+    Очищает ответ модели перед json.loads: убирает markdown код-блоки (```json ... ```)
+    и обрезает хвост после последней закрывающей скобки, если ответ оборван.
+    """
+    cleaned_content = content.strip()
+
+    # Убираем markdown код-блоки, если они есть
+    if cleaned_content.startswith("```"):
+        # Находим первую закрывающую ```
+        end_marker = cleaned_content.find("```", 3)
+        if end_marker != -1:
+            # Извлекаем содержимое между маркерами
+            cleaned_content = cleaned_content[3:end_marker].strip()
+            # Убираем возможный префикс "json" после первой ```
+            if cleaned_content.startswith("json"):
+                cleaned_content = cleaned_content[4:].strip()
+        else:
+            # Если закрывающего маркера нет, просто убираем открывающий
+            cleaned_content = cleaned_content[3:].strip()
+            if cleaned_content.startswith("json"):
+                cleaned_content = cleaned_content[4:].strip()
+
+    # Если ответ обрезан (не заканчивается на } или ]), пытаемся найти последний валидный JSON объект
+    if not (cleaned_content.endswith("}") or cleaned_content.endswith("]")):
+        # Пытаемся найти последнюю закрывающую скобку
+        last_brace = cleaned_content.rfind("}")
+        last_bracket = cleaned_content.rfind("]")
+        if last_brace > last_bracket and last_brace > 0:
+            # Пробуем обрезать до последней закрывающей скобки
+            potential_json = cleaned_content[:last_brace + 1]
+            try:
+                # Проверяем, валиден ли обрезанный JSON
+                json.loads(potential_json)
+                cleaned_content = potential_json
+            except json.JSONDecodeError:
+                pass  # Если не получилось, используем оригинальный
+
+    return cleaned_content
+
+
+def _parse_model_json(content: str) -> dict:
+    """Разбирает JSON из текстового ответа модели (см. _clean_model_json)."""
+    return json.loads(_clean_model_json(content))
+
 
 def _call_yandex_with_messages(messages: list, temperature: float = 0.3, max_tokens: int = 5000, json_mode: bool = False) -> dict:
     """
@@ -71,7 +122,7 @@ def _call_yandex_with_messages(messages: list, temperature: float = 0.3, max_tok
     """
     # Формируем заголовки для HTTP запроса с авторизацией
     headers = {
-        "Authorization": f"Api-Key {YANDEX_API_KEY}",  # Api-Key токен для аутентификации
+        "Authorization": f"Api-Key {_get_api_key()}",  # Api-Key токен для аутентификации
         "Content-Type": "application/json"  # Указываем, что отправляем JSON
     }
 
@@ -119,14 +170,20 @@ def _call_yandex_with_messages(messages: list, temperature: float = 0.3, max_tok
     }
 
     # Параметры для механизма повторных попыток
-    max_retries = 3  # Максимальное количество попыток запроса
-    retry_delay = 2  # Начальная задержка в секундах между попытками
+    max_retries = YANDEX_MAX_RETRIES  # Максимальное количество попыток запроса
+    retry_delay = YANDEX_RETRY_DELAY_SECONDS  # Начальная задержка в секундах между попытками
     
     # Цикл повторных попыток
     for attempt in range(max_retries):
         try:
-            # Выполняем POST запрос к Yandex Cloud API
-            response = requests.post(YANDEX_API_URL, headers=headers, json=payload, timeout=30)
+            # Выполняем POST запрос к Yandex Cloud API и фиксируем его длительность и исход в метриках
+            request_started = time.perf_counter()
+            try:
+                response = requests.post(YANDEX_API_URL, headers=headers, json=payload, timeout=YANDEX_TIMEOUT_SECONDS)
+            except requests.exceptions.RequestException:
+                observe_yandex_call("network_error", time.perf_counter() - request_started)
+                raise
+            observe_yandex_call(_outcome_for_status(response.status_code), time.perf_counter() - request_started)
             
             # Проверяем статус ответа
             if response.status_code != 200:
@@ -151,6 +208,9 @@ def _call_yandex_with_messages(messages: list, temperature: float = 0.3, max_tok
             if "result" not in response_data:
                 print(f"Неожиданная структура ответа: {response_data}")
                 raise ValueError(f"Неожиданная структура ответа от API: отсутствует поле 'result'")
+
+            # Токены из usage учитываются в дневном бюджете пользователя (см. rate_limit.py)
+            record_ai_tokens(response_data["result"].get("usage"))
             
             if "alternatives" not in response_data["result"] or len(response_data["result"]["alternatives"]) == 0:
                 print(f"Неожиданная структура ответа: {response_data}")
@@ -160,47 +220,14 @@ def _call_yandex_with_messages(messages: list, temperature: float = 0.3, max_tok
             
             # Если требуется JSON режим, парсим JSON
             if json_mode:
+                cleaned_content = _clean_model_json(content)
                 try:
-                    # Очищаем ответ от markdown код-блоков (```json ... ``` или ``` ... ```)
-                    cleaned_content = content.strip()
-                    
-                    # Убираем markdown код-блоки, если они есть
-                    if cleaned_content.startswith("```"):
-                        # Находим первую закрывающую ```
-                        end_marker = cleaned_content.find("```", 3)
-                        if end_marker != -1:
-                            # Извлекаем содержимое между маркерами
-                            cleaned_content = cleaned_content[3:end_marker].strip()
-                            # Убираем возможный префикс "json" после первой ```
-                            if cleaned_content.startswith("json"):
-                                cleaned_content = cleaned_content[4:].strip()
-                        else:
-                            # Если закрывающего маркера нет, просто убираем открывающий
-                            cleaned_content = cleaned_content[3:].strip()
-                            if cleaned_content.startswith("json"):
-                                cleaned_content = cleaned_content[4:].strip()
-                    
-                    # Если ответ обрезан (не заканчивается на } или ]), пытаемся найти последний валидный JSON объект
-                    if not (cleaned_content.endswith("}") or cleaned_content.endswith("]")):
-                        # Пытаемся найти последнюю закрывающую скобку
-                        last_brace = cleaned_content.rfind("}")
-                        last_bracket = cleaned_content.rfind("]")
-                        if last_brace > last_bracket and last_brace > 0:
-                            # Пробуем обрезать до последней закрывающей скобки
-                            potential_json = cleaned_content[:last_brace + 1]
-                            try:
-                                # Проверяем, валиден ли обрезанный JSON
-                                test_parse = json.loads(potential_json)
-                                cleaned_content = potential_json
-                            except:
-                                pass  # Если не получилось, используем оригинальный
-                    
                     # Парсим очищенный JSON
                     return json.loads(cleaned_content)
                 except json.JSONDecodeError as e:
                     print(f"Ошибка парсинга JSON из ответа модели.")
                     print(f"Исходный ответ (первые 500 символов): {content[:500]}")
-                    print(f"Очищенный ответ (первые 500 символов): {cleaned_content[:500] if 'cleaned_content' in locals() else 'N/A'}")
+                    print(f"Очищенный ответ (первые 500 символов): {cleaned_content[:500]}")
                     print(f"Ошибка: {str(e)}")
                     raise ValueError(f"Модель вернула невалидный JSON: {str(e)}") from e
             else:
@@ -285,7 +312,7 @@ def analyze_task(title: str, description: str = "") -> Dict[str, Any]:
 }}
 
 Примеры:
-{COMPLEXITY_EXAMPLES}"""  # Вставляем примеры из файла для few-shot learning
+{_read_examples(_COMPLEXITY_EXAMPLES_PATH)}"""  # Вставляем примеры из файла для few-shot learning
 
     # Промпт пользователя - данные задачи для оценки
     user_prompt = f"Название: {title}\nОписание: {description}"
@@ -419,7 +446,7 @@ def analyze_task_with_commands(
 
 Формат ответа СТРОГО как в примерах. Никаких отклонений!
 
-{TASK_EXAMPLES}"""  # Вставляем примеры из файла для обучения модели правильному формату ответа
+{_read_examples(_EXAMPLES_PATH)}"""  # Вставляем примеры из файла для обучения модели правильному формату ответа
 
     try:
         # Формируем сообщения: системная инструкция + запрос пользователя
@@ -0,0 +1,141 @@
+# ml/command_parser.py
+# Детерминированный разбор команд чата по документированному шаблону:
+#     Создай задачу 'Купить фрукты' на 12.12.2025, статус В работе, тег срочно
+# Возвращает ту же структуру {"reply", "commands"}, что и analyze_task_with_commands,
+# плюс confidence. Провайдер (ml/provider.py) обращается к языковой модели за разбором
+# только если confidence ниже COMMAND_PARSER_MIN_CONFIDENCE: нет названия в кавычках,
+# нет глагола-команды или в сообщении есть части, которые разбор не распознал
+# ("послезавтра", "после обеда" и т.п.).
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+COMMAND_PARSER_MIN_CONFIDENCE = float(os.getenv("COMMAND_PARSER_MIN_CONFIDENCE", "0.9"))
+
+# Теги срочности в порядке проверки: "очень срочно" и "несрочно" содержат "срочно"
+URGENCY_TAGS = ["очень срочно", "несрочно", "срочно"]
+
+DEFAULT_DESCRIPTION = "Нет описания"
+
+_TRIGGER = re.compile(
+    r"^\s*(?:пожалуйста,?\s+)?(?:создай|создайте|создать|добавь|добавьте|добавить|поставь|поставьте)\s+"
+    r"(?P<urgency>очень\s+срочную\s+|срочную\s+|несрочную\s+)?(?:новую\s+)?задачу\b",
+    re.IGNORECASE,
+)
+_TITLE = re.compile(r"['\"«“„](?P<title>[^'\"«»“”„]+)['\"»”“]")
+_DATE = re.compile(r"^(?:на|до|к|срок(?:\s+до)?|дедлайн)?\s*[:\-]?\s*(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4})$",
+                   re.IGNORECASE)
+_STATUS = re.compile(r"^статус(?:ом)?\s*[:\-]?\s*(?P<value>.+)$", re.IGNORECASE)
+_TAG = re.compile(r"^(?:тег|теги|метка|срочность)\s*[:\-]?\s*(?P<value>.+)$", re.IGNORECASE)
+# Описание идёт последним и забирает остаток сообщения вместе с запятыми
+_DESCRIPTION = re.compile(r"[,;]\s*(?:описание|подробнее)\s*[:\-]?\s*(?P<value>.+)$", re.IGNORECASE | re.DOTALL)
+_TITLE_PREFIX = re.compile(r"^[\s,.:\-]*(?:(?:под|с)\s+названием)?[\s,.:\-]*$", re.IGNORECASE)
+_CLAUSES = re.compile(r"[,;]|\s+и\s+(?=статус|тег|срок|на\s+\d)", re.IGNORECASE)
+
+_URGENCY_ADJECTIVES = {"очень срочную": "очень срочно", "срочную": "срочно", "несрочную": "несрочно"}
+
+_REPLIES = {
+    "срочно": "Создаю срочную задачу '{title}'",
+    "очень срочно": "Создаю критическую задачу '{title}'",
+}
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.lower().replace("ё", "е").split())
+
+
+def _parse_date(match) -> Optional[str]:
+    try:
+        moment = datetime(int(match["year"]), int(match["month"]), int(match["day"]))
+    except ValueError:
+        return None
+    return moment.strftime("%Y-%m-%dT00:00:00")
+
+
+def _match_status(value: str, statuses: List[Dict]) -> Optional[str]:
+    wanted = _normalize(value)
+    for status in statuses:
+        if wanted in (_normalize(status["code"]), _normalize(status["name"])):
+            return status["code"]
+    return None
+
+
+def _match_tag(value: str, tags: List[str]) -> Optional[str]:
+    wanted = _normalize(value)
+    for tag in URGENCY_TAGS:
+        if wanted == tag and tag in tags:
+            return tag
+    return None
+
+
+def parse_command(user_message: str, available_statuses: List[Dict], available_tags: List[str]) -> Dict:
+    """
+    Разбирает сообщение без модели. Возвращает {"reply", "commands", "confidence"};
+    при confidence ниже COMMAND_PARSER_MIN_CONFIDENCE commands пуст и ответ нужно получать у модели.
+    """
+    miss = {"reply": "", "commands": [], "confidence": 0.0}
+    trigger = _TRIGGER.match(user_message)
+    title_match = _TITLE.search(user_message)
+    if not title_match or not title_match["title"].strip():
+        return miss
+
+    confidence = 1.0 if trigger else 0.5
+    status_codes = {status["code"] for status in available_statuses}
+    tags = [_normalize(tag) for tag in available_tags]
+    task_data = {
+        "title": " ".join(title_match["title"].split()),
+        "description": DEFAULT_DESCRIPTION,
+        "status_code": "todo" if "todo" in status_codes or not available_statuses else available_statuses[0]["code"],
+        "due_date": None,
+        "tags": [],
+    }
+    if trigger and trigger["urgency"]:
+        urgency = _URGENCY_ADJECTIVES[_normalize(trigger["urgency"])]
+        if urgency in tags:
+            task_data["tags"] = [urgency]
+
+    before = _TITLE_PREFIX.sub("", user_message[trigger.end() if trigger else 0:title_match.start()])
+    after = user_message[title_match.end():]
+    if match := _DESCRIPTION.search(after):
+        task_data["description"] = " ".join(match["value"].split()).rstrip(".") or DEFAULT_DESCRIPTION
+        after = after[:match.start()]
+    unresolved = [before] if before else []
+    for clause in _CLAUSES.split(after):
+        clause = clause.strip(" .!")
+        if not clause:
+            continue
+        if match := _DATE.match(clause):
+            task_data["due_date"] = _parse_date(match)
+            if task_data["due_date"] is None:
+                unresolved.append(clause)
+        elif match := _STATUS.match(clause):
+            code = _match_status(match["value"], available_statuses)
+            if code:
+                task_data["status_code"] = code
+            else:
+                unresolved.append(clause)
+        elif match := _TAG.match(clause):
+            tag = _match_tag(match["value"], tags)
+            if tag:
+                task_data["tags"] = [tag]
+            else:
+                unresolved.append(clause)
+        elif tag := _match_tag(clause, tags):
+            task_data["tags"] = [tag]
+        else:
+            unresolved.append(clause)
+
+    # Каждая нераспознанная часть может менять смысл команды: дата словами, уточнение и т.п.
+    confidence *= 0.5 ** len(unresolved)
+    if confidence < COMMAND_PARSER_MIN_CONFIDENCE:
+        return {**miss, "confidence": confidence}
+
+    tag = task_data["tags"][0] if task_data["tags"] else None
+    reply = _REPLIES.get(tag, "Создаю задачу '{title}'").format(title=task_data["title"])
+    return {
+        "reply": reply,
+        "commands": [{"action": "create_task", "task_data": task_data}],
+        "confidence": confidence,
+    }
@@ -0,0 +1,39 @@
+# ml/errors.py
+# Исключения AI-сервиса. Вынесены в отдельный модуль, чтобы роуты могли
+# обрабатывать их, не импортируя ml.ai_analyzer (и requests) при старте воркера.
+
+import sys
+
+
+class YandexRateLimitError(Exception):
+    """
+    Специальное исключение для ошибок rate limit Yandex Cloud API.
+    Пробрасывается когда исчерпаны все попытки retry при ошибке 429.
+    """
+    pass
+
+
+class YandexAPIError(Exception):
+    """
+    Общее исключение для ошибок Yandex Cloud API.
+    Используется для других ошибок API (не rate limit).
+    """
+    pass
+
+
+def http_errors() -> tuple:
+    """
+    Типы HTTP-ошибок requests для except в роутах: (requests.exceptions.HTTPError,), если requests
+    уже загружен (его загружает ml.ai_analyzer при первом вызове модели), иначе пустой кортеж -
+    пока модуль не импортирован, такой ошибки возникнуть не может.
+    """
+    requests = sys.modules.get("requests")
+    return (requests.exceptions.HTTPError,) if requests is not None else ()
+
+
+class AIDisabledError(YandexAPIError):
+    """
+    AI-сервис отключён (AI_DISABLED=true или не задан YANDEX_API_KEY).
+    Наследуется от YandexAPIError, поэтому роуты отвечают на него 503.
+    """
+    pass
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Локальный стенд Yandex Cloud completion API для нагрузочного тестирования и офлайн-разработки.
+
+Принимает тот же запрос, что и llm.api.cloud.yandex.net (modelUri, completionOptions,
+messages), и отвечает в том же формате. Ответы детерминированы: одинаковый промпт
+всегда даёт одинаковый JSON (оценка сложности или команда create_task), поэтому
+результаты бенчмарков воспроизводимы. Дополнительно умеет:
+
+    --latency             распределение задержки: fixed:500, normal:800,200,
+                          lognormal:800,0.5 (медиана, сигма), uniform:200,1500
+    --rate-limit-rate     доля ответов 429 (проверка повторов и YandexRateLimitError)
+    --error-rate          доля ответов 500
+    --timeout-rate        доля запросов, которые "зависают" на --hang-seconds
+                          (проверка таймаута клиента)
+    completionOptions.stream=true - ответ частями (JSON-объект на строку), как в Yandex API
+
+Запуск:
+
+    python ml/fake_yandex.py --port 8090 --latency lognormal:800,0.4 --rate-limit-rate 0.05
+    YANDEX_API_URL=http://127.0.0.1:8090/foundationModels/v1/completion YANDEX_API_KEY=fake python start.py
+
+GET /stats возвращает счётчики стенда: число запросов по исходам, объём принятых и отданных байт.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION_PATH = "/foundationModels/v1/completion"
+
+DATE_RE = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})")
+TITLE_RE = re.compile(r"['\"«]([^'\"»]+)['\"»]")
+ESTIMATE_RE = re.compile(r"Название: (.*)\nОписание: (.*)\Z", re.S)
+
+
+def _prompt_hash(prompt: str) -> int:
+    """Стабильный между запусками хеш промпта (hash() в Python рандомизирован)."""
+    return int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+
+
+def _estimate_for(prompt: str) -> dict:
+    """Оценка сложности: баллы зависят только от названия и описания задачи."""
+    match = ESTIMATE_RE.search(prompt)
+    title, description = (match.group(1).strip(), match.group(2).strip()) if match else (prompt, "")
+    if len(title.split()) < 2 and not description:
+        return {"estimated_points": None, "explanation": "Задача бессмысленна: нет конкретного действия",
+                "confidence": 1.0}
+    digest = _prompt_hash(f"{title}\n{description}")
+    return {
+        "estimated_points": 1 + digest % 100,
+        "explanation": "Детерминированная оценка локального стенда",
+        "confidence": round(0.5 + (digest >> 8) % 50 / 100, 2),
+    }
+
+
+def _command_for(prompt: str) -> dict:
+    """Команда create_task из сообщения пользователя: название в кавычках и дата ДД.ММ.ГГГГ."""
+    user_message = prompt.rsplit("\n", 1)[-1]
+    title_match = TITLE_RE.search(user_message)
+    date_match = DATE_RE.search(user_message)
+    title = title_match.group(1) if title_match else "Задача"
+    due_date = f"{date_match.group(3)}-{date_match.group(2)}-{date_match.group(1)}T00:00:00" if date_match else None
+    return {
+        "reply": f"Создаю задачу '{title}'",
+        "commands": [{
+            "action": "create_task",
+            "task_data": {
+                "title": title,
+                "description": f"Выполнить: {title} и отчитаться о результате",
+                "status_code": "in_progress" if "В работе" in user_message else "todo",
+                "due_date": due_date,
+                "tags": ["срочно"] if "срочно" in user_message else [],
+            },
+        }],
+    }
+
+
+def _answer_for(prompt: str) -> dict:
+    """Детерминированный JSON-ответ: оценка сложности или команда create_task."""
+    if "Оцени сложность" in prompt:
+        return _estimate_for(prompt)
+    return _command_for(prompt)
+
+
+def parse_latency(spec: str):
+    """
+    Разбирает описание распределения задержки и возвращает функцию rng -> миллисекунды.
+    fixed:MS, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA, uniform:MIN,MAX.
+    """
+    kind, _, raw_params = spec.partition(":")
+    params = [float(p) for p in raw_params.split(",") if p]
+    expected = {"fixed": 1, "normal": 2, "lognormal": 2, "uniform": 2}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"Некорректное распределение задержки: {spec!r}")
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        # Медиана логнормального распределения равна exp(mu)
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    return lambda rng: rng.uniform(params[0], params[1])
+
+
+class FakeYandexConfig:
+    """Параметры поведения стенда и его счётчики (общие для всех потоков сервера)."""
+
+    def __init__(self, latency: str = "fixed:0", rate_limit_rate: float = 0.0, error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 60.0, stream_chunks: int = 5,
+                 seed: int = None):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.stream_chunks = max(1, stream_chunks)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "server_error": 0, "hung": 0,
+                      "unauthorized": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def draw(self):
+        """Выбирает исход запроса и задержку; под блокировкой, чтобы --seed давал воспроизводимую последовательность."""
+        with self.lock:
+            roll = self.rng.random()
+            delay_ms = self.latency(self.rng)
+        if roll < self.rate_limit_rate:
+            return "rate_limited", delay_ms
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            return "server_error", delay_ms
+        roll -= self.error_rate
+        if roll < self.timeout_rate:
+            return "hung", delay_ms
+        return "ok", delay_ms
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    input_tokens = len(prompt) // 4
+    completion_tokens = len(answer) // 4
+    return {
+        "inputTextTokens": str(input_tokens),
+        "completionTokens": str(completion_tokens),
+        "totalTokens": str(input_tokens + completion_tokens),
+    }
+
+
+def _result(text: str, status: str, usage: dict) -> dict:
+    return {
+        "result": {
+            "alternatives": [{"message": {"role": "assistant", "text": text}, "status": status}],
+            "usage": usage,
+            "modelVersion": "fake",
+        }
+    }
+
+
+class FakeYandexHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = FakeYandexConfig()
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.config.count("bytes_out", len(body))
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, {"error": {"grpcCode": 8 if status == 429 else 13, "httpCode": status,
+                                           "message": message, "httpStatus": self.responses[status][0]}})
+
+    def _send_stream(self, answer: str, usage: dict):
+        """Ответ частями: каждая строка - полный JSON с накопленным текстом, как в Yandex API."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = max(1, -(-len(answer) // self.config.stream_chunks))
+        cuts = list(range(step, len(answer), step)) + [len(answer)]
+        for i, cut in enumerate(cuts):
+            status = "ALTERNATIVE_STATUS_FINAL" if i == len(cuts) - 1 else "ALTERNATIVE_STATUS_PARTIAL"
+            line = (json.dumps(_result(answer[:cut], status, usage), ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+            self.config.count("bytes_out", len(line))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.config.lock:
+                stats = dict(self.config.stats)
+            self._send_json(200, {**stats, "latency": self.config.latency_spec})
+        else:
+            self._send_error(404, "Not found")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.config.count("requests")
+        self.config.count("bytes_in", len(body))
+
+        if self.path != COMPLETION_PATH:
+            self._send_error(404, "Not found")
+            return
+        if not self.headers.get("Authorization", "").startswith(("Api-Key ", "Bearer ")):
+            self.config.count("unauthorized")
+            self._send_error(401, "Unauthenticated")
+            return
+
+        payload = json.loads(body or b"{}")
+        prompt = "\n".join(m.get("text", "") for m in payload.get("messages", []))
+        stream = bool(payload.get("completionOptions", {}).get("stream"))
+
+        outcome, delay_ms = self.config.draw()
+        time.sleep(delay_ms / 1000)
+        self.config.count(outcome)
+        if outcome == "rate_limited":
+            self._send_error(429, "ai.textGenerationCompletionSessionsCount.count gauge quota limit exceed")
+            return
+        if outcome == "server_error":
+            self._send_error(500, "Internal error")
+            return
+        if outcome == "hung":
+            time.sleep(self.config.hang_seconds)
+
+        answer = json.dumps(_answer_for(prompt), ensure_ascii=False)
+        usage = _usage(prompt, answer)
+        if stream:
+            self._send_stream(answer, usage)
+        else:
+            self._send_json(200, _result(answer, "ALTERNATIVE_STATUS_FINAL", usage))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8090, config: FakeYandexConfig = None) -> ThreadingHTTPServer:
+    """Создаёт сервер стенда; port=0 - свободный порт (для тестов)."""
+    handler = type("ConfiguredFakeYandexHandler", (FakeYandexHandler,), {"config": config or FakeYandexConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный стенд Yandex Cloud completion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="fixed:500", help="fixed:MS | normal:MEAN,STD | lognormal:MEDIAN,SIGMA | uniform:MIN,MAX")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="доля зависающих запросов")
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+    parser.add_argument("--stream-chunks", type=int, default=5, help="число частей потокового ответа")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeYandexConfig(args.latency, args.rate_limit_rate, args.error_rate, args.timeout_rate,
+                              args.hang_seconds, args.stream_chunks, args.seed)
+    server = make_server(args.host, args.port, config)
+    print(f"Fake Yandex API: http://{args.host}:{args.port}{COMPLETION_PATH} "
+          f"(задержка {args.latency}, 429: {args.rate_limit_rate:.0%}, 500: {args.error_rate:.0%}, "
+          f"зависания: {args.timeout_rate:.0%})")
+    server.serve_forever()
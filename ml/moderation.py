@@ -0,0 +1,165 @@
+# ml/moderation.py
+# Локальная модерация сообщений чата до любого вызова AI.
+#
+# Термины из MODERATION_TERMS_PATH (по умолчанию ml/moderation_terms.txt) компилируются в одно
+# регулярное выражение: проверка сообщения - один проход за микросекунды вместо запроса к модели.
+# Перед поиском текст нормализуется: регистр, ё, похожие латинские буквы и цифры, а одиночные
+# буквы через разделители склеиваются в слово ("п.о.к.у.р", "п о к у р"; "по-курсу" остаётся
+# как есть). Каждая основа допускает повторы букв ("покуууррить") и ищется только с начала
+# слова: "тупиц" не находится в "ступица". Категория определяется уже по найденному фрагменту.
+#
+# Файл перечитывается, если изменился (проверка mtime не чаще раза в MODERATION_RELOAD_SECONDS),
+# поэтому список можно править на работающем сервере. Файл с ошибкой не применяется -
+# остаётся предыдущий список.
+
+import os
+import re
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from metrics import observe_moderation_rejection
+
+MODERATION_TERMS_PATH = os.getenv(
+    "MODERATION_TERMS_PATH", os.path.join(os.path.dirname(__file__), "moderation_terms.txt")
+)
+MODERATION_RELOAD_SECONDS = float(os.getenv("MODERATION_RELOAD_SECONDS", "5"))
+
+DEFAULT_REPLY = "Не могу создать такую задачу."
+
+# Латинские буквы и цифры, которыми подменяют кириллицу
+_LOOKALIKES = {
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "k": "к", "m": "м", "o": "о",
+    "p": "р", "t": "т", "x": "х", "y": "у", "u": "и", "ё": "е",
+    "0": "о", "3": "з", "4": "ч", "6": "б", "@": "а",
+}
+# Латинская p заменяется на похожую "р", но в транслите читается как "п" ("pokурить")
+_TRANSLIT = {"п": "[пр]"}
+# Подстановка через re.sub: str.translate с кириллицей в таблице заметно медленнее
+_LOOKALIKE_CHARS = re.compile("[" + re.escape("".join(_LOOKALIKES)) + "]")
+# Разделители между одиночными буквами ("п.о-к_у*р", "п о к у р"); в "по-курсу" дефис остаётся
+_SEPARATORS = re.compile(r"[ .\-_*'`~|/\\]+")
+_SEPARATED_LETTERS = re.compile(r"(?<!\w)\w(?:[ .\-_*'`~|/\\]+\w)+(?!\w)")
+
+logger = logging.getLogger("moderation")
+
+
+def normalize(value: str) -> str:
+    value = _LOOKALIKE_CHARS.sub(lambda match: _LOOKALIKES[match.group()], value.lower())
+    return _SEPARATED_LETTERS.sub(lambda match: _SEPARATORS.sub("", match.group()), value)
+
+
+def _stems_pattern(stems: List[str]) -> re.Pattern:
+    """
+    Любая из основ с повторами букв с начала слова. Основы сгруппированы по первой букве:
+    re перебирает альтернативы по порядку, и на каждой позиции проверяется одна буква группы,
+    а не первая буква каждой основы.
+    """
+    groups: Dict[str, List[str]] = {}
+    for stem in stems:
+        letters = [_TRANSLIT.get(letter, re.escape(letter)) for letter in normalize(stem) if not letter.isspace()]
+        groups.setdefault(letters[0], []).append("".join(letter + "+" for letter in letters[1:]))
+    return re.compile(r"(?<!\w)(?:" + "|".join(
+        first + "(?:" + "|".join(rests) + ")" for first, rests in groups.items()
+    ) + ")")
+
+
+def parse_terms(content: str) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+    """Разбирает файл терминов: {категория: [основы]} и {категория: ответ}."""
+    terms: Dict[str, List[str]] = {}
+    replies: Dict[str, str] = {}
+    category = None
+    for number, raw in enumerate(content.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            category = line[1:-1].strip()
+            if not category:
+                raise ValueError(f"Строка {number}: пустое имя категории")
+            terms.setdefault(category, [])
+        elif category is None:
+            raise ValueError(f"Строка {number}: термин вне раздела [категория]")
+        elif line.startswith("reply:"):
+            replies[category] = line[len("reply:"):].strip()
+        else:
+            terms[category].append(line)
+    return terms, replies
+
+
+class CompiledTerms:
+    """Выражения для поиска и для определения категории найденного фрагмента."""
+
+    def __init__(self, terms: Dict[str, List[str]], replies: Dict[str, str]):
+        stems = [stem for category_stems in terms.values() for stem in category_stems]
+        self.replies = replies
+        self.pattern = _stems_pattern(stems) if stems else None
+        self.categories = [
+            (category, _stems_pattern(category_stems))
+            for category, category_stems in terms.items() if category_stems
+        ]
+
+    def search(self, *texts: str) -> Optional[str]:
+        """Категория первого найденного термина или None."""
+        if self.pattern is None:
+            return None
+        # Тексты проверяются одним проходом: перевод строки не входит ни в одну основу
+        normalized = normalize("\n".join(value or "" for value in texts))
+        match = self.pattern.search(normalized)
+        if match is None:
+            return None
+        fragment = match.group()
+        return next(category for category, pattern in self.categories if pattern.fullmatch(fragment))
+
+
+class ModerationFilter:
+    """Скомпилированный список терминов с перечитыванием файла при изменении."""
+
+    def __init__(self, path: str = MODERATION_TERMS_PATH, reload_seconds: float = MODERATION_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        # Заменяется одной ссылкой: проверки в других потоках видят старый или новый список целиком
+        self._compiled = CompiledTerms({}, {})
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_seconds
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self._mtime:
+                    return
+                with open(self.path, "r", encoding="utf-8") as f:
+                    terms, replies = parse_terms(f.read())
+                self._compiled = CompiledTerms(terms, replies)
+                self._mtime = mtime
+                logger.info("Загружены термины модерации: %s", {c: len(s) for c, s in terms.items()})
+            except (OSError, ValueError, re.error):
+                logger.exception("Не удалось загрузить термины модерации из %s, используется прежний список", self.path)
+
+    def check(self, *texts: str) -> Optional[str]:
+        """Ответ с отказом, если в одном из текстов есть запрещённый термин, иначе None."""
+        self._maybe_reload()
+        compiled = self._compiled
+        category = compiled.search(*texts)
+        if category is None:
+            return None
+        observe_moderation_rejection(category)
+        return compiled.replies.get(category, DEFAULT_REPLY)
+
+
+# Один на воркер
+moderation = ModerationFilter()
+
+
+def moderate(*texts: str) -> Optional[str]:
+    """Проверяет тексты по списку терминов (см. ModerationFilter.check)."""
+    return moderation.check(*texts)
@@ -0,0 +1,121 @@
+# ml/provider.py
+# Лениво инициализируемый провайдер AI-анализатора.
+# Роуты импортируют функции отсюда: ml.ai_analyzer (и requests) загружаются
+# только при первом обращении к AI, а не при старте каждого воркера.
+
+import os
+import time
+import threading
+import importlib
+from typing import Dict, Any
+
+from metrics import observe_command_parse
+from ml.errors import AIDisabledError
+from ml.command_parser import parse_command
+from ml.singleflight import single_flight, normalize_text
+
+
+class AIProvider:
+    """
+    Обёртка над ml.ai_analyzer с отложенной инициализацией.
+
+    Режим "AI отключён" включается переменной AI_DISABLED=true или отсутствием
+    YANDEX_API_KEY. В этом режиме приложение стартует и обслуживает все
+    не-AI эндпоинты, а вызовы анализатора бросают AIDisabledError (ответ 503).
+    """
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+        # Время импорта анализатора в секундах (None, пока AI не использовался)
+        self.init_seconds = None
+
+    @property
+    def enabled(self) -> bool:
+        if os.getenv("AI_DISABLED", "false").lower() == "true":
+            return False
+        return bool(os.getenv("YANDEX_API_KEY"))
+
+    def _get_analyzer(self):
+        if not self.enabled:
+            raise AIDisabledError("AI-сервис отключён (AI_DISABLED=true или не задан YANDEX_API_KEY).")
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    self._module = importlib.import_module("ml.ai_analyzer")
+                    self.init_seconds = time.perf_counter() - started
+        return self._module
+
+    def analyze_task(self, title: str, description: str = "") -> Dict[str, Any]:
+        analyzer = self._get_analyzer()
+        return single_flight.run(
+            "estimate",
+            {"title": normalize_text(title), "description": normalize_text(description)},
+            lambda: analyzer.analyze_task(title, description),
+            # Запасная оценка при ошибке модели не передаётся другим воркерам
+            shareable=lambda result: result.get("model_used") != "fallback",
+        )
+
+    def analyze_task_with_commands(
+        self,
+        user_message: str,
+        available_statuses: list = None,
+        available_tags: list = None
+    ) -> dict:
+        # Сообщение по шаблону разбирается без модели; к модели идёт только то, что разбор не покрыл
+        started = time.perf_counter()
+        parsed = parse_command(user_message, available_statuses or [], available_tags or [])
+        observe_command_parse("rules", time.perf_counter() - started, hit=bool(parsed["commands"]))
+        if parsed["commands"]:
+            return self._estimate_parsed(parsed)
+
+        analyzer = self._get_analyzer()
+        started = time.perf_counter()
+        result = single_flight.run(
+            "command",
+            {"message": normalize_text(user_message), "statuses": available_statuses, "tags": available_tags},
+            lambda: analyzer.analyze_task_with_commands(
+                user_message=user_message,
+                available_statuses=available_statuses,
+                available_tags=available_tags
+            ),
+            # Ответ без команд (в том числе запасной при ошибке разбора) не передаётся другим воркерам
+            shareable=lambda result: bool(result.get("commands")),
+        )
+        observe_command_parse("llm", time.perf_counter() - started)
+        return result
+
+    def _estimate_parsed(self, parsed: dict) -> dict:
+        """Добавляет к разобранной команде оценку сложности, как это делает ml.ai_analyzer."""
+        task_data = parsed["commands"][0]["task_data"]
+        complexity = self.analyze_task(task_data["title"], task_data["description"])
+        if complexity.get("estimated_points") is None or complexity.get("is_meaningless"):
+            return {
+                "reply": f"Задача бессмысленна или неконкретна: {complexity.get('explanation', 'Не удалось оценить задачу')}",
+                "commands": [],
+            }
+        task_data["estimated_points"] = complexity["estimated_points"]
+        return parsed
+
+
+# Один провайдер на воркер
+ai_provider = AIProvider()
+
+
+def analyze_task(title: str, description: str = "") -> Dict[str, Any]:
+    """Оценивает сложность задачи (см. ml.ai_analyzer.analyze_task)."""
+    return ai_provider.analyze_task(title, description)
+
+
+def analyze_task_with_commands(
+    user_message: str,
+    available_statuses: list = None,
+    available_tags: list = None
+) -> dict:
+    """Парсит команду из чата (см. ml.ai_analyzer.analyze_task_with_commands)."""
+    return ai_provider.analyze_task_with_commands(
+        user_message=user_message,
+        available_statuses=available_statuses,
+        available_tags=available_tags
+    )
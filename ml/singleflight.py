@@ -0,0 +1,175 @@
+# ml/singleflight.py
+# Объединение одинаковых одновременных вызовов AI-анализатора.
+#
+# Менеджер рассылает одну команду чата нескольким участникам, несколько воркеров оценивают
+# одно и то же название - без объединения каждый вызов уходит в Yandex отдельно.
+#   - В воркере: вызовы с одинаковым нормализованным входом, пришедшие пока первый ещё
+#     выполняется, ждут его Future и получают тот же результат (или ту же ошибку).
+#   - Между воркерами: ведущий вызов занимает строку ai_results (status = pending) и
+#     записывает туда результат; другой воркер с тем же входом ждёт эту строку и берёт
+#     результат из неё. Результат доступен AI_SHARED_RESULT_SECONDS после записи,
+#     поэтому повтор сразу после ответа тоже не идёт в модель.
+# Ведущий, упавший или получивший ошибку, удаляет строку - ожидающие выполняют вызов сами.
+# Строка, занятая упавшим воркером, освобождается через AI_SHARED_LOCK_SECONDS.
+#
+# Источник каждого результата считается в метрике ai_calls_total{kind, source}.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from db import engine
+from metrics import observe_ai_call
+
+AI_SHARED_RESULT_SECONDS = int(os.getenv("AI_SHARED_RESULT_SECONDS", "60"))
+AI_SHARED_LOCK_SECONDS = int(os.getenv("AI_SHARED_LOCK_SECONDS", "120"))
+AI_SHARED_WAIT_SECONDS = float(os.getenv("AI_SHARED_WAIT_SECONDS", "90"))
+
+logger = logging.getLogger("ai")
+
+_CLAIM = """
+    INSERT INTO ai_results (key, kind, status, expires_at)
+    VALUES (:key, :kind, 'pending', now() + CAST(:lock AS interval))
+    ON CONFLICT (key) DO UPDATE SET
+        status = 'pending', result = NULL, created_at = now(), expires_at = EXCLUDED.expires_at
+    WHERE ai_results.expires_at < now()
+    RETURNING key
+"""
+
+_LOOKUP = "SELECT status, result FROM ai_results WHERE key = :key AND expires_at >= now()"
+
+_STORE = """
+    UPDATE ai_results
+    SET status = 'done', result = :result, expires_at = now() + CAST(:ttl AS interval)
+    WHERE key = :key
+"""
+
+_RELEASE = "DELETE FROM ai_results WHERE key = :key AND status = 'pending'"
+
+_PURGE = "DELETE FROM ai_results WHERE expires_at < now()"
+
+
+def normalize_text(value: str) -> str:
+    """Одинаковый текст с разными пробелами и формой Unicode даёт один ключ."""
+    return " ".join(unicodedata.normalize("NFC", value or "").split())
+
+
+def flight_key(kind: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps({"kind": kind, **payload}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Выполняет вызов с данным ключом один раз на все одновременные запросы воркера и кластера."""
+
+    def __init__(self):
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def run(self, kind: str, payload: Dict[str, Any], call: Callable[[], Any],
+            shareable: Callable[[Any], bool] = lambda result: True) -> Any:
+        """
+        Результат call() для payload. shareable решает, можно ли отдать результат
+        другим воркерам (запасной ответ при ошибке модели отдавать не нужно).
+        """
+        key = flight_key(kind, payload)
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            observe_ai_call(kind, "worker")
+            return future.result()
+
+        try:
+            result, source = self._run_shared(kind, key, call, shareable)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            observe_ai_call(kind, source)
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def _run_shared(self, kind: str, key: str, call: Callable[[], Any], shareable: Callable[[Any], bool]):
+        """Вызов, объединённый между воркерами через ai_results. Возвращает (результат, источник)."""
+        try:
+            claimed, result = self._wait_for_leader(kind, key)
+        except Exception:
+            logger.exception("Не удалось проверить общий результат AI, вызываем модель")
+            return call(), "llm"
+        if result is not None:
+            return result, "shared"
+        if not claimed:
+            return call(), "llm"
+
+        try:
+            value = call()
+        except BaseException:
+            self._release(key)
+            raise
+        if shareable(value):
+            self._store(key, value)
+        else:
+            self._release(key)
+        return value, "llm"
+
+    def _wait_for_leader(self, kind: str, key: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Занимает ключ (True, None) или ждёт результат другого воркера (False, результат).
+        Если ведущий не успел за AI_SHARED_WAIT_SECONDS - (False, None): вызов без объединения.
+        """
+        deadline = time.monotonic() + AI_SHARED_WAIT_SECONDS
+        delay = 0.05
+        while True:
+            with engine.begin() as conn:
+                if time.monotonic() - self._last_purge > AI_SHARED_LOCK_SECONDS:
+                    self._last_purge = time.monotonic()
+                    conn.execute(text(_PURGE))
+                claimed = conn.execute(text(_CLAIM), {
+                    "key": key, "kind": kind, "lock": timedelta(seconds=AI_SHARED_LOCK_SECONDS),
+                }).first()
+                if claimed:
+                    return True, None
+                row = conn.execute(text(_LOOKUP), {"key": key}).first()
+            if row is not None and row.status == "done":
+                return False, row.result
+            if time.monotonic() >= deadline:
+                return False, None
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def _store(self, key: str, value: Any):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(_STORE), {
+                    "key": key, "result": json.dumps(value, ensure_ascii=False, default=str),
+                    "ttl": timedelta(seconds=AI_SHARED_RESULT_SECONDS),
+                })
+        except Exception:
+            logger.exception("Не удалось сохранить общий результат AI")
+
+    def _release(self, key: str):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(_RELEASE), {"key": key})
+        except Exception:
+            logger.exception("Не удалось освободить ключ общего результата AI")
+
+
+# Один на воркер
+single_flight = SingleFlight()
@@ -0,0 +1,108 @@
+"""
+Уведомления между воркерами через Postgres LISTEN/NOTIFY.
+
+publish(db, channel) добавляет NOTIFY в текущую транзакцию: Postgres доставит его
+подписчикам только после commit, а при rollback уведомление пропадёт вместе с
+изменениями. Свой воркер получает уведомление сразу после commit сессии, не дожидаясь
+ответа от Postgres, поэтому в тестах (один процесс, без слушателя) всё работает так же.
+
+listener - один поток на воркер с отдельным соединением (не из пула). Обработчики
+регистрируются через listener.subscribe() при импорте модулей, до listener.start().
+После (пере)подключения каждый обработчик вызывается с payload=None: уведомления,
+пришедшие, пока соединения не было, потеряны, и кэши нужно считать устаревшими.
+"""
+import logging
+import select
+import threading
+from collections import defaultdict
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from db import DATABASE_URL
+
+logger = logging.getLogger("notifications")
+
+# Ключ в Session.info: уведомления текущей транзакции для локальной доставки после commit
+_PENDING_KEY = "pending_notifications"
+POLL_SECONDS = 1.0
+MAX_RECONNECT_SECONDS = 30
+
+
+class NotificationListener:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._handlers = defaultdict(list)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, channel: str, handler):
+        """handler(payload) вызывается для каждого уведомления канала (payload=None - ресинхронизация)."""
+        self._handlers[channel].append(handler)
+
+    def dispatch(self, channel: str, payload):
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Ошибка обработчика уведомления %s", channel)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-notify-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    for channel in self._handlers:
+                        cursor.execute(f'LISTEN "{channel}"')
+                for channel in list(self._handlers):
+                    self.dispatch(channel, None)
+                delay = 1
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], POLL_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        self.dispatch(notification.channel, notification.payload)
+            except Exception as e:
+                logger.warning("Слушатель уведомлений отключён (%s), переподключение через %d с", e, delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_RECONNECT_SECONDS)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+listener = NotificationListener(DATABASE_URL)
+
+
+def publish(db: Session, channel: str, payload: str = ""):
+    """Отправляет уведомление в рамках транзакции db: оно уйдёт только после commit."""
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+    db.info.setdefault(_PENDING_KEY, []).append((channel, payload))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_locally(session):
+    for channel, payload in session.info.pop(_PENDING_KEY, ()):
+        listener.dispatch(channel, payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -126,6 +126,13 @@ if __name__ == "__main__":
     # Запустить конкретный тест
     python run_tests_with_report.py pytests/test_get.py::test_get_tasks
 
+    # Только микробенчмарки (время вызова и порог видны в отчете)
+    python run_tests_with_report.py -m benchmark
+
+    # Все тесты вместе с бенчмарками (без RUN_BENCHMARKS=1 или -m benchmark они пропускаются);
+    # на медленной машине пороги ослабляются BENCH_TOLERANCE=3
+    RUN_BENCHMARKS=1 python run_tests_with_report.py
+
 HTML отчет будет автоматически сохранен в папке test_reports/
         """)
         sys.exit(0)
@@ -0,0 +1,69 @@
+import os
+import timeit
+
+import pytest
+
+# Множитель порогов: на медленной машине (CI, ноутбук на батарее) пороги можно ослабить,
+# например BENCH_TOLERANCE=3, не редактируя тесты
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "1.0"))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: микробенчмарк горячей функции с порогом регрессии")
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Пороги по времени зависят от загрузки машины, поэтому бенчмарки не входят в обычный прогон:
+    они запускаются явно, с RUN_BENCHMARKS=1 или -m benchmark.
+    """
+    if os.getenv("RUN_BENCHMARKS") == "1" or config.getoption("markexpr", "") == "benchmark":
+        return
+    skip = pytest.mark.skip(reason="микробенчмарки запускаются явно: RUN_BENCHMARKS=1 или -m benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def bench(request):
+    """
+    Замеряет функцию через timeit и падает, если лучшее время вызова превышает порог.
+
+        bench(_parse_model_json, content, max_ms=0.5)
+
+    Берётся минимум из repeat серий по number вызовов: он меньше всего зависит от шума
+    планировщика. Результат сохраняется в user_properties теста и выводится в HTML-отчёте.
+    """
+    def run(func, *args, max_ms: float, number: int = 1000, repeat: int = 5):
+        timer = timeit.Timer(lambda: func(*args))
+        best_ms = min(timer.repeat(repeat=repeat, number=number)) / number * 1000
+        limit_ms = max_ms * BENCH_TOLERANCE
+        request.node.user_properties.append(("benchmark", {
+            "name": func.__name__,
+            "best_ms": best_ms,
+            "limit_ms": limit_ms,
+            "number": number,
+            "repeat": repeat,
+        }))
+        assert best_ms <= limit_ms, f"{func.__name__}: {best_ms:.4f} мс на вызов, порог {limit_ms:.4f} мс"
+        return func(*args)
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Сводная таблица бенчмарков в конце прогона."""
+    rows = []
+    for outcome in ("passed", "failed"):
+        for report in terminalreporter.stats.get(outcome, []):
+            for key, value in getattr(report, "user_properties", []):
+                if key == "benchmark":
+                    rows.append((report.nodeid.split("::")[-1], value))
+    if not rows:
+        return
+    terminalreporter.write_sep("=", "бенчмарки (лучшее время на вызов)")
+    for test_name, value in rows:
+        terminalreporter.write_line(
+            f"{test_name:<50} {value['name']:<28} {value['best_ms']:>10.4f} мс  (порог {value['limit_ms']:.4f} мс)"
+        )
@@ -0,0 +1,149 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.responses import ORJSONResponse
+
+from auth import get_password_hash, verify_password, create_access_token
+from ml.ai_analyzer import _parse_model_json
+from routes_chat import validate_task_text
+from schemas import TaskResponse
+
+pytestmark = pytest.mark.benchmark
+
+# Фиксированные входные данные: типичные ответы модели и задачи из чата
+COMMAND_ANSWER = json.dumps({
+    "reply": "Создаю задачу 'Подготовить квартальный отчёт'",
+    "commands": [{
+        "action": "create_task",
+        "task_data": {
+            "title": "Подготовить квартальный отчёт",
+            "description": "Собрать данные о продажах за квартал, построить графики и отправить руководителю",
+            "status_code": "in_progress",
+            "due_date": "2025-12-12T00:00:00",
+            "tags": ["срочно", "отчёт"],
+            "estimated_points": 45,
+        },
+    }],
+}, ensure_ascii=False)
+MARKDOWN_ANSWER = f"```json\n{COMMAND_ANSWER}\n```"
+TRUNCATED_ANSWER = COMMAND_ANSWER + '\n{"reply": "обрыв'
+
+TASK_ROW = {
+    "id": 1, "user_id": 1, "status_id": 2,
+    "title": "Подготовить квартальный отчёт",
+    "description": "Собрать данные о продажах за квартал, построить графики и отправить руководителю",
+    "ai_analysis_metadata": {"estimated_points": 45, "explanation": "Оценка", "model_used": "cached", "confidence": 0.8},
+    "estimated_points": 45, "awarded_points": 0,
+    "due_date": datetime(2025, 12, 12), "completed_at": None,
+    "created_at": datetime(2025, 11, 1, 12, 0), "updated_at": datetime(2025, 11, 1, 12, 0),
+}
+
+
+def _serialize_tasks(tasks):
+    return [TaskResponse.model_validate(task).model_dump(mode="json") for task in tasks]
+
+
+def _render_validated(tasks):
+    """Прежний путь списков: валидация ORM-объектов через TaskResponse и стандартный json."""
+    return json.dumps(_serialize_tasks(tasks), ensure_ascii=False).encode("utf-8")
+
+
+def _render_projected(rows):
+    """Путь serialization.rows_response: строки-словари сразу в orjson."""
+    return ORJSONResponse(rows).body
+
+
+def test_parse_model_json_plain(bench):
+    """
+    Бенчмарк разбора JSON-ответа модели без обёрток.
+    Проверяет результат и время на вызов.
+    """
+    data = bench(_parse_model_json, COMMAND_ANSWER, max_ms=0.1)
+    assert data["commands"][0]["action"] == "create_task"
+
+
+def test_parse_model_json_markdown(bench):
+    """
+    Бенчмарк разбора JSON в markdown код-блоке (```json ... ```).
+    Проверяет результат и время на вызов.
+    """
+    data = bench(_parse_model_json, MARKDOWN_ANSWER, max_ms=0.1)
+    assert data["reply"].startswith("Создаю задачу")
+
+
+def test_parse_model_json_truncated(bench):
+    """
+    Бенчмарк разбора оборванного ответа (поиск последней закрывающей скобки).
+    Проверяет результат и время на вызов.
+    """
+    data = bench(_parse_model_json, TRUNCATED_ANSWER, max_ms=0.2)
+    assert data["commands"][0]["task_data"]["estimated_points"] == 45
+
+
+def test_validate_task_text(bench):
+    """
+    Бенчмарк цепочки проверок задачи из чата (нормализация, запрещенные фрагменты).
+    Проверяет что корректная задача проходит проверку.
+    """
+    task = json.loads(COMMAND_ANSWER)["commands"][0]["task_data"]
+    assert bench(validate_task_text, task["title"], task["description"], max_ms=0.02) is None
+
+
+def test_validate_task_text_rejects(bench):
+    """
+    Бенчмарк проверки задачи с запрещенным фрагментом.
+    Проверяет что задача отклоняется.
+    """
+    assert bench(validate_task_text, "Сходить покурить", "Выйти на улицу и покурить", max_ms=0.02)
+
+
+def test_serialize_task_list(bench):
+    """
+    Бенчмарк сериализации списка из 100 задач через TaskResponse.
+    Проверяет число задач в ответе и время на список.
+    """
+    tasks = [{**TASK_ROW, "id": i} for i in range(100)]
+    result = bench(_serialize_tasks, tasks, max_ms=5.0, number=50)
+    assert len(result) == 100
+
+
+# Пороги в мс на ответ целиком; прежний путь оставлен для сравнения в отчёте
+@pytest.mark.parametrize("size,max_ms", [(1000, 60.0), (10000, 600.0)])
+def test_render_task_list_validated(bench, size, max_ms):
+    """
+    Бенчмарк ответа GET /tasks до перехода на проекцию: from_attributes-валидация и json.
+    Проверяет число задач в ответе и время на ответ.
+    """
+    tasks = [SimpleNamespace(**{**TASK_ROW, "id": i}) for i in range(size)]
+    body = bench(_render_validated, tasks, max_ms=max_ms, number=1, repeat=3)
+    assert len(json.loads(body)) == size
+
+
+@pytest.mark.parametrize("size,max_ms", [(1000, 3.0), (10000, 30.0)])
+def test_render_task_list_projected(bench, size, max_ms):
+    """
+    Бенчмарк ответа GET /tasks через проекцию строк и ORJSONResponse.
+    Проверяет что ответ совпадает с прежним путем и время на ответ.
+    """
+    rows = [{**TASK_ROW, "id": i} for i in range(size)]
+    body = bench(_render_projected, rows, max_ms=max_ms, number=5, repeat=3)
+    assert json.loads(body) == json.loads(_render_validated([SimpleNamespace(**row) for row in rows]))
+
+
+def test_verify_password(bench):
+    """
+    Бенчмарк проверки пароля (bcrypt).
+    Порог защищает от случайного увеличения cost factor: время входа растёт вместе с ним.
+    """
+    hashed = get_password_hash("secret123")
+    assert bench(verify_password, "secret123", hashed, max_ms=1000.0, number=1, repeat=3) is True
+
+
+def test_create_access_token(bench):
+    """
+    Бенчмарк создания JWT токена доступа.
+    Проверяет что токен создается и время на вызов.
+    """
+    assert bench(create_access_token, "123", "user", max_ms=0.5)
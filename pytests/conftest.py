@@ -8,7 +8,7 @@ import platform
 
 os.environ["TESTING"] = "true"
 
-from database import Base
+from database import Base, apply_schema
 from db import engine
 from main import app
 
@@ -86,6 +86,11 @@ def pytest_html_results_table_row(report, cells):
     duration = getattr(report, 'duration', 0.0)
     cells.insert(3, f'<td class="col-time">{duration:.3f}</td>')
 
+    # Для микробенчмарков добавляем к описанию лучшее время вызова
+    for key, value in getattr(report, 'user_properties', []):
+        if key == "benchmark":
+            cells[2] = cells[2].replace('</td>', f" ({value['best_ms']:.4f} мс/вызов, порог {value['limit_ms']:.4f})</td>")
+
 
 def pytest_html_results_summary(prefix, summary, postfix):
     """
@@ -131,6 +136,20 @@ def pytest_runtest_makereport(item, call):
             from pytest_html import extras
             extra.append(extras.html(f'<div><h4>Описание теста:</h4><pre>{item.function.__doc__}</pre></div>'))
         
+        # Результаты микробенчмарков (фикстура bench в pytests/benchmarks) - время рядом с pass/fail
+        benchmarks = [value for key, value in item.user_properties if key == "benchmark"]
+        if benchmarks:
+            from pytest_html import extras
+            rows = "".join(
+                f"<tr><td>{b['name']}</td><td>{b['best_ms']:.4f}</td><td>{b['limit_ms']:.4f}</td>"
+                f"<td>{b['repeat']} x {b['number']}</td></tr>"
+                for b in benchmarks
+            )
+            extra.append(extras.html(
+                '<div><h4>Бенчмарк:</h4><table><tr><th>Функция</th><th>Лучшее, мс/вызов</th>'
+                f'<th>Порог, мс</th><th>Серии</th></tr>{rows}</table></div>'
+            ))
+
         # При ошибке добавляем дополнительную отладочную информацию
         if report.failed:
             from pytest_html import extras
@@ -144,7 +163,8 @@ def pytest_runtest_makereport(item, call):
 
 @pytest.fixture(scope="function")
 def client():
-    Base.metadata.create_all(bind=engine)
+    # Схема вместе с MIGRATIONS: новые колонки появляются и в уже существующей тестовой БД
+    apply_schema()
 
     with TestClient(app) as c:
         yield c
@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from db import engine
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+def _login(client, role):
+    email = unique_email()
+    user = client.post("/register", json={"email": email, "first_name": role.title(),
+                                          "last_name": "Test", "password": "adminpass"}).json()
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET role = :role WHERE id = :id"), {"role": role, "id": user["id"]})
+    token = client.post("/login", json={"email": email, "password": "adminpass"}).json()["access_token"]
+    return user, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin_headers(client):
+    return _login(client, "admin")[1]
+
+
+@pytest.fixture
+def competition_with_tasks(client):
+    """Соревнование с участником и двумя задачами; ещё одна задача у пользователя вне соревнования."""
+    with engine.begin() as conn:
+        comp_id = conn.execute(text(
+            "INSERT INTO competitions (title, start_date, end_date) "
+            "VALUES ('Export Comp', '2025-01-01', '2099-01-01') RETURNING id"
+        )).scalar_one()
+        status_id = conn.execute(text(
+            "INSERT INTO task_status (code, name) VALUES ('export_test', 'Export Test') RETURNING id"
+        )).scalar_one()
+    member, _ = _login(client, "user")
+    outsider, _ = _login(client, "user")
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET cur_comp = :comp_id WHERE id = :id"), {"comp_id": comp_id, "id": member["id"]})
+        conn.execute(text(
+            "INSERT INTO tasks (user_id, status_id, title, ai_analysis_metadata) VALUES "
+            "(:member, :status_id, 'First', '{\"difficulty\": 2}'), (:member, :status_id, 'Second', NULL), "
+            "(:outsider, :status_id, 'Outside', NULL)"
+        ), {"member": member["id"], "outsider": outsider["id"], "status_id": status_id})
+    return comp_id, member["id"]
+
+
+def test_export_users_ndjson(client, admin_headers):
+    """
+    Тест GET /admin/export/users.
+    Проверяет что каждая строка ответа - JSON-объект пользователя с полями UserResponse.
+    """
+    response = client.get("/admin/export/users", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert users and all(set(u) == {"id", "first_name", "last_name", "email", "total_points", "role", "cur_comp"}
+                         for u in users)
+    assert [u["id"] for u in users] == sorted(u["id"] for u in users)
+
+
+def test_export_tasks_csv_filtered_by_competition(client, admin_headers, competition_with_tasks):
+    """
+    Тест GET /admin/export/tasks?format=csv&competition_id=.
+    Проверяет заголовок CSV, фильтр по участникам соревнования и запись JSON-колонки.
+    """
+    comp_id, member_id = competition_with_tasks
+    response = client.get("/admin/export/tasks", params={"format": "csv", "competition_id": comp_id},
+                          headers=admin_headers)
+    assert response.status_code == 200
+    assert 'filename="tasks.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["First", "Second"]
+    assert {row["user_id"] for row in rows} == {str(member_id)}
+    assert json.loads(rows[0]["ai_analysis_metadata"]) == {"difficulty": 2}
+
+
+def test_export_requires_admin_and_known_table(client, admin_headers):
+    """
+    Тест ограничений GET /admin/export/{entity}.
+    Проверяет 403 для пользователя, 404 для неизвестной таблицы и соревнования, 422 для формата.
+    """
+    _, user_headers = _login(client, "user")
+    assert client.get("/admin/export/users", headers=user_headers).status_code == 403
+    assert client.get("/admin/export/boards", headers=admin_headers).status_code == 404
+    assert client.get("/admin/export/rewards", params={"competition_id": 999999},
+                      headers=admin_headers).status_code == 404
+    assert client.get("/admin/export/users", params={"format": "xml"}, headers=admin_headers).status_code == 422
+
+
+def test_import_users_csv_reports_each_row(client, admin_headers):
+    """
+    Тест POST /admin/users/import с CSV.
+    Проверяет создание новых пользователей и отчёт для занятого email, повтора в файле и некорректной строки.
+    """
+    taken = unique_email()
+    client.post("/register", json={"email": taken, "first_name": "Taken", "last_name": "User", "password": "userpass"})
+    fresh = unique_email()
+    body = (
+        "first_name,last_name,email,password\n"
+        f"Иван,Петров,{fresh},secret123\n"
+        f"Taken,User,{taken},secret123\n"
+        f"Иван,Петров,{fresh},secret123\n"
+        "Bad,Row,not-an-email,secret123\n"
+    )
+    response = client.post("/admin/users/import", content=body.encode(),
+                           headers={**admin_headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["exists"], data["duplicate"], data["invalid"]) == (1, 1, 1, 1)
+    assert [row["status"] for row in data["rows"]] == ["created", "exists", "duplicate", "invalid"]
+    assert data["rows"][3]["error"].startswith("email")
+
+    login = client.post("/login", json={"email": fresh, "password": "secret123"})
+    assert login.status_code == 200
+    assert login.json()["user"]["id"] == str(data["rows"][0]["user_id"])
+
+
+def test_import_users_ndjson_and_bad_header(client, admin_headers):
+    """
+    Тест POST /admin/users/import с NDJSON и CSV без обязательных колонок.
+    """
+    lines = [json.dumps({"first_name": "A", "last_name": "B", "email": unique_email(), "password": "secret123"}),
+             "{not json}",
+             json.dumps({"first_name": "C", "last_name": "D", "email": unique_email(), "password": "short"})]
+    response = client.post("/admin/users/import", params={"format": "ndjson"},
+                           content="\n".join(lines).encode(), headers=admin_headers)
+    assert response.status_code == 200
+    assert [row["status"] for row in response.json()["rows"]] == ["created", "invalid", "invalid"]
+
+    response = client.post("/admin/users/import", content=b"email,password\nx@y.ru,secret123\n",
+                           headers={**admin_headers, "Content-Type": "text/csv"})
+    assert response.status_code == 400
@@ -0,0 +1,149 @@
+import uuid
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from archive import (
+    ARCHIVE_SCHEMA, archive_reward_partitions, copy_unpartitioned_rewards, ensure_reward_partitions,
+    partition_name, month_start
+)
+from db import SessionLocal, engine
+from ledger import award_points
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+@pytest.fixture
+def manager_headers(client):
+    email = unique_email()
+    client.post("/register", json={"email": email, "first_name": "Manager", "last_name": "Test", "password": "managerpass"})
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET role = 'manager' WHERE email = :email"), {"email": email})
+    token = client.post("/login", json={"email": email, "password": "managerpass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def member(client):
+    """Участник соревнования и тип награды."""
+    user = client.post("/register", json={"email": unique_email(), "first_name": "Archive",
+                                          "last_name": "Member", "password": "userpass"}).json()
+    with engine.begin() as conn:
+        comp_ids = conn.execute(text(
+            "INSERT INTO competitions (title, start_date, end_date) "
+            "VALUES ('Old Comp', '2025-01-01', '2099-01-01'), ('New Comp', '2025-01-01', '2099-01-01') RETURNING id"
+        )).scalars().all()
+        type_id = conn.execute(text(
+            "INSERT INTO reward_types (code, name) VALUES ('archive_test', 'Archive Test') RETURNING id"
+        )).scalar_one()
+        conn.execute(text("UPDATE users SET cur_comp = :comp_id WHERE id = :id"),
+                     {"comp_id": comp_ids[0], "id": user["id"]})
+    return user["id"], comp_ids, type_id
+
+
+def test_reward_lands_in_month_partition(client, member):
+    """
+    Тест секционирования rewards.
+    Проверяет что награда текущего месяца попадает в раздел этого месяца, а не в rewards_default.
+    """
+    user_id, _, type_id = member
+    db = SessionLocal()
+    try:
+        award_points(db, user_id, type_id, 5, "partition")
+        db.commit()
+    finally:
+        db.close()
+
+    with engine.connect() as conn:
+        partition = conn.execute(text(
+            "SELECT tableoid::regclass::text FROM rewards WHERE user_id = :id"
+        ), {"id": user_id}).scalar_one()
+    assert partition == partition_name(month_start(datetime.utcnow()))
+
+
+def test_old_months_detached_into_archive_schema(client, member):
+    """
+    Тест архивации разделов rewards.
+    Проверяет что месяц без наград текущих соревнований уходит в схему archive вместе со строками,
+    а месяц, начиная с которого архивировать запрещено, остаётся.
+    """
+    user_id, (old_comp, new_comp), type_id = member
+    old_month, kept_month = date(2001, 1, 1), date(2001, 2, 1)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO rewards (user_id, type_id, points_amount, awarded_at, competition_id) "
+                "VALUES (:user_id, :type_id, 10, '2001-01-15', :old), (:user_id, :type_id, 10, '2001-02-15', :old)"
+            ), {"user_id": user_id, "type_id": type_id, "old": old_comp})
+            ensure_reward_partitions(conn, old_month, kept_month)
+            conn.execute(text("UPDATE users SET cur_comp = :new WHERE id = :id"), {"new": new_comp, "id": user_id})
+            archived = archive_reward_partitions(conn, before=kept_month)
+
+        assert archived == [partition_name(old_month)]
+        with engine.connect() as conn:
+            live = conn.execute(text("SELECT awarded_at FROM rewards WHERE user_id = :id"), {"id": user_id}).scalars().all()
+            archived_rows = conn.execute(text(
+                f"SELECT count(*) FROM {ARCHIVE_SCHEMA}.{partition_name(old_month)}"
+            )).scalar_one()
+        assert live == [datetime(2001, 2, 15)]
+        assert archived_rows == 1
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {ARCHIVE_SCHEMA}.{partition_name(old_month)}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(old_month)}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(kept_month)}"))
+
+
+def test_legacy_rewards_get_current_competition(client, member):
+    """
+    Тест переноса rewards из версии без competition_id.
+    Награды получают текущее соревнование пользователя, поэтому сверка ledger.py не обнуляет total_points.
+    """
+    user_id, (comp_id, _), type_id = member
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE rewards_unpartitioned (id SERIAL PRIMARY KEY, user_id INTEGER, type_id INTEGER, "
+            "points_amount INTEGER, awarded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, reason TEXT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO rewards_unpartitioned (user_id, type_id, points_amount) VALUES (:user_id, :type_id, 7)"
+        ), {"user_id": user_id, "type_id": type_id})
+        copy_unpartitioned_rewards(conn)
+
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT points_amount, competition_id FROM rewards WHERE user_id = :id"
+        ), {"id": user_id}).one()
+    assert tuple(row) == (7, comp_id)
+
+
+def test_switching_competition_archives_tasks(client, manager_headers, member):
+    """
+    Тест PUT /users/{id}/competition.
+    Проверяет что задачи прошлого соревнования вместе с тегами переносятся в tasks_archive.
+    """
+    user_id, (old_comp, new_comp), _ = member
+    with engine.begin() as conn:
+        status_id = conn.execute(text(
+            "INSERT INTO task_status (code, name) VALUES ('archive_test', 'Archive Test') RETURNING id"
+        )).scalar_one()
+        tag_id = conn.execute(text("INSERT INTO tags (name) VALUES ('archive-tag') RETURNING id")).scalar_one()
+        task_id = conn.execute(text(
+            "INSERT INTO tasks (user_id, status_id, title, awarded_points) "
+            "VALUES (:user_id, :status_id, 'Old task', 7) RETURNING id"
+        ), {"user_id": user_id, "status_id": status_id}).scalar_one()
+        conn.execute(text("INSERT INTO task_tags (task_id, tag_id) VALUES (:task_id, :tag_id)"),
+                     {"task_id": task_id, "tag_id": tag_id})
+
+    response = client.put(f"/users/{user_id}/competition", json={"competition_id": new_comp}, headers=manager_headers)
+    assert response.status_code == 200
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM tasks WHERE user_id = :id"), {"id": user_id}).scalar_one() == 0
+        row = conn.execute(text(
+            "SELECT id, competition_id, title, awarded_points, tag_ids FROM tasks_archive WHERE user_id = :id"
+        ), {"id": user_id}).one()
+    assert tuple(row) == (task_id, old_comp, "Old task", 7, [tag_id])
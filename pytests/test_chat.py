@@ -274,6 +274,22 @@ def test_chat_create_task_banned_content(client, registered_user, sample_task_st
         assert "не могу создавать задачи, связанные с курением" in response.json()["reply"]
 
 
+def test_chat_banned_message_rejected_before_ai(client, registered_user):
+    """
+    Тест локальной модерации сообщения.
+    Сообщение с запрещенным термином отклоняется без вызова AI.
+    """
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+
+    with patch("routes_chat.analyze_task_with_commands") as mock_cmd:
+        response = client.post("/chat", json={"message": "Создай задачу 'Купить с и г а р е т ы' на 12.12.2025"},
+                               headers=headers)
+
+        assert response.status_code == 200
+        assert "не могу создавать задачи, связанные с курением" in response.json()["reply"]
+        mock_cmd.assert_not_called()
+
+
 def test_chat_unsupported_action(client, registered_user):
     """
     Тест обработки неподдерживаемых команд.
@@ -369,6 +385,39 @@ def test_chat_create_for_multiple_users(client, registered_user, sample_task_sta
         assert "для 2 пользователей" in data["reply"]
 
 
+def test_chat_duplicate_user_ids_create_one_task(client, registered_user, sample_task_status):
+    """
+    Тест повторяющихся ID в user_ids.
+    Повтор одного пользователя не должен создавать ему несколько копий задачи.
+    """
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    user_id = registered_user["user"]["id"]
+
+    with patch("routes_chat.analyze_task_with_commands") as mock_cmd:
+        mock_cmd.return_value = {
+            "reply": "Создаю задачу!",
+            "commands": [{
+                "action": "create_task",
+                "task_data": {
+                    "title": "Задача без дублей",
+                    "description": "Проверка повторов",
+                    "status_code": "todo",
+                    "due_date": datetime(2025, 12, 20),
+                    "estimated_points": 10
+                }
+            }]
+        }
+
+        response = client.post("/chat", json={
+            "message": "Создай задачу",
+            "user_ids": [user_id, user_id]  # ВАЖНО: один и тот же пользователь дважды
+        }, headers=headers)
+
+    assert response.status_code == 200
+    tasks = client.get("/tasks", headers=headers).json()
+    assert [task["title"] for task in tasks] == ["Задача без дублей"]
+
+
 def test_chat_rate_limit_error(client, registered_user, sample_task_status):
     """
     Тест обработки ошибки rate limit от Groq API.
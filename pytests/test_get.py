@@ -239,6 +239,68 @@ def test_get_tasks_authorized(client, registered_user, sample_task):
     assert tasks[0]["title"] == "GET Test Task"
 
 
+def test_get_tasks_matches_response_schema(client, registered_user, sample_task):
+    """
+    Тест проекции строк для GET /tasks (ответ отдается без валидации через TaskResponse).
+    Проверяет что набор полей совпадает со схемой и элемент совпадает с ответом POST /tasks.
+    """
+    from schemas import TaskResponse
+
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    task = client.get("/tasks", headers=headers).json()[0]
+    assert list(task) == list(TaskResponse.model_fields)
+    assert TaskResponse.model_validate(task).model_dump(mode="json") == task == sample_task
+
+
+def test_search_tasks_ranked_by_morphology_and_substring(client, registered_user):
+    """
+    Тест поиска задач через GET /tasks/search.
+    Проверяет совпадение по словоформе и по части слова, порядок по релевантности и пагинацию.
+    """
+    from db import engine
+
+    user_id = registered_user["user"]["id"]
+    with engine.begin() as conn:
+        status_id = conn.execute(text(
+            "INSERT INTO task_status (code, name) VALUES ('search_test', 'Search Test') RETURNING id"
+        )).scalar_one()
+        conn.execute(text(
+            "INSERT INTO tasks (user_id, status_id, title, description) VALUES "
+            "(:user_id, :status_id, 'Подготовить отчёты', 'квартальные цифры'), "
+            "(:user_id, :status_id, 'Созвон с клиентом', 'обсудить отчёт по продажам'), "
+            "(:user_id, :status_id, 'Купить кофе', NULL)"
+        ), {"user_id": user_id, "status_id": status_id})
+
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    response = client.get("/tasks/search", params={"q": "отчёт"}, headers=headers)
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["Подготовить отчёты", "Созвон с клиентом"]
+
+    response = client.get("/tasks/search", params={"q": "кофе", "limit": 1, "offset": 0}, headers=headers)
+    assert [task["title"] for task in response.json()] == ["Купить кофе"]
+    response = client.get("/tasks/search", params={"q": "созв"}, headers=headers)
+    assert [task["title"] for task in response.json()] == ["Созвон с клиентом"]
+    assert client.get("/tasks/search", params={"q": "о"}, headers=headers).status_code == 422
+
+
+def test_search_users_by_name_and_email(client, registered_manager, registered_user):
+    """
+    Тест поиска пользователей через GET /users/search.
+    Проверяет поиск по части email, фильтр по роли и запрет для обычного пользователя.
+    """
+    email = registered_user["user"]["email"]
+    headers = {"Authorization": f"Bearer {registered_manager['token']}"}
+    response = client.get("/users/search", params={"q": email.split("@")[0], "role": "user"}, headers=headers)
+    assert response.status_code == 200
+    assert [u["email"] for u in response.json()] == [email]
+
+    response = client.get("/users/search", params={"q": "Manager", "role": "user"}, headers=headers)
+    assert response.json() == []
+
+    user_headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    assert client.get("/users/search", params={"q": "Test"}, headers=user_headers).status_code == 403
+
+
 def test_get_reward_types_public(client):
     """
     Тест получения списка типов наград (публичный эндпоинт).
@@ -334,4 +396,29 @@ def test_get_leaderboard_not_found(client):
     Проверяет что при запросе таблицы лидеров несуществующего соревнования возвращается 404 Not Found.
     """
     response = client.get("/leaderboard/999999")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_get_metrics_uses_route_templates(client):
+    """
+    Тест эндпоинта метрик Prometheus.
+    Проверяет что /metrics отдает текстовый формат и группирует запросы по шаблону маршрута, а не по сырому пути.
+    """
+    client.get("/leaderboard/999999")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/leaderboard/{competition_id}"' in response.text
+    assert "/leaderboard/999999" not in response.text
+
+
+def test_debug_mode_adds_db_query_headers(client, monkeypatch):
+    """
+    Тест заголовков статистики SQL в режиме отладки.
+    Проверяет что при DEBUG ответ содержит X-DB-Queries и Server-Timing с длительностью запросов к БД.
+    """
+    import metrics
+    monkeypatch.setattr(metrics, "DEBUG", True)
+    response = client.get("/tags")
+    assert response.status_code == 200
+    assert int(response.headers["x-db-queries"]) >= 1
+    assert response.headers["server-timing"].startswith("db;dur=")
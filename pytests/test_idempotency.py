@@ -0,0 +1,133 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy import text
+
+from db import engine
+from ml.errors import YandexAPIError
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+@pytest.fixture
+def user_headers(client):
+    email = unique_email()
+    client.post("/register", json={"email": email, "first_name": "User", "last_name": "Test", "password": "userpass"})
+    token = client.post("/login", json={"email": email, "password": "userpass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def task_body(client):
+    with engine.begin() as conn:
+        status_id = conn.execute(text(
+            "INSERT INTO task_status (code, name) VALUES ('idem_test', 'Idempotency Test') RETURNING id"
+        )).scalar_one()
+    return json.dumps({"title": "Подготовить отчёт", "status_id": status_id}, ensure_ascii=False).encode()
+
+
+def _post_task(client, headers, body, key):
+    return client.post("/tasks", content=body,
+                       headers={**headers, "Content-Type": "application/json", "Idempotency-Key": key})
+
+
+def _task_count() -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT count(*) FROM tasks")).scalar_one()
+
+
+def test_retry_replays_stored_response(client, user_headers, task_body, mock_ai_analyzer):
+    """
+    Тест повтора POST /tasks с тем же Idempotency-Key.
+    Проверяет что повтор получает тот же ответ без второго вызова AI и без второй задачи.
+    """
+    first = _post_task(client, user_headers, task_body, "retry-key")
+    second = _post_task(client, user_headers, task_body, "retry-key")
+
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert mock_ai_analyzer.call_count == 1
+    assert _task_count() == 1
+
+
+def test_api_chat_retry_replayed(client, user_headers):
+    """
+    Тест повтора POST /api/chat с тем же Idempotency-Key.
+    Алиас /chat тоже вызывает модель, поэтому повтор получает сохранённый ответ.
+    """
+    headers = {**user_headers, "Idempotency-Key": "api-chat-key"}
+    with patch("routes_chat.analyze_task_with_commands") as mock_cmd:
+        mock_cmd.return_value = {"reply": "Привет!", "commands": []}
+        first = client.post("/api/chat", json={"message": "Привет"}, headers=headers)
+        second = client.post("/api/chat", json={"message": "Привет"}, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert mock_cmd.call_count == 1
+
+
+def test_key_reused_with_other_body_rejected(client, user_headers, task_body):
+    """
+    Тест Idempotency-Key с другим телом запроса.
+    Проверяет 422 и что другой ключ выполняет запрос как обычно.
+    """
+    assert _post_task(client, user_headers, task_body, "reused-key").status_code == 201
+    other = task_body.replace("отчёт".encode(), "план".encode())
+    assert _post_task(client, user_headers, other, "reused-key").status_code == 422
+    assert _post_task(client, user_headers, other, "other-key").status_code == 201
+    assert _task_count() == 2
+
+
+def test_ai_failure_not_stored(client, user_headers, task_body, mock_ai_analyzer):
+    """
+    Тест ошибки AI при запросе с Idempotency-Key.
+    Проверяет что ответ 503 не закрепляется за ключом и повтор выполняет запрос заново.
+    """
+    mock_ai_analyzer.side_effect = YandexAPIError("timeout")
+    assert _post_task(client, user_headers, task_body, "failing-key").status_code == 503
+
+    mock_ai_analyzer.side_effect = None
+    response = _post_task(client, user_headers, task_body, "failing-key")
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_concurrent_duplicate_waits_for_first(client, user_headers, task_body, mock_ai_analyzer):
+    """
+    Тест повтора во время выполнения первого запроса.
+    Ключ занят "другим воркером"; повтор ждёт, пока тот сохранит ответ, и возвращает его.
+    """
+    user_id = client.get("/users/me", headers=user_headers).json()["id"]
+    request_hash = hashlib.sha256(b"POST /tasks?\n" + task_body).hexdigest()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO idempotency_keys (user_id, key, request_hash, status, expires_at) "
+            "VALUES (:user_id, 'busy-key', :hash, 'in_progress', now() + interval '1 minute')"
+        ), {"user_id": user_id, "hash": request_hash})
+
+    def finish_first():
+        time.sleep(0.3)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE idempotency_keys SET status = 'completed', response_status = 201, "
+                "response_body = :body, response_content_type = 'application/json' WHERE key = 'busy-key'"
+            ), {"body": b'{"id": 42}'})
+
+    worker = threading.Thread(target=finish_first)
+    worker.start()
+    response = _post_task(client, user_headers, task_body, "busy-key")
+    worker.join()
+
+    assert response.status_code == 201
+    assert response.json() == {"id": 42}
+    assert mock_ai_analyzer.call_count == 0
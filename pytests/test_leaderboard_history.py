@@ -0,0 +1,132 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from db import SessionLocal, engine
+from ledger import award_points
+from leaderboard_history import take_snapshots
+
+# Момент внутри соревнования, кратный 5 минутам: снимки пишутся с явным временем
+T0 = datetime(2030, 1, 1, 12, 0)
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+@pytest.fixture
+def manager_headers(client):
+    email = unique_email()
+    client.post("/register", json={"email": email, "first_name": "Manager", "last_name": "Test", "password": "managerpass"})
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET role = 'manager' WHERE email = :email"), {"email": email})
+    token = client.post("/login", json={"email": email, "password": "managerpass"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def competition_users(client):
+    """Соревнование с двумя участниками без баллов."""
+    with engine.begin() as conn:
+        comp_id = conn.execute(text(
+            "INSERT INTO competitions (title, start_date, end_date) "
+            "VALUES ('History Comp', '2025-01-01', '2099-01-01') RETURNING id"
+        )).scalar_one()
+        type_id = conn.execute(text(
+            "INSERT INTO reward_types (code, name) VALUES ('history_test', 'History Test') RETURNING id"
+        )).scalar_one()
+    user_ids = []
+    for name in ("First", "Second"):
+        user = client.post("/register", json={"email": unique_email(), "first_name": name,
+                                              "last_name": "Member", "password": "userpass"}).json()
+        user_ids.append(user["id"])
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET cur_comp = :comp_id, total_points = 0 WHERE id = ANY(:ids)"),
+                     {"comp_id": comp_id, "ids": user_ids})
+    return comp_id, type_id, user_ids
+
+
+def _snapshot(now):
+    db = SessionLocal()
+    try:
+        return take_snapshots(db, now=now)
+    finally:
+        db.close()
+
+
+def _award(user_id, type_id, points):
+    db = SessionLocal()
+    try:
+        award_points(db, user_id, type_id, points, "history")
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_snapshots_written_once_per_interval_and_on_change(client, competition_users):
+    """
+    Тест записи снимков лидерборда.
+    Проверяет что снимок пишется не чаще раза за интервал и только при изменении рейтинга.
+    """
+    comp_id, type_id, (first_id, second_id) = competition_users
+
+    assert _snapshot(T0) == 1
+    assert _snapshot(T0 + timedelta(minutes=1)) == 0
+
+    _award(second_id, type_id, 20)
+    assert _snapshot(T0 + timedelta(minutes=2)) == 0
+    assert _snapshot(T0 + timedelta(minutes=5)) == 1
+    assert _snapshot(T0 + timedelta(minutes=10)) == 0
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT user_ids, points FROM leaderboard_snapshots WHERE competition_id = :id ORDER BY taken_at"
+        ), {"id": comp_id}).all()
+    assert [tuple(row) for row in rows] == [([first_id, second_id], [0, 0]), ([second_id, first_id], [20, 0])]
+
+
+def test_history_returns_ranks_per_bucket(client, manager_headers, competition_users):
+    """
+    Тест GET /leaderboard/{id}/history.
+    Проверяет места на конец каждого интервала, включая интервал без нового снимка.
+    """
+    comp_id, type_id, (first_id, second_id) = competition_users
+    _snapshot(T0)
+    _award(second_id, type_id, 20)
+    _snapshot(T0 + timedelta(minutes=5))
+
+    response = client.get(f"/leaderboard/{comp_id}/history", params={
+        "from": "2030-01-01T12:00:00", "to": "2030-01-01T12:10:00", "bucket": "5m"
+    }, headers=manager_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert {u["user_id"] for u in data["users"]} == {first_id, second_id}
+    series = [(point["bucket"], [s["user_id"] for s in point["standings"]]) for point in data["series"]]
+    assert series == [
+        ("2030-01-01T12:00:00", [first_id, second_id]),
+        ("2030-01-01T12:05:00", [second_id, first_id]),
+        ("2030-01-01T12:10:00", [second_id, first_id]),
+    ]
+    assert data["series"][1]["standings"][0] == {"user_id": second_id, "rank": 1, "total_points": 20}
+
+    # Тот же период с явным смещением: 15:00+03:00 - это 12:00 UTC
+    shifted = client.get(f"/leaderboard/{comp_id}/history", params={
+        "from": "2030-01-01T15:00:00+03:00", "to": "2030-01-01T15:10:00+03:00", "bucket": "5m"
+    }, headers=manager_headers)
+    assert shifted.status_code == 200
+    assert shifted.json()["series"] == data["series"]
+
+
+def test_history_rejects_bad_bucket_and_long_range(client, manager_headers, competition_users):
+    """
+    Тест ограничений GET /leaderboard/{id}/history.
+    Проверяет 400 для неизвестного bucket и для периода со слишком большим числом интервалов.
+    """
+    comp_id = competition_users[0]
+    url = f"/leaderboard/{comp_id}/history"
+    assert client.get(url, params={"bucket": "7m"}, headers=manager_headers).status_code == 400
+    response = client.get(url, params={"from": "2025-01-01T00:00:00", "to": "2030-01-01T00:00:00", "bucket": "5m"},
+                          headers=manager_headers)
+    assert response.status_code == 400
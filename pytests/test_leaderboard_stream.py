@@ -0,0 +1,103 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from db import SessionLocal, engine
+from ledger import award_points
+from leaderboard_stream import broadcaster, diff_standings, format_event
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+@pytest.fixture
+def competition_users(client):
+    """Соревнование с двумя участниками (id пользователей в порядке регистрации)."""
+    with engine.begin() as conn:
+        comp_id = conn.execute(text(
+            "INSERT INTO competitions (title, start_date, end_date) "
+            "VALUES ('Stream Comp', '2025-01-01', '2099-01-01') RETURNING id"
+        )).scalar_one()
+    user_ids = []
+    for name in ("First", "Second"):
+        user = client.post("/register", json={"email": unique_email(), "first_name": name,
+                                              "last_name": "Viewer", "password": "userpass"}).json()
+        user_ids.append(user["id"])
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET cur_comp = :comp_id, total_points = 0 WHERE id = ANY(:ids)"),
+                     {"comp_id": comp_id, "ids": user_ids})
+    return comp_id, user_ids
+
+
+@pytest.fixture
+def reward_type_id(client):
+    with engine.begin() as conn:
+        return conn.execute(text(
+            "INSERT INTO reward_types (code, name) VALUES ('stream_test', 'Stream Test') RETURNING id"
+        )).scalar_one()
+
+
+def test_diff_standings_sends_only_changed_rows():
+    """
+    Тест вычисления изменений рейтинга.
+    Проверяет что в diff попадают строки с новым местом или баллами и ушедшие участники, но не неизменные строки.
+    """
+    old = [
+        {"user_id": 1, "rank": 1, "first_name": "A", "last_name": "A", "total_points": 30},
+        {"user_id": 2, "rank": 2, "first_name": "B", "last_name": "B", "total_points": 20},
+        {"user_id": 3, "rank": 3, "first_name": "C", "last_name": "C", "total_points": 10},
+        {"user_id": 4, "rank": 4, "first_name": "D", "last_name": "D", "total_points": 5},
+    ]
+    new = [
+        {"user_id": 2, "rank": 1, "first_name": "B", "last_name": "B", "total_points": 40},
+        {"user_id": 1, "rank": 2, "first_name": "A", "last_name": "A", "total_points": 30},
+        {"user_id": 3, "rank": 3, "first_name": "C", "last_name": "C", "total_points": 10},
+    ]
+    diff = diff_standings(old, new)
+    assert [row["user_id"] for row in diff["changed"]] == [2, 1]
+    assert diff["removed"] == [4]
+    assert format_event("diff", diff).startswith(b"event: diff\ndata: {")
+
+
+def test_stream_pushes_rank_change_after_award(client, competition_users, reward_type_id):
+    """
+    Тест ленты лидерборда.
+    Проверяет что подписчик получает снимок, а после начисления баллов - diff с новыми местами.
+    """
+    comp_id, (first_id, second_id) = competition_users
+
+    def award_second():
+        db = SessionLocal()
+        try:
+            award_points(db, second_id, reward_type_id, 15, "stream")
+            db.commit()
+        finally:
+            db.close()
+
+    async def scenario():
+        feed, queue = await broadcaster.subscribe(comp_id)
+        try:
+            event, snapshot = await queue.get()
+            assert event == "snapshot"
+            assert [row["user_id"] for row in snapshot] == [first_id, second_id]
+
+            await asyncio.get_running_loop().run_in_executor(None, award_second)
+            event, diff = await asyncio.wait_for(queue.get(), timeout=5)
+            assert event == "diff"
+            assert {row["user_id"]: row["rank"] for row in diff["changed"]} == {second_id: 1, first_id: 2}
+            assert diff["removed"] == []
+        finally:
+            broadcaster.unsubscribe(feed, queue)
+
+    asyncio.run(scenario())
+
+
+def test_stream_unknown_competition_returns_404(client):
+    """
+    Тест потока лидерборда несуществующего соревнования.
+    Проверяет что GET /leaderboard/{id}/stream возвращает 404 до открытия потока.
+    """
+    assert client.get("/leaderboard/999999/stream").status_code == 404
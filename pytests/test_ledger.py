@@ -0,0 +1,119 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+
+from db import SessionLocal, engine
+from ledger import award_points, reconcile_totals
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+@pytest.fixture
+def registered_user(client):
+    email = unique_email()
+    password = "userpass"
+    res = client.post("/register",
+                      json={"email": email, "first_name": "User", "last_name": "Test", "password": password})
+    user = res.json()
+    login_res = client.post("/login", json={"email": email, "password": password})
+    token = login_res.json()["access_token"]
+    return {"user": user, "token": token}
+
+
+@pytest.fixture
+def reward_type_id(client):
+    with engine.begin() as conn:
+        return conn.execute(text(
+            "INSERT INTO reward_types (code, name) VALUES ('ledger_test', 'Ledger Test') RETURNING id"
+        )).scalar_one()
+
+
+def _total_points(user_id: int) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT total_points FROM users WHERE id = :id"), {"id": user_id}).scalar_one()
+
+
+def test_concurrent_awards_do_not_lose_updates(client, registered_user, reward_type_id):
+    """
+    Стресс-тест журнала баллов: 400 начислений из 16 потоков одному пользователю.
+    Проверяет что total_points равен сумме наград (нет потерянных обновлений) и сверка не находит расхождений.
+    """
+    user_id = registered_user["user"]["id"]
+    workers, awards_per_worker, points = 16, 25, 3
+
+    def worker(_):
+        db = SessionLocal()
+        try:
+            for _ in range(awards_per_worker):
+                award_points(db, user_id, reward_type_id, points, "ledger stress")
+                db.commit()
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+
+    assert _total_points(user_id) == workers * awards_per_worker * points
+    db = SessionLocal()
+    try:
+        assert reconcile_totals(db) == []
+    finally:
+        db.close()
+
+
+def test_concurrent_reward_requests_keep_total(client, registered_user, reward_type_id):
+    """
+    Тест параллельных POST /rewards через API.
+    Проверяет что все начисления попадают в total_points.
+    """
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+
+    def post_reward(_):
+        return client.post("/rewards", json={"type_id": reward_type_id, "points_amount": 5, "reason": "parallel"},
+                           headers=headers).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(post_reward, range(40)))
+
+    assert statuses == [201] * 40
+    assert client.get("/users/me", headers=headers).json()["total_points"] == 200
+
+
+def test_update_and_delete_reward_adjust_total(client, registered_user, reward_type_id):
+    """
+    Тест изменения и удаления награды.
+    Проверяет что PUT /rewards/{id} применяет разницу, а DELETE /rewards/{id} списывает баллы.
+    """
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    reward = client.post("/rewards", json={"type_id": reward_type_id, "points_amount": 10},
+                         headers=headers).json()
+    client.put(f"/rewards/{reward['id']}", json={"points_amount": 25}, headers=headers)
+    assert _total_points(registered_user["user"]["id"]) == 25
+
+    client.delete(f"/rewards/{reward['id']}", headers=headers)
+    assert _total_points(registered_user["user"]["id"]) == 0
+
+
+def test_reconcile_fixes_drift(client, registered_user, reward_type_id):
+    """
+    Тест сверки total_points с наградами.
+    Проверяет что расхождение находится в режиме просмотра и исправляется с apply=True.
+    """
+    user_id = registered_user["user"]["id"]
+    db = SessionLocal()
+    try:
+        award_points(db, user_id, reward_type_id, 7)
+        db.commit()
+        db.execute(text("UPDATE users SET total_points = 100 WHERE id = :id"), {"id": user_id})
+        db.commit()
+
+        assert reconcile_totals(db) == [{"user_id": user_id, "stored": 100, "actual": 7}]
+        assert _total_points(user_id) == 100
+        reconcile_totals(db, apply=True)
+        assert _total_points(user_id) == 7
+    finally:
+        db.close()
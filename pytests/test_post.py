@@ -195,6 +195,22 @@ def test_create_task_as_user(client, registered_user, registered_admin):
     assert response.status_code == 201
 
 
+def test_create_task_reports_stage_timings(client, registered_user, registered_admin):
+    """
+    Тест заголовка Server-Timing при создании задачи.
+    Проверяет что POST /tasks возвращает длительности этапов: поиск статуса, оценка AI, вставка и время БД.
+    """
+    client.post("/task-statuses", json={"code": "timing_status", "name": "Timing"},
+                headers={"Authorization": f"Bearer {registered_admin['token']}"})
+
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    response = client.post("/tasks", json={"title": "Timed task", "status_id": 1}, headers=headers)
+    assert response.status_code == 201
+    server_timing = response.headers["server-timing"]
+    for stage in ("lookup;dur=", "llm_estimate;dur=", "insert;dur=", "db;dur="):
+        assert stage in server_timing
+
+
 def test_create_task_for_other_user_as_admin(client, registered_admin, registered_user):
     """
     Тест создания задачи для другого пользователя администратором.
@@ -226,6 +242,24 @@ def test_create_task_for_nonexistent_user(client, registered_admin):
     assert response.status_code == 404
 
 
+def test_create_task_sees_status_changes(client, registered_user, registered_admin):
+    """
+    Тест кэша справочников при создании задачи.
+    Проверяет что новый статус доступен в POST /tasks сразу, а удалённый статус сразу отклоняется (404).
+    """
+    admin_headers = {"Authorization": f"Bearer {registered_admin['token']}"}
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+    status = client.post("/task-statuses", json={"code": "cached", "name": "Cached"}, headers=admin_headers).json()
+
+    response = client.post("/tasks", json={"title": "Cached status", "status_id": status["id"]}, headers=headers)
+    assert response.status_code == 201
+
+    client.delete(f"/tasks/{response.json()['id']}", headers=headers)
+    client.delete(f"/task-statuses/{status['id']}", headers=admin_headers)
+    response = client.post("/tasks", json={"title": "Deleted status", "status_id": status["id"]}, headers=headers)
+    assert response.status_code == 404
+
+
 
 # TaskTags
 def test_create_task_tag(client, registered_user, registered_admin):
@@ -283,6 +317,95 @@ def test_create_reward(client, registered_user, registered_admin):
     assert response.status_code == 201
 
 
+@pytest.fixture
+def completable_task(client, registered_user, registered_admin):
+    admin_headers = {"Authorization": f"Bearer {registered_admin['token']}"}
+    todo = client.post("/task-statuses", json={"code": "todo", "name": "К выполнению"}, headers=admin_headers).json()
+    client.post("/task-statuses", json={"code": "done", "name": "Выполнено"}, headers=admin_headers)
+    client.post("/reward-types", json={"code": "complete_test", "name": "Complete Test"}, headers=admin_headers)
+
+    def create(due_date):
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        return client.post("/tasks", json={"title": "Complete me", "status_id": todo["id"], "due_date": due_date},
+                           headers=headers).json()
+
+    return create
+
+
+def test_complete_task_awards_points(client, registered_user, completable_task):
+    """
+    Тест завершения задачи через POST /tasks/{id}/complete.
+    Проверяет что задача получает статус done, completed_at и awarded_points, а баллы начисляются пользователю.
+    """
+    due_date = (datetime.utcnow() + timedelta(days=3)).isoformat()
+    task = completable_task(due_date)
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+
+    response = client.post(f"/tasks/{task['id']}/complete", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["task"]["completed_at"] is not None
+    assert data["awarded_points"] == task["estimated_points"]
+    assert data["task"]["awarded_points"] == task["estimated_points"]
+    assert data["total_points"] == task["estimated_points"]
+    assert client.get("/users/me", headers=headers).json()["total_points"] == task["estimated_points"]
+
+    repeated = client.post(f"/tasks/{task['id']}/complete", headers=headers)
+    assert repeated.status_code == 409
+
+
+def test_complete_overdue_task_awards_nothing(client, registered_user, completable_task):
+    """
+    Тест завершения просроченной задачи.
+    Проверяет что задача после дедлайна завершается без начисления баллов.
+    """
+    task = completable_task((datetime.utcnow() - timedelta(days=1)).isoformat())
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+
+    response = client.post(f"/tasks/{task['id']}/complete", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["awarded_points"] == 0
+    assert response.json()["total_points"] == 0
+
+
+def test_complete_task_without_estimate(client, registered_user, completable_task):
+    """
+    Тест завершения задачи без оценки.
+    Проверяет что задача с estimated_points = NULL завершается без начисления баллов, а не падает с 500.
+    """
+    from db import engine
+    task = completable_task((datetime.utcnow() + timedelta(days=3)).isoformat())
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE tasks SET estimated_points = NULL WHERE id = :id"), {"id": task["id"]})
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+
+    response = client.post(f"/tasks/{task['id']}/complete", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["task"]["estimated_points"] is None
+    assert response.json()["awarded_points"] == 0
+    assert response.json()["total_points"] == 0
+
+
+def test_complete_task_checks_competition_added_outside_api(client, registered_user, completable_task):
+    """
+    Тест соревнования, которого ещё нет в кэше справочников воркера.
+    Соревнование, добавленное в обход API (без NOTIFY), всё равно ограничивает завершение задачи своим периодом.
+    """
+    from db import engine
+    task = completable_task((datetime.utcnow() + timedelta(days=3)).isoformat())
+    with engine.begin() as conn:
+        comp_id = conn.execute(text(
+            "INSERT INTO competitions (title, start_date, end_date) VALUES ('Past', '2001-01-01', '2001-02-01') RETURNING id"
+        )).scalar_one()
+        conn.execute(text("UPDATE users SET cur_comp = :comp_id WHERE id = :id"),
+                     {"comp_id": comp_id, "id": registered_user["user"]["id"]})
+    headers = {"Authorization": f"Bearer {registered_user['token']}"}
+
+    response = client.post(f"/tasks/{task['id']}/complete", headers=headers)
+    assert response.status_code == 400
+    assert "Соревнование завершилось" in response.json()["detail"]
+
+
 # Competitions
 def test_create_competition_as_manager(client, registered_manager):
     """
@@ -426,6 +426,22 @@ def test_update_competition_by_manager(client, registered_manager, sample_compet
     assert response.json()["title"] == new_title
 
 
+def test_update_competition_refreshes_cached_dates(client, registered_manager, sample_competition):
+    """
+    Тест кэша соревнований.
+    Проверяет что GET /competitions/{id}/dates сразу возвращает даты, измененные через PUT /competitions/{id}.
+    """
+    headers = {"Authorization": f"Bearer {registered_manager['token']}"}
+    url = f"/competitions/{sample_competition['id']}"
+    assert client.get(f"{url}/dates", headers=headers).json()["end_date"] == "2025-08-31T23:59:59"
+
+    client.put(url, json={"end_date": "2025-09-30T23:59:59"}, headers=headers)
+    assert client.get(f"{url}/dates", headers=headers).json()["end_date"] == "2025-09-30T23:59:59"
+
+    client.delete(url, headers=headers)
+    assert client.get(f"{url}/dates", headers=headers).status_code == 404
+
+
 def test_update_competition_by_user_forbidden(client, registered_user, sample_competition):
     """
     Тест запрета обновления соревнования обычным пользователем.
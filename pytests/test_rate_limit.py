@@ -0,0 +1,97 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+import rate_limit
+from db import engine
+from rate_limit import record_ai_tokens
+
+
+def unique_email():
+    return f"test_{uuid.uuid4()}@example.com"
+
+
+def _login(client, role="user"):
+    email = unique_email()
+    user = client.post("/register", json={"email": email, "first_name": "User", "last_name": "Test",
+                                          "password": "userpass"}).json()
+    if role != "user":
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE users SET role = :role WHERE id = :id"), {"role": role, "id": user["id"]})
+    token = client.post("/login", json={"email": email, "password": "userpass"}).json()["access_token"]
+    return user["id"], {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def task_body(client):
+    with engine.begin() as conn:
+        status_id = conn.execute(text(
+            "INSERT INTO task_status (code, name) VALUES ('limit_test', 'Rate Limit Test') RETURNING id"
+        )).scalar_one()
+    return {"title": "Подготовить отчёт", "status_id": status_id}
+
+
+@pytest.fixture
+def user_limits(monkeypatch):
+    """Лимиты роли user для теста: rate_limit.ROLE_LIMITS["user"] меняется до конца теста."""
+    def apply(**limits):
+        monkeypatch.setitem(rate_limit.ROLE_LIMITS, "user", {**rate_limit.ROLE_LIMITS["user"], **limits})
+    return apply
+
+
+def test_requests_per_minute_per_user(client, task_body, user_limits, mock_ai_analyzer):
+    """
+    Тест лимита запросов в минуту.
+    Запрос сверх лимита получает 429 с Retry-After без вызова AI; другой пользователь не затронут.
+    """
+    user_limits(requests_per_minute=2)
+    _, headers = _login(client)
+    statuses = [client.post("/tasks", json=task_body, headers=headers).status_code for _ in range(3)]
+    assert statuses == [201, 201, 429]
+
+    limited = client.post("/tasks", json=task_body, headers=headers)
+    assert limited.status_code == 429
+    assert 1 <= int(limited.headers["retry-after"]) <= 30
+    assert mock_ai_analyzer.call_count == 2
+
+    _, other_headers = _login(client)
+    assert client.post("/tasks", json=task_body, headers=other_headers).status_code == 201
+
+
+def test_global_requests_per_minute(client, task_body, monkeypatch):
+    """
+    Тест общего лимита запросов в минуту.
+    Проверяет что общий bucket ограничивает разных пользователей вместе.
+    """
+    monkeypatch.setattr(rate_limit, "AI_REQUESTS_PER_MINUTE_GLOBAL", 1)
+    _, first = _login(client)
+    _, second = _login(client)
+    assert client.post("/tasks", json=task_body, headers=first).status_code == 201
+    assert client.post("/tasks", json=task_body, headers=second).status_code == 429
+
+
+def test_daily_tokens_and_usage_view(client, task_body, user_limits, mock_ai_analyzer):
+    """
+    Тест дневного бюджета токенов и GET /admin/ai-usage.
+    Токены из usage ответа Yandex учитываются за день; после исчерпания бюджета - 429 до конца дня.
+    """
+    user_limits(tokens_per_day=100)
+    user_id, headers = _login(client)
+    _, admin_headers = _login(client, "admin")
+
+    def analyze(title, description=""):
+        record_ai_tokens({"inputTextTokens": "90", "completionTokens": "30", "totalTokens": "120"})
+        return {"estimated_points": 10}
+
+    mock_ai_analyzer.side_effect = analyze
+    assert client.post("/tasks", json=task_body, headers=headers).status_code == 201
+    limited = client.post("/tasks", json=task_body, headers=headers)
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) > 0
+
+    usage = client.get("/admin/ai-usage", headers=admin_headers)
+    assert usage.status_code == 200
+    row = next(row for row in usage.json() if row["user_id"] == user_id)
+    assert (row["requests"], row["llm_calls"], row["tokens"], row["tokens_per_day"]) == (1, 1, 120, 100)
+    assert client.get("/admin/ai-usage", headers=headers).status_code == 403
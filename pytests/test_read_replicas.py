@@ -0,0 +1,67 @@
+import pytest
+
+import db
+from db import Replica, engine, parse_lsn, read_engine, _lsn_from_headers
+
+
+class FakeReplica:
+    """Реплика с фиксированной позицией воспроизведения WAL."""
+
+    def __init__(self, name, replay_lsn):
+        self.engine = name
+        self.replay_lsn = replay_lsn
+
+    def caught_up(self, min_lsn):
+        return self.replay_lsn >= min_lsn
+
+
+def test_parse_lsn_orders_positions():
+    """
+    Тест разбора позиции WAL.
+    Проверяет что позиции сравниваются по обеим половинам, а не как строки.
+    """
+    assert parse_lsn("0/16B3748") < parse_lsn("0/A0000000") < parse_lsn("1/0")
+    assert parse_lsn("1/0") == 1 << 32
+
+
+def test_read_engine_skips_lagging_replicas(monkeypatch):
+    """
+    Тест выбора движка для чтения.
+    Проверяет что без позиции подходит любая реплика, с позицией - только догнавшая, иначе основная база.
+    """
+    monkeypatch.setattr(db, "replicas", [FakeReplica("lagging", 100), FakeReplica("fresh", 500)])
+
+    assert {read_engine(None) for _ in range(4)} == {"lagging", "fresh"}
+    assert {read_engine(300) for _ in range(4)} == {"fresh"}
+    assert read_engine(900) is engine
+
+
+def test_lsn_read_from_header_or_cookie():
+    """
+    Тест чтения позиции клиента.
+    Проверяет заголовок X-DB-LSN, cookie db_lsn и игнорирование некорректного значения.
+    """
+    assert _lsn_from_headers([(b"x-db-lsn", b"0/10")]) == 16
+    assert _lsn_from_headers([(b"cookie", b"theme=dark; db_lsn=0/20")]) == 32
+    assert _lsn_from_headers([(b"cookie", b"db_lsn=garbage")]) is None
+    assert _lsn_from_headers([]) is None
+
+
+def test_write_returns_lsn_and_reads_use_caught_up_replica(client, monkeypatch):
+    """
+    Тест чтения своих записей.
+    Основная база подставлена как единственная реплика: запрос с записью получает позицию WAL
+    в cookie и заголовке, запрос без записи - нет, а чтение с этой позицией идёт на реплику.
+    """
+    replica = Replica(engine)
+    monkeypatch.setattr(db, "replicas", [replica])
+
+    response = client.post("/tags", json={"name": "replica-tag"})
+    assert response.status_code == 201
+    lsn = response.headers["x-db-lsn"]
+    assert f"db_lsn={lsn}" in response.headers["set-cookie"]
+
+    response = client.get("/tags", headers={"X-DB-LSN": lsn})
+    assert "x-db-lsn" not in response.headers
+    assert "replica-tag" in [tag["name"] for tag in response.json()]
+    assert replica.caught_up(parse_lsn(lsn))
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ml.errors import YandexAPIError
+from ml.singleflight import SingleFlight, flight_key, normalize_text
+
+
+class SlowModel:
+    """Модель, отвечающая с задержкой; считает реальные вызовы."""
+
+    def __init__(self, delay=0.3, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"estimated_points": 42, "model_used": "test"}
+
+
+def test_normalized_inputs_share_key():
+    """
+    Тест ключа объединения.
+    Проверяет что лишние пробелы не влияют на ключ, а другой вид вызова даёт другой ключ.
+    """
+    assert normalize_text("  Написать   отчёт\n") == "Написать отчёт"
+    assert flight_key("estimate", {"title": normalize_text(" a  b ")}) == flight_key("estimate", {"title": "a b"})
+    assert flight_key("estimate", {"title": "a"}) != flight_key("command", {"title": "a"})
+
+
+def test_concurrent_calls_in_worker_share_one_model_call(client):
+    """
+    Тест объединения в воркере.
+    Проверяет что пять одновременных вызовов с одним входом вызывают модель один раз.
+    """
+    flight = SingleFlight()
+    model = SlowModel()
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: flight.run("estimate", {"title": "отчёт"}, model), range(5)))
+
+    assert model.calls == 1
+    assert all(result == {"estimated_points": 42, "model_used": "test"} for result in results)
+
+
+def test_second_worker_picks_up_leader_result(client):
+    """
+    Тест объединения между воркерами.
+    Второй воркер (отдельный SingleFlight) ждёт ведущего и берёт его результат из ai_results.
+    """
+    leader, follower = SingleFlight(), SingleFlight()
+    model = SlowModel()
+    thread = threading.Thread(target=lambda: leader.run("estimate", {"title": "общий"}, model))
+    thread.start()
+    time.sleep(0.1)
+    result = follower.run("estimate", {"title": "общий"}, model)
+    thread.join()
+
+    assert model.calls == 1
+    assert result["estimated_points"] == 42
+
+
+def test_leader_error_shared_and_key_released(client):
+    """
+    Тест ошибки ведущего вызова.
+    Проверяет что ошибка модели не сохраняется: следующий вызов снова идёт в модель.
+    """
+    flight = SingleFlight()
+    failing = SlowModel(delay=0, error=YandexAPIError("timeout"))
+    with pytest.raises(YandexAPIError):
+        flight.run("estimate", {"title": "сбой"}, failing)
+
+    model = SlowModel(delay=0)
+    assert flight.run("estimate", {"title": "сбой"}, model)["estimated_points"] == 42
+    assert model.calls == 1
+
+
+def test_unshareable_result_not_reused(client):
+    """
+    Тест запасного ответа.
+    Результат, который shareable отклоняет, не достаётся следующему вызову.
+    """
+    flight = SingleFlight()
+    model = SlowModel(delay=0)
+    flight.run("estimate", {"title": "запасной"}, model, shareable=lambda result: False)
+    flight.run("estimate", {"title": "запасной"}, model, shareable=lambda result: False)
+    assert model.calls == 2
@@ -0,0 +1,41 @@
+import pytest
+from ml.provider import AIProvider
+from ml.errors import AIDisabledError, YandexAPIError
+
+
+def test_provider_disabled_without_api_key(monkeypatch):
+    """
+    Тест режима "AI отключён" без YANDEX_API_KEY.
+    Проверяет что провайдер не импортирует анализатор и бросает AIDisabledError (подкласс YandexAPIError).
+    """
+    monkeypatch.delenv("YANDEX_API_KEY", raising=False)
+    provider = AIProvider()
+    assert provider.enabled is False
+    with pytest.raises(AIDisabledError):
+        provider.analyze_task("Написать отчёт")
+    assert issubclass(AIDisabledError, YandexAPIError)
+    assert provider.init_seconds is None
+
+
+def test_provider_disabled_by_flag(monkeypatch):
+    """
+    Тест явного отключения AI через AI_DISABLED=true.
+    Проверяет что флаг отключает AI даже при заданном ключе.
+    """
+    monkeypatch.setenv("YANDEX_API_KEY", "test-key")
+    monkeypatch.setenv("AI_DISABLED", "true")
+    assert AIProvider().enabled is False
+
+
+def test_chat_routes_do_not_import_requests():
+    """
+    Тест ленивой загрузки AI-стека.
+    Проверяет что импорт роутов чата не загружает requests и ml.ai_analyzer: они нужны только при первом вызове модели.
+    """
+    import os
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    code = "import sys, routes_chat; print('requests' in sys.modules, 'ml.ai_analyzer' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False"]
@@ -0,0 +1,82 @@
+from unittest.mock import MagicMock
+
+from ml.command_parser import parse_command
+from ml.provider import AIProvider
+
+STATUSES = [
+    {"code": "todo", "name": "К выполнению"},
+    {"code": "in_progress", "name": "В работе"},
+    {"code": "done", "name": "Выполнено"},
+]
+TAGS = ["несрочно", "срочно", "очень срочно"]
+
+
+def test_documented_pattern_parsed_without_model():
+    """
+    Тест разбора сообщения по документированному шаблону.
+    Проверяет название, дату, статус по названию, тег и ответ как у языковой модели.
+    """
+    result = parse_command("Создай задачу 'Купить фрукты' на 12.12.2025, статус В работе, тег срочно", STATUSES, TAGS)
+
+    assert result["confidence"] == 1.0
+    assert result["reply"] == "Создаю срочную задачу 'Купить фрукты'"
+    assert result["commands"] == [{"action": "create_task", "task_data": {
+        "title": "Купить фрукты",
+        "description": "Нет описания",
+        "status_code": "in_progress",
+        "due_date": "2025-12-12T00:00:00",
+        "tags": ["срочно"],
+    }}]
+
+
+def test_urgency_and_description_variants():
+    """
+    Тест вариантов шаблона.
+    "очень срочную" не путается со "срочно", описание забирает остаток сообщения с запятыми.
+    """
+    result = parse_command("Создай очень срочную задачу «Отчёт», описание: таблицы, графики", STATUSES, TAGS)
+    task_data = result["commands"][0]["task_data"]
+
+    assert result["reply"] == "Создаю критическую задачу 'Отчёт'"
+    assert task_data["tags"] == ["очень срочно"]
+    assert task_data["description"] == "таблицы, графики"
+    assert task_data["status_code"] == "todo"
+
+
+def test_unresolved_message_left_for_model():
+    """
+    Тест сообщений, которые разбор не покрывает полностью.
+    Дата словами, несуществующая дата, неизвестный статус и текст без названия в кавычках - без команд.
+    """
+    for message in [
+        "Создай задачу 'Отчёт' на послезавтра",
+        "Создай задачу 'Отчёт' на 31.02.2026",
+        "Создай задачу 'Отчёт', статус отложено",
+        "Надо бы купить фрукты к пятнице",
+    ]:
+        result = parse_command(message, STATUSES, TAGS)
+        assert result["commands"] == [], message
+        assert result["confidence"] < 0.9
+
+
+def test_provider_skips_model_parse_for_pattern(monkeypatch):
+    """
+    Тест провайдера.
+    Сообщение по шаблону не уходит в разбор моделью, но получает оценку сложности.
+    """
+    monkeypatch.setenv("YANDEX_API_KEY", "test-key")
+    monkeypatch.delenv("AI_DISABLED", raising=False)
+    analyzer = MagicMock()
+    provider = AIProvider()
+    provider._get_analyzer = lambda: analyzer
+    provider.analyze_task = MagicMock(return_value={"estimated_points": 30})
+
+    result = provider.analyze_task_with_commands("Создай задачу 'Купить фрукты' на 12.12.2025", STATUSES, TAGS)
+
+    analyzer.analyze_task_with_commands.assert_not_called()
+    assert result["commands"][0]["task_data"]["estimated_points"] == 30
+
+    provider.analyze_task = MagicMock(return_value={"estimated_points": None, "is_meaningless": True,
+                                                    "explanation": "нет действия"})
+    result = provider.analyze_task_with_commands("Создай задачу 'фыва'", STATUSES, TAGS)
+    assert result == {"reply": "Задача бессмысленна или неконкретна: нет действия", "commands": []}
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from ml import ai_analyzer
+from ml.errors import YandexRateLimitError
+from ml.fake_yandex import FakeYandexConfig, make_server, COMPLETION_PATH
+
+
+@pytest.fixture
+def fake_yandex(monkeypatch):
+    """Запускает локальный стенд Yandex API на свободном порту и направляет на него клиент."""
+    servers = []
+
+    def start(**options):
+        config = FakeYandexConfig(seed=1, **options)
+        server = make_server(port=0, config=config)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("YANDEX_API_KEY", "fake")
+        monkeypatch.setattr(ai_analyzer, "YANDEX_API_URL", f"http://127.0.0.1:{server.server_port}{COMPLETION_PATH}")
+        monkeypatch.setattr(ai_analyzer.time, "sleep", lambda seconds: None)
+        return config
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_client_gets_deterministic_estimate(fake_yandex):
+    """
+    Тест реального HTTP-клиента против стенда.
+    Проверяет что одинаковая задача получает одинаковую оценку.
+    """
+    fake_yandex()
+    first = ai_analyzer.analyze_task("Написать отчёт по продажам", "Квартальный отчёт для руководства")
+    second = ai_analyzer.analyze_task("Написать отчёт по продажам", "Квартальный отчёт для руководства")
+    assert 1 <= first["estimated_points"] <= 100
+    assert first["estimated_points"] == second["estimated_points"]
+
+
+def test_client_retries_and_raises_on_rate_limit(fake_yandex):
+    """
+    Тест обработки 429 клиентом.
+    Проверяет что клиент делает все повторы и бросает YandexRateLimitError.
+    """
+    config = fake_yandex(rate_limit_rate=1.0)
+    with pytest.raises(YandexRateLimitError):
+        ai_analyzer.analyze_task("Написать отчёт по продажам", "Квартальный отчёт")
+    assert config.stats["rate_limited"] == ai_analyzer.YANDEX_MAX_RETRIES
@@ -0,0 +1,73 @@
+import os
+
+from ml.moderation import ModerationFilter, moderate
+
+SMOKING_REPLY = "Я не могу создавать задачи, связанные с курением"
+ABUSE_REPLY = "Я не могу помочь с задачами, связанными с оскорблениями"
+
+
+def test_obfuscated_terms_rejected():
+    """
+    Тест вариантов написания запрещенных основ.
+    Регистр, латинские буквы, цифры, повторы букв и разделители не обходят модерацию.
+    """
+    for message in ["Сходить ПОКУРИТЬ", "pokурить", "п.о.к.у.р.и.т.ь", "п о к у р и т ь",
+                    "покуууррить", "купить сигaрeты", "раскурить к@льян"]:
+        assert moderate(message).startswith(SMOKING_REPLY), message
+    assert moderate("Написать, что он ИДИ0Т").startswith(ABUSE_REPLY)
+    assert moderate("Отчёт", "описание: купить сигареты").startswith(SMOKING_REPLY)
+
+
+def test_ordinary_messages_pass():
+    """
+    Тест обычных сообщений.
+    Проверяет что похожие слова и буквы через пробел в обычном тексте не дают ложных отказов.
+    """
+    for message in ["Обновить курс валют по курсу ЦБ", "Пройти курс английского", "Подготовить отчёт к 12.12.2025",
+                    "Сделать и в срок сдать", "Избирательная кампания: подготовить материалы"]:
+        assert moderate(message) is None, message
+
+
+def test_stems_matched_from_word_start():
+    """
+    Тест ложных срабатываний внутри слов.
+    Основа не ищется в середине слова, дефис между словами не склеивает их, рабочие задачи не блокируются.
+    """
+    for message in ["Проверить ступицу колеса", "Отчет по-курсу валют", "убить зависший процесс",
+                    "Добавить закладку в браузере", "Сгенерировать затравку для тестов"]:
+        assert moderate(message) is None, message
+    assert moderate("Назвать коллегу тупицей").startswith(ABUSE_REPLY)
+    assert moderate("Сходить на перекур").startswith(SMOKING_REPLY)
+
+
+def test_prefixed_verbs_rejected():
+    """
+    Тест глаголов с приставками.
+    Основа ищется с начала слова, поэтому приставочные формы перечислены отдельно и тоже дают отказ.
+    """
+    for message in ["Выкурить сигару", "Накуриться после работы", "Прокурить комнату", "Докурить", "Скурить",
+                    "Откурить и вернуться", "Закурить на балконе", "Посидеть в прокуренном баре"]:
+        assert moderate(message).startswith(SMOKING_REPLY), message
+    for message in ["Отправить запрос в прокуратуру", "Согласовать с прокурором"]:
+        assert moderate(message) is None, message
+
+
+def test_terms_file_reloaded(tmp_path):
+    """
+    Тест перечитывания файла терминов.
+    Изменённый файл применяется без перезапуска, файл с ошибкой не заменяет прежний список.
+    """
+    path = tmp_path / "terms.txt"
+    path.write_text("[spam]\nreply: Без рассылок.\nрассылк\n", encoding="utf-8")
+    moderation = ModerationFilter(str(path), reload_seconds=0)
+    assert moderation.check("Настроить рассылку") == "Без рассылок."
+    assert moderation.check("Купить кальян") is None
+
+    path.write_text("[smoking]\nreply: Без курения.\nкальян\n", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert moderation.check("Купить кальян") == "Без курения."
+    assert moderation.check("Настроить рассылку") is None
+
+    path.write_text("кальян без раздела\n", encoding="utf-8")
+    os.utime(path, ns=(2, 2))
+    assert moderation.check("Купить кальян") == "Без курения."
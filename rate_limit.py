@@ -0,0 +1,231 @@
+"""
+Лимиты запросов к AI по пользователям и ролям.
+
+POST /tasks, POST /tasks/{user_id} и POST /chat вызывают Yandex, а квота Yandex общая на всё
+развёртывание: без лимитов один скрипт исчерпывает её и получает YandexRateLimitError для всех.
+Middleware проверяет бюджеты до того, как запрос дойдёт до обработчика:
+    - запросов в минуту на пользователя - token bucket в ai_rate_buckets (ключ user:<id>),
+      ёмкость и скорость пополнения зависят от роли из токена;
+    - общий лимит запросов в минуту на всё развёртывание (AI_REQUESTS_PER_MINUTE_GLOBAL);
+    - токенов Yandex в день на пользователя по роли и в сумме (AI_TOKENS_PER_DAY_GLOBAL).
+Превышение - 429 с Retry-After (секунды до появления жетона или до конца дня). Состояние лежит
+в Postgres, поэтому лимиты общие для всех воркеров uvicorn. Значение 0 отключает лимит.
+
+Токены считаются по полю usage ответа Yandex (ml/ai_analyzer.py записывает их в UsageCounter
+текущего запроса) и после ответа добавляются в ai_usage за текущий день. Результаты, полученные
+от параллельного вызова (ml/singleflight.py), токенов не тратят и не учитываются.
+Ошибка хранилища лимитов не блокирует запросы: проверка пропускается с записью в лог.
+"""
+import os
+import re
+import math
+import logging
+from contextvars import ContextVar
+from datetime import date
+from typing import Optional
+
+import orjson
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from auth import bearer_claims
+from db import engine
+
+# (запросов в минуту, токенов в день) по ролям; переопределяются AI_REQUESTS_PER_MINUTE_<РОЛЬ>
+# и AI_TOKENS_PER_DAY_<РОЛЬ>
+_DEFAULT_LIMITS = {
+    "user": (10, 50_000),
+    "manager": (30, 200_000),
+    "admin": (60, 500_000),
+}
+ROLE_LIMITS = {
+    role: {
+        "requests_per_minute": int(os.getenv(f"AI_REQUESTS_PER_MINUTE_{role.upper()}", per_minute)),
+        "tokens_per_day": int(os.getenv(f"AI_TOKENS_PER_DAY_{role.upper()}", tokens_per_day)),
+    }
+    for role, (per_minute, tokens_per_day) in _DEFAULT_LIMITS.items()
+}
+AI_REQUESTS_PER_MINUTE_GLOBAL = int(os.getenv("AI_REQUESTS_PER_MINUTE_GLOBAL", "0"))
+AI_TOKENS_PER_DAY_GLOBAL = int(os.getenv("AI_TOKENS_PER_DAY_GLOBAL", "0"))
+
+GLOBAL_BUCKET = "global"
+
+# Эндпоинты с вызовом языковой модели
+AI_ROUTES = [
+    re.compile(r"^/tasks/?$"),
+    re.compile(r"^/tasks/\d+/?$"),
+    re.compile(r"^/chat/?$"),
+    re.compile(r"^/api/chat/?$"),
+]
+
+logger = logging.getLogger("rate_limit")
+
+# Жетон списывается, только если после пополнения за прошедшее время он есть целиком
+_TAKE = """
+    INSERT INTO ai_rate_buckets (key, tokens, updated_at)
+    VALUES (:key, :capacity - 1, now())
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = LEAST(:capacity, ai_rate_buckets.tokens
+                       + EXTRACT(EPOCH FROM now() - ai_rate_buckets.updated_at) * :rate) - 1,
+        updated_at = now()
+    WHERE LEAST(:capacity, ai_rate_buckets.tokens
+                + EXTRACT(EPOCH FROM now() - ai_rate_buckets.updated_at) * :rate) >= 1
+    RETURNING tokens
+"""
+
+_REFILL_WAIT = """
+    SELECT (1 - LEAST(:capacity, tokens + EXTRACT(EPOCH FROM now() - updated_at) * :rate)) / :rate
+    FROM ai_rate_buckets WHERE key = :key
+"""
+
+_DAILY = """
+    SELECT
+        COALESCE((SELECT tokens FROM ai_usage WHERE user_id = :user_id AND day = current_date), 0) AS user_tokens,
+        CASE WHEN :with_total
+             THEN COALESCE((SELECT sum(tokens) FROM ai_usage WHERE day = current_date), 0) END AS total_tokens,
+        EXTRACT(EPOCH FROM date_trunc('day', now()) + interval '1 day' - now()) AS until_tomorrow
+"""
+
+_RECORD = """
+    INSERT INTO ai_usage (user_id, day, requests, llm_calls, tokens)
+    VALUES (:user_id, current_date, 1, :llm_calls, :tokens)
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        requests = ai_usage.requests + 1,
+        llm_calls = ai_usage.llm_calls + EXCLUDED.llm_calls,
+        tokens = ai_usage.tokens + EXCLUDED.tokens
+"""
+
+
+class UsageCounter:
+    """Вызовы модели и токены Yandex одного HTTP-запроса."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tokens = 0
+
+
+request_ai_usage: ContextVar[Optional[UsageCounter]] = ContextVar("request_ai_usage", default=None)
+
+
+def record_ai_tokens(usage: Optional[dict]):
+    """Учитывает поле usage ответа Yandex в расходе текущего запроса. Вне AI-запроса ничего не делает."""
+    counter = request_ai_usage.get()
+    if counter is None:
+        return
+    counter.llm_calls += 1
+    try:
+        counter.tokens += int((usage or {}).get("totalTokens", 0))
+    except (TypeError, ValueError):
+        pass
+
+
+def role_limits(role: str) -> dict:
+    return ROLE_LIMITS.get(role, ROLE_LIMITS["user"])
+
+
+def _take(conn, key: str, per_minute: int) -> Optional[float]:
+    """Списывает жетон из bucket; при нехватке возвращает секунды до следующего жетона."""
+    params = {"key": key, "capacity": per_minute, "rate": per_minute / 60}
+    if conn.execute(text(_TAKE), params).first() is not None:
+        return None
+    return conn.execute(text(_REFILL_WAIT), params).scalar_one()
+
+
+def acquire(user_id: int, role: str) -> Optional[float]:
+    """
+    Проверяет бюджеты пользователя и общий. None - запрос можно выполнять,
+    иначе число секунд для Retry-After. Жетоны списываются все или ни одного.
+    """
+    limits = role_limits(role)
+    with engine.connect() as conn:
+        with conn.begin() as transaction:
+            daily = conn.execute(text(_DAILY), {"user_id": user_id, "with_total": AI_TOKENS_PER_DAY_GLOBAL > 0}).one()
+            over_user = limits["tokens_per_day"] and daily.user_tokens >= limits["tokens_per_day"]
+            over_total = AI_TOKENS_PER_DAY_GLOBAL and daily.total_tokens >= AI_TOKENS_PER_DAY_GLOBAL
+            if over_user or over_total:
+                return float(daily.until_tomorrow)
+
+            wait = None
+            if limits["requests_per_minute"]:
+                wait = _take(conn, f"user:{user_id}", limits["requests_per_minute"])
+            if wait is None and AI_REQUESTS_PER_MINUTE_GLOBAL:
+                wait = _take(conn, GLOBAL_BUCKET, AI_REQUESTS_PER_MINUTE_GLOBAL)
+            if wait is not None:
+                transaction.rollback()
+            return wait
+
+
+def record_usage(user_id: int, counter: UsageCounter):
+    with engine.begin() as conn:
+        conn.execute(text(_RECORD), {"user_id": user_id, "llm_calls": counter.llm_calls, "tokens": counter.tokens})
+
+
+def usage_report(db, day: Optional[date], limit: int, offset: int) -> list:
+    """Расход AI по пользователям за день (None - сегодня по часам БД), от большего числа токенов к меньшему."""
+    rows = db.execute(text("""
+        SELECT u.id AS user_id, u.email, u.first_name, u.last_name, u.role,
+               a.day, a.requests, a.llm_calls, a.tokens
+        FROM ai_usage a
+        JOIN users u ON u.id = a.user_id
+        WHERE a.day = COALESCE(CAST(:day AS date), current_date)
+        ORDER BY a.tokens DESC, a.requests DESC, u.id
+        LIMIT :limit OFFSET :offset
+    """), {"day": day, "limit": limit, "offset": offset}).mappings().all()
+    return [
+        {**row, "tokens_per_day": role_limits(row["role"])["tokens_per_day"] or None}
+        for row in rows
+    ]
+
+
+async def _too_many_requests(send, retry_after: float):
+    payload = orjson.dumps({"detail": "Превышен лимит запросов к AI. Повторите запрос позже."})
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+class RateLimitMiddleware:
+    """Ограничивает POST к AI_ROUTES бюджетами пользователя и общими; считает расход токенов."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST"
+                or not any(route.match(scope["path"]) for route in AI_ROUTES)):
+            await self.app(scope, receive, send)
+            return
+        claims = bearer_claims(dict(scope["headers"]).get(b"authorization", b"").decode("latin-1"))
+        try:
+            user_id, role = int(claims["sub"]), str(claims["role"])
+        except (KeyError, TypeError, ValueError):
+            # Без валидного токена эндпоинт сам ответит 401
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            retry_after = await run_in_threadpool(acquire, user_id, role)
+        except Exception:
+            logger.exception("Не удалось проверить лимиты AI, запрос выполняется без проверки")
+            retry_after = None
+        if retry_after is not None:
+            await _too_many_requests(send, retry_after)
+            return
+
+        counter = UsageCounter()
+        token = request_ai_usage.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_ai_usage.reset(token)
+            try:
+                await run_in_threadpool(record_usage, user_id, counter)
+            except Exception:
+                logger.exception("Не удалось записать расход AI пользователя %s", user_id)
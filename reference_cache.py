@@ -0,0 +1,167 @@
+"""
+Кэш справочников (статусы задач, теги, соревнования) в памяти воркера.
+
+Справочники маленькие и меняются только администратором или менеджером, а читаются
+почти каждым обработчиком задач. Снимок загружается при старте воркера и заменяется целиком:
+
+    refs = reference_data(db)
+    status_by_code(db, "done")["id"]
+    competition_by_id(db, user.cur_comp)
+
+Запись в task_status/tags должна вызвать notify_reference_changed(db), а в competitions -
+notify_competitions_changed(db) до commit: все воркеры получат NOTIFY и перечитают снимок
+при следующем обращении. TTL страхует от потерянного уведомления.
+
+Отсутствие строки в снимке ещё не значит, что её нет в БД: её могли добавить в другом воркере
+до прихода NOTIFY, во время переподключения слушателя или через psql/init_db. Поэтому проверки
+существования идут через функции поиска (status_by_id, competition_by_id и т.п.), которые
+при промахе один раз перечитывают снимок.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from database import TaskStatus, Tag, Competition
+from notifications import listener, publish
+
+REFERENCE_CHANNEL = "reference_data"
+COMPETITIONS_CHANNEL = "competitions"
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+
+logger = logging.getLogger("cache")
+
+
+class ReferenceData:
+    """Снимок справочников; не изменяется после создания."""
+
+    def __init__(self, statuses: list, tags: list):
+        self.statuses = statuses
+        self.status_by_id = {s["id"]: s for s in statuses}
+        self.status_by_code = {s["code"]: s for s in statuses}
+        self.tags = tags
+        self.tag_by_id = {t["id"]: t for t in tags}
+        self.tag_id_by_name = {t["name"]: t["id"] for t in tags}
+
+
+class CompetitionData:
+    """Снимок соревнований; даты без часового пояса, как они хранятся в БД."""
+
+    def __init__(self, competitions: list):
+        self.competitions = competitions
+        self.by_id = {c["id"]: c for c in competitions}
+
+
+def _load_reference_data(db: Session) -> ReferenceData:
+    statuses = [
+        {"id": s.id, "code": s.code, "name": s.name}
+        for s in db.query(TaskStatus).order_by(TaskStatus.id)
+    ]
+    tags = [{"id": t.id, "name": t.name} for t in db.query(Tag).order_by(Tag.id)]
+    return ReferenceData(statuses, tags)
+
+
+def _load_competitions(db: Session) -> CompetitionData:
+    columns = (Competition.id, Competition.title, Competition.start_date, Competition.end_date,
+               Competition.created_at, Competition.updated_at)
+    rows = db.query(*columns).order_by(Competition.id)
+    return CompetitionData([dict(row._mapping) for row in rows])
+
+
+class ReferenceCache:
+    def __init__(self, loader, ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._data = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, payload=None):
+        with self._lock:
+            self._version += 1
+            self._data = None
+
+    def get(self, db: Session):
+        data = self._data
+        if data is None or time.monotonic() - self._loaded_at > self.ttl:
+            data = self._load(db)
+        return data
+
+    def find(self, db: Session, index: str, key) -> Optional[dict]:
+        """Значение из индекса снимка; при промахе снимок перечитывается один раз."""
+        value = getattr(self.get(db), index).get(key)
+        if value is None and key is not None:
+            value = getattr(self._load(db), index).get(key)
+        return value
+
+    def _load(self, db: Session):
+        version = self._version
+        data = self.loader(db)
+        with self._lock:
+            # Инвалидация во время загрузки: снимок мог устареть, отдаём его только этому запросу
+            if self._version == version:
+                self._data = data
+                self._loaded_at = time.monotonic()
+        return data
+
+
+reference_cache = ReferenceCache(_load_reference_data, REFERENCE_CACHE_TTL)
+competition_cache = ReferenceCache(_load_competitions, REFERENCE_CACHE_TTL)
+listener.subscribe(REFERENCE_CHANNEL, reference_cache.invalidate)
+listener.subscribe(COMPETITIONS_CHANNEL, competition_cache.invalidate)
+
+
+def reference_data(db: Session) -> ReferenceData:
+    return reference_cache.get(db)
+
+
+def competitions(db: Session) -> CompetitionData:
+    return competition_cache.get(db)
+
+
+def status_by_id(db: Session, status_id: int) -> Optional[dict]:
+    return reference_cache.find(db, "status_by_id", status_id)
+
+
+def status_by_code(db: Session, code: str) -> Optional[dict]:
+    return reference_cache.find(db, "status_by_code", code)
+
+
+def tag_id_by_name(db: Session, name: str) -> Optional[int]:
+    return reference_cache.find(db, "tag_id_by_name", name)
+
+
+def tag_by_id(db: Session, tag_id: int) -> Optional[dict]:
+    return reference_cache.find(db, "tag_by_id", tag_id)
+
+
+def competition_by_id(db: Session, competition_id: int) -> Optional[dict]:
+    return competition_cache.find(db, "by_id", competition_id)
+
+
+def notify_reference_changed(db: Session):
+    """Вызывается до commit при изменении статусов или тегов."""
+    publish(db, REFERENCE_CHANNEL)
+
+
+def notify_competitions_changed(db: Session):
+    """Вызывается до commit при создании, изменении или удалении соревнования."""
+    publish(db, COMPETITIONS_CHANNEL)
+
+
+def warm_up():
+    """Загружает справочники при старте воркера; при ошибке они загрузятся при первом обращении."""
+    db = SessionLocal()
+    try:
+        for cache in (reference_cache, competition_cache):
+            cache.invalidate()
+            cache.get(db)
+    except Exception as e:
+        logger.warning("Справочники не загружены при старте: %s", e)
+    finally:
+        db.close()
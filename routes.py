@@ -7,10 +7,14 @@ from routes_get import router as get_router
 from routes_put import router as put_router
 from routes_delete import router as delete_router
 from routes_chat import router as chat_router
+from routes_admin import router as admin_router
+from metrics import router as metrics_router
 
 router.include_router(post_router)
 router.include_router(get_router)
 router.include_router(put_router)
 router.include_router(delete_router)
 
-router.include_router(chat_router)
\ No newline at end of file
+router.include_router(chat_router)
+router.include_router(admin_router)
+router.include_router(metrics_router)
\ No newline at end of file
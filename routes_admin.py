@@ -0,0 +1,163 @@
+"""
+Администрирование: потоковая выгрузка таблиц и массовый импорт пользователей.
+
+GET /admin/export/{users|tasks|rewards}?format=ndjson|csv&competition_id= читает таблицу
+серверным курсором (yield_per -> именованный курсор psycopg2) пачками по EXPORT_BATCH_ROWS
+строк и сразу отдаёт их клиенту, поэтому память воркера не зависит от размера таблицы.
+Генератор ответа открывает собственную сессию: сессия зависимости закрывается до того,
+как начнётся передача тела.
+
+POST /admin/users/import принимает CSV или NDJSON и создаёт пользователей пачками
+(см. user_import.py).
+
+GET /admin/ai-usage?day= показывает расход AI по пользователям за день (см. rate_limit.py).
+"""
+import io
+import os
+import csv
+from datetime import date
+from typing import Iterator, List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import get_db, get_read_db, read_engine, request_consistency, ReadSessionLocal
+from database import User, Task, Reward
+from schemas import UserResponse, TaskResponse, RewardResponse, UserImportResponse, AIUsageResponse
+from dependencies import require_admin
+from reference_cache import competition_by_id
+from serialization import columns_for
+from user_import import import_users
+from rate_limit import usage_report
+
+router = APIRouter(prefix="/admin", tags=["ADMIN"])
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _users_query(competition_id: Optional[int]):
+    query = select(*columns_for(User, UserResponse, total_points=0)).order_by(User.id)
+    if competition_id is not None:
+        query = query.where(User.cur_comp == competition_id)
+    return query
+
+
+def _tasks_query(competition_id: Optional[int]):
+    query = select(*columns_for(Task, TaskResponse, estimated_points=0, awarded_points=0)).order_by(Task.id)
+    if competition_id is not None:
+        # У задачи нет соревнования: это задачи текущих участников соревнования
+        query = query.join(User, User.id == Task.user_id).where(User.cur_comp == competition_id)
+    return query
+
+
+def _rewards_query(competition_id: Optional[int]):
+    query = select(*columns_for(Reward, RewardResponse), Reward.competition_id).order_by(Reward.awarded_at, Reward.id)
+    if competition_id is not None:
+        query = query.where(Reward.competition_id == competition_id)
+    return query
+
+
+EXPORTS = {
+    "users": _users_query,
+    "tasks": _tasks_query,
+    "rewards": _rewards_query,
+}
+
+
+def _ndjson_chunks(columns: list, batches: Iterator[list]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in batch)
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+def _csv_chunks(columns: list, batches: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Пустая выгрузка: только заголовок
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+ENCODERS = {
+    "ndjson": _ndjson_chunks,
+    "csv": _csv_chunks,
+}
+
+
+def stream_rows(bind, query, fmt: str) -> Iterator[bytes]:
+    """Кодированные пачки строк запроса; сессия живёт, пока клиент читает ответ."""
+    db = ReadSessionLocal(bind=bind)
+    try:
+        result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_ROWS))
+        yield from ENCODERS[fmt](list(result.keys()), result.partitions())
+    finally:
+        db.close()
+
+
+@router.get("/export/{entity}")
+def export_table(
+    entity: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    competition_id: Optional[int] = None,
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    build_query = EXPORTS.get(entity)
+    if build_query is None:
+        raise HTTPException(status_code=404, detail="Неизвестная таблица для выгрузки")
+    if competition_id is not None and not competition_by_id(db, competition_id):
+        raise HTTPException(status_code=404, detail="Соревнование не найдено")
+
+    consistency = request_consistency.get()
+    bind = read_engine(consistency.min_lsn if consistency else None)
+    return StreamingResponse(
+        stream_rows(bind, build_query(competition_id), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'},
+    )
+
+
+@router.post("/users/import", response_model=UserImportResponse)
+async def import_users_file(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    try:
+        return await import_users(db, request.stream(), format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/ai-usage", response_model=List[AIUsageResponse])
+def get_ai_usage(
+    day: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    """Запросы к AI, вызовы модели и токены по пользователям за день (по умолчанию сегодня)."""
+    return usage_report(db, day, limit, offset)
@@ -2,14 +2,18 @@ import re  # Импорт модуля для работы с регулярны
 from typing import Optional, List  # Импорт типов для аннотаций: Optional (опциональное значение) и List (список)
 from datetime import datetime  # Импорт класса datetime для работы с датами и временем
 from fastapi import APIRouter, Depends, HTTPException  # Импорт компонентов FastAPI: роутер, зависимости и исключения
+from sqlalchemy import func  # Импорт SQL-функций (count для группировки пользователей)
 from sqlalchemy.orm import Session  # Импорт сессии SQLAlchemy для работы с базой данных
 from pydantic import BaseModel  # Импорт базового класса для создания моделей данных с валидацией
-import requests  # Импорт библиотеки для HTTP-запросов
-from ml.ai_analyzer import analyze_task_with_commands, analyze_task, YandexRateLimitError, YandexAPIError  # Импорт функций анализа задач и исключений AI-сервиса
+from ml.provider import analyze_task_with_commands, analyze_task  # Импорт функций анализа задач (анализатор загружается лениво при первом вызове)
+from ml.errors import YandexRateLimitError, YandexAPIError, http_errors  # Импорт исключений AI-сервиса (HTTP-ошибки requests - без импорта requests при старте)
+from ml.moderation import moderate  # Импорт локальной модерации (скомпилированный список запрещенных терминов)
 from db import get_db  # Импорт функции для получения сессии базы данных
 from database import User, Task, TaskStatus, Tag, TaskTag, Competition  # Импорт моделей базы данных: пользователь, задача, статус, тег, связь задачи с тегом, соревнование
 from schemas import TaskResponse  # Импорт схемы ответа для задачи
 from dependencies import get_current_user  # Импорт функции для получения текущего авторизованного пользователя
+from timing import span  # Импорт спанов для замера этапов обработки (Server-Timing и JSON-лог)
+from reference_cache import reference_data, competition_by_id, status_by_code, tag_id_by_name, notify_reference_changed  # Импорт кэша справочников (статусы, теги и соревнования в памяти воркера)
 
 router = APIRouter()  # Создание роутера для группировки эндпоинтов
 
@@ -22,6 +26,29 @@ class ChatResponse(BaseModel):  # Определение модели данны
     reply: str  # Текст ответа от AI или системы
     task_created: TaskResponse | None = None  # Опциональный объект созданной задачи (если задача была создана)
 
+def validate_task_text(title: str, description: str) -> Optional[str]:
+    """
+    Проверяет название и описание задачи, созданной через чат.
+    Возвращает текст причины отказа или None, если задачу можно создавать.
+    """
+    normalized_title = re.sub(r"\s+", " ", title.lower())  # Нормализация названия: приведение к нижнему регистру и замена множественных пробелов одним
+    normalized_desc = re.sub(r"\s+", " ", description.lower())  # Нормализация описания: приведение к нижнему регистру и замена множественных пробелов одним
+
+    rejection = moderate(title, description)  # Проверка названия и описания по списку запрещенных терминов (ml/moderation_terms.txt)
+    if rejection:  # Если найден запрещенный термин
+        return rejection  # Возврат ответа для категории термина
+
+    if not description:  # Проверка наличия описания задачи (не пустое ли оно)
+        return ("Описание задачи отсутствует или получилось пустым. "
+                "Пожалуйста, добавьте краткое, понятное описание: что именно нужно сделать и к какому результату прийти.")
+
+    if normalized_desc == normalized_title and len(normalized_desc.split()) <= 3:  # Проверка, что описание не отличается от названия и содержит не более 3 слов
+        return ("Описание задачи слишком короткое и повторяет заголовок. "
+                "Пожалуйста, уточните, что именно нужно сделать, где и к какому результату прийти.")
+
+    return None
+
+
 @router.post("/api/chat", response_model=ChatResponse)  # Регистрация POST-эндпоинта /api/chat с указанием модели ответа
 @router.post("/chat", response_model=ChatResponse)  # Регистрация альтернативного POST-эндпоинта /chat с указанием модели ответа
 def chat_with_ai(  # Определение функции обработки запроса на создание задачи через чат
@@ -33,15 +60,23 @@ def chat_with_ai(  # Определение функции обработки з
     Принимает естественный язык и создаёт задачу.
     Пример: "Создай задачу 'Купить фрукты' на 12.12.2025, статус В работе, тег срочно"
     """
-    statuses = [{"code": s.code, "name": s.name} for s in db.query(TaskStatus).all()]  # Получение всех статусов задач из БД и преобразование в список словарей с кодом и названием
-    tags = [t.name for t in db.query(Tag).all()]  # Получение всех тегов из БД и преобразование в список названий
+    with span("moderation"):  # Замер этапа: локальная модерация сообщения до вызова AI
+        rejection = moderate(chat.message)  # Проверка исходного сообщения по списку запрещенных терминов
+    if rejection:  # Если сообщение содержит запрещенный термин
+        return ChatResponse(reply=rejection)  # Отказ без обращения к AI (не тратит время и квоту Yandex)
+
+    with span("lookup"):  # Замер этапа: загрузка справочников статусов и тегов
+        refs = reference_data(db)  # Снимок справочников из кэша воркера (без запросов к БД, пока кэш актуален)
+        statuses = [{"code": s["code"], "name": s["name"]} for s in refs.statuses]  # Список статусов задач в виде словарей с кодом и названием
+        tags = [t["name"] for t in refs.tags]  # Список названий тегов
 
     try:  # Начало блока обработки исключений при обращении к AI
-        ai_response = analyze_task_with_commands(  # Вызов функции анализа задачи с командами, которая парсит естественный язык
-            user_message=chat.message,  # Передача текста сообщения пользователя
-            available_statuses=statuses,  # Передача списка доступных статусов задач
-            available_tags=tags  # Передача списка доступных тегов
-        )
+        with span("llm_parse"):  # Замер этапа: разбор сообщения языковой моделью
+            ai_response = analyze_task_with_commands(  # Вызов функции анализа задачи с командами, которая парсит естественный язык
+                user_message=chat.message,  # Передача текста сообщения пользователя
+                available_statuses=statuses,  # Передача списка доступных статусов задач
+                available_tags=tags  # Передача списка доступных тегов
+            )
     except YandexRateLimitError as e:  # Обработка исключения превышения лимита запросов к Yandex API
         # Специальная обработка ошибки rate limit - пробрасываем HTTP 429
         # Это позволит тестам фиксировать ошибку
@@ -55,7 +90,7 @@ def chat_with_ai(  # Определение функции обработки з
             status_code=503,  # Установка HTTP-кода статуса 503
             detail=f"Ошибка при обращении к AI сервису: {str(e)}"  # Сообщение об ошибке с деталями исключения
         )
-    except requests.exceptions.HTTPError as e:  # Обработка HTTP-ошибок из библиотеки requests (на случай если они не были перехвачены)
+    except http_errors() as e:  # Обработка HTTP-ошибок из библиотеки requests (на случай если они не были перехвачены); requests загружается лениво вместе с анализатором
         # Обработка других HTTP ошибок (на случай если они не были перехвачены)
         if e.response.status_code == 429:  # Проверка, является ли ошибка превышением лимита запросов
             raise HTTPException(  # Выброс HTTP-исключения с кодом 429
@@ -85,17 +120,19 @@ def chat_with_ai(  # Определение функции обработки з
     if not title:  # Проверка, что название задачи не пустое
         return ChatResponse(reply="Не удалось определить название задачи.")  # Возврат ошибки, если название не определено
 
-    status_code = str(task_data.get("status_code", "todo")).strip()  # Получение кода статуса задачи (по умолчанию "todo"), преобразование в строку и удаление пробелов
-    status_obj = db.query(TaskStatus).filter(TaskStatus.code == status_code).first()  # Поиск объекта статуса в БД по коду
-    if not status_obj:  # Проверка, найден ли статус в БД
-        fallback_status = db.query(TaskStatus).first()  # Получение первого доступного статуса из БД как запасной вариант
-        if fallback_status:  # Проверка, есть ли хотя бы один статус в БД
-            status_obj = fallback_status  # Использование первого найденного статуса
-        else:  # Если в БД нет ни одного статуса
-            status_obj = TaskStatus(code="todo", name="К выполнению")  # Создание нового статуса по умолчанию
-            db.add(status_obj)  # Добавление статуса в сессию БД
-            db.commit()  # Сохранение изменений в БД
-            db.refresh(status_obj)  # Обновление объекта статуса из БД (получение ID)
+    with span("lookup"):  # Замер этапа: поиск статуса задачи по коду
+        status_code = str(task_data.get("status_code", "todo")).strip()  # Получение кода статуса задачи (по умолчанию "todo"), преобразование в строку и удаление пробелов
+        status_obj = status_by_code(db, status_code)  # Поиск статуса в кэше справочников по коду (при промахе кэш перечитывается)
+        if not status_obj:  # Проверка, найден ли статус
+            if refs.statuses:  # Проверка, есть ли хотя бы один статус
+                status_obj = refs.statuses[0]  # Использование первого статуса как запасного варианта
+            else:  # Если в БД нет ни одного статуса
+                new_status = TaskStatus(code="todo", name="К выполнению")  # Создание нового статуса по умолчанию
+                db.add(new_status)  # Добавление статуса в сессию БД
+                notify_reference_changed(db)  # Уведомление воркеров об изменении справочников
+                db.commit()  # Сохранение изменений в БД
+                db.refresh(new_status)  # Обновление объекта статуса из БД (получение ID)
+                status_obj = {"id": new_status.id, "code": new_status.code, "name": new_status.name}  # Статус в том же виде, что и в кэше
 
     due_date = task_data.get("due_date")  # Получение даты выполнения задачи из данных команды
     
@@ -121,42 +158,11 @@ def chat_with_ai(  # Определение функции обработки з
             ).strip()  # Удаление лишних пробелов в начале и конце строки
         )
 
-    description = str(task_data.get("description", "")).strip()  # Получение описания задачи, преобразование в строку и удаление пробелов по краям
-
-    normalized_title = re.sub(r"\s+", " ", title.lower())  # Нормализация названия: приведение к нижнему регистру и замена множественных пробелов одним
-    normalized_desc = re.sub(r"\s+", " ", description.lower())  # Нормализация описания: приведение к нижнему регистру и замена множественных пробелов одним
-
-    banned_fragments = [  # Определение списка запрещенных фрагментов текста
-        "покур", "раскур", "курить", "курев", "сигарет", "кальян",  # Слова, связанные с курением
-    ]
-    if any(frag in normalized_title or frag in normalized_desc for frag in banned_fragments):  # Проверка наличия запрещенных фрагментов в названии или описании
-        return ChatResponse(  # Возврат ответа с ошибкой, если найдены запрещенные слова
-            reply=(
-                ai_response.get("reply", "")  # Получение ответа от AI
-                + " Я не могу создавать задачи, связанные с курением или подобными действиями. "  # Добавление сообщения о запрете
-                  "Пожалуйста, переформулируйте запрос в безопасном и рабочем контексте."  # Добавление инструкции по переформулировке
-            ).strip()  # Удаление лишних пробелов
-        )
-
-    if not description:  # Проверка наличия описания задачи (не пустое ли оно)
-        return ChatResponse(  # Возврат ответа с ошибкой, если описание отсутствует
-            reply=(
-                ai_response.get("reply", "")  # Получение ответа от AI
-                + " Описание задачи отсутствует или получилось пустым. "  # Добавление сообщения об отсутствии описания
-                  "Пожалуйста, добавьте краткое, понятное описание: что именно нужно сделать и к какому результату прийти."  # Добавление инструкции по заполнению описания
-            ).strip()  # Удаление лишних пробелов
-        )
-    
-    
-
-    if normalized_desc == normalized_title and len(normalized_desc.split()) <= 3:  # Проверка, что описание не отличается от названия и содержит не более 3 слов
-        return ChatResponse(  # Возврат ответа с ошибкой, если описание слишком короткое и повторяет заголовок
-            reply=(
-                ai_response.get("reply", "")  # Получение ответа от AI
-                + " Описание задачи слишком короткое и повторяет заголовок. "  # Добавление сообщения о недостаточности описания
-                  "Пожалуйста, уточните, что именно нужно сделать, где и к какому результату прийти."  # Добавление инструкции по уточнению описания
-            ).strip()  # Удаление лишних пробелов
-        )
+    with span("validate"):  # Замер этапа: нормализация текста и проверки описания
+        description = str(task_data.get("description", "")).strip()  # Получение описания задачи, преобразование в строку и удаление пробелов по краям
+        rejection = validate_task_text(title, description)  # Проверка названия и описания (запрещенные темы, пустое или повторяющее заголовок описание)
+        if rejection:  # Если проверка не пройдена
+            return ChatResponse(reply=(ai_response.get("reply", "") + " " + rejection).strip())  # Возврат ответа AI с причиной отказа
 
     # Используем estimated_points из первого AI запроса, чтобы избежать дублирования вызовов
     estimated_points = task_data.get("estimated_points", 50)  # Получение оценки сложности задачи из данных команды (по умолчанию 50 баллов)
@@ -165,7 +171,8 @@ def chat_with_ai(  # Определение функции обработки з
     # Это может произойти только если analyze_task_with_commands не смог определить сложность
     if estimated_points == 50 and "estimated_points" not in task_data:  # Проверка, что оценка не была установлена (значение по умолчанию и отсутствие в данных)
         try:  # Начало блока обработки исключений при анализе задачи
-            ai_analysis = analyze_task(title, description)  # Вызов функции анализа задачи для определения сложности и оценки
+            with span("llm_estimate"):  # Замер этапа: повторная оценка сложности языковой моделью
+                ai_analysis = analyze_task(title, description)  # Вызов функции анализа задачи для определения сложности и оценки
             # Проверяем, является ли задача бессмысленной
             if ai_analysis.get("estimated_points") is None or ai_analysis.get("is_meaningless"):  # Проверка, что задача не бессмысленна и оценка определена
                 return ChatResponse(  # Возврат ответа с ошибкой, если задача бессмысленна
@@ -185,69 +192,78 @@ def chat_with_ai(  # Определение функции обработки з
             "confidence": 0.8  # Уровень уверенности в оценке
         }
 
-    user_ids_to_create = chat.user_ids if chat.user_ids else [current_user["user"].id]  # Определение списка ID пользователей: если указаны в запросе - используем их, иначе - текущий пользователь
+    user_ids_to_create = list(dict.fromkeys(chat.user_ids)) if chat.user_ids else [current_user["user"].id]  # Определение списка ID пользователей без повторов (в порядке запроса): если указаны в запросе - используем их, иначе - текущий пользователь
     
-    users = db.query(User).filter(User.id.in_(user_ids_to_create)).all()  # Получение всех пользователей из БД по списку ID
-    if len(users) != len(user_ids_to_create):  # Проверка, что все указанные пользователи найдены в БД
-        return ChatResponse(reply="Один или несколько указанных пользователей не найдены.")  # Возврат ошибки, если не все пользователи найдены
+    with span("competition_check"):  # Замер этапа: проверка пользователей и периода соревнования
+        groups = (  # Один запрос: количество пользователей по каждому соревнованию (сами объекты пользователей не нужны)
+            db.query(User.cur_comp, func.count(User.id))
+            .filter(User.id.in_(user_ids_to_create))
+            .group_by(User.cur_comp)
+            .all()
+        )
+        if sum(count for _, count in groups) != len(user_ids_to_create):  # Проверка, что все указанные пользователи найдены в БД
+            return ChatResponse(reply="Один или несколько указанных пользователей не найдены.")  # Возврат ошибки, если не все пользователи найдены
 
-    # Проверка, что дата выполнения задачи находится в рамках дедлайна соревнования
-    for user in users:  # Перебираем всех пользователей, для которых создается задача
-        if user.cur_comp is not None:  # Проверяем, участвует ли пользователь в каком-либо соревновании
-            competition = db.query(Competition).filter(Competition.id == user.cur_comp).first()  # Получаем объект соревнования из базы данных по его ID
-            if competition:  # Если соревнование существует в базе данных
-                if due_date < competition.start_date or due_date > competition.end_date:  # Проверяем, что дата выполнения задачи находится в пределах периода соревнования (между началом и концом)
+        # Проверка, что дата выполнения задачи находится в рамках дедлайна соревнования: один раз на соревнование, а не на пользователя
+        for comp_id, _ in groups:  # Перебираем различные соревнования пользователей, для которых создается задача
+            competition = competition_by_id(db, comp_id) if comp_id is not None else None  # Соревнование из кэша, при промахе кэш перечитывается (None - пользователь вне соревнования)
+            if competition:  # Если соревнование существует
+                if due_date < competition["start_date"] or due_date > competition["end_date"]:  # Проверяем, что дата выполнения задачи находится в пределах периода соревнования (между началом и концом)
                     return ChatResponse(  # Возвращаем ответ с ошибкой, если дата выходит за рамки соревнования
                         reply=(
                             ai_response.get("reply", "")  # Берем ответ от AI, если он был сгенерирован
                             + f" Дата выполнения задачи ({due_date.strftime('%d.%m.%Y') if isinstance(due_date, datetime) else str(due_date)}) выходит за рамки "  # Форматируем дату задачи в читаемый формат (проверяя тип) и добавляем к сообщению
-                              f"соревнования «{competition.title}» (с {competition.start_date.strftime('%d.%m.%Y')} "  # Добавляем название соревнования и дату начала в читаемом формате
-                              f"по {competition.end_date.strftime('%d.%m.%Y')}). "  # Добавляем дату окончания соревнования в читаемом формате
+                              f"соревнования «{competition['title']}» (с {competition['start_date'].strftime('%d.%m.%Y')} "  # Добавляем название соревнования и дату начала в читаемом формате
+                              f"по {competition['end_date'].strftime('%d.%m.%Y')}). "  # Добавляем дату окончания соревнования в читаемом формате
                               "Пожалуйста, укажите дату в пределах периода соревнования."  # Добавляем инструкцию для пользователя
                         ).strip()  # Убираем лишние пробелы в начале и конце строки
                     )
 
-    created_tasks = []  # Инициализация списка созданных задач
-    attached_tags = []  # Инициализация списка прикрепленных тегов
+    with span("insert"):  # Замер этапа: создание задач и тегов, коммит и обновление объектов
+        created_tasks = []  # Инициализация списка созданных задач
+        attached_tags = []  # Инициализация списка прикрепленных тегов
+        created_tag_ids = {}  # Теги, созданные в этом запросе (кэш обновится только после commit)
     
-    for user_id in user_ids_to_create:  # Перебор всех пользователей, для которых создается задача
-        new_task = Task(  # Создание нового объекта задачи
-            user_id=user_id,  # Установка ID пользователя-владельца задачи
-            status_id=status_obj.id,  # Установка ID статуса задачи
-            title=title,  # Установка названия задачи
-            description=description,  # Установка описания задачи
-            estimated_points=estimated_points,  # Установка оценки сложности задачи
-            ai_analysis_metadata=ai_analysis,  # Установка метаданных анализа AI
-            due_date=due_date,  # Установка даты выполнения задачи
-            awarded_points=0  # Установка начисленных баллов (по умолчанию 0)
-        )
-        db.add(new_task)  # Добавление задачи в сессию БД
-        db.flush()  # Принудительная отправка SQL-запроса в БД для получения ID задачи (без коммита)
+        for user_id in user_ids_to_create:  # Перебор всех пользователей, для которых создается задача
+            new_task = Task(  # Создание нового объекта задачи
+                user_id=user_id,  # Установка ID пользователя-владельца задачи
+                status_id=status_obj["id"],  # Установка ID статуса задачи
+                title=title,  # Установка названия задачи
+                description=description,  # Установка описания задачи
+                estimated_points=estimated_points,  # Установка оценки сложности задачи
+                ai_analysis_metadata=ai_analysis,  # Установка метаданных анализа AI
+                due_date=due_date,  # Установка даты выполнения задачи
+                awarded_points=0  # Установка начисленных баллов (по умолчанию 0)
+            )
+            db.add(new_task)  # Добавление задачи в сессию БД
+            db.flush()  # Принудительная отправка SQL-запроса в БД для получения ID задачи (без коммита)
         
-        for tag_name in task_data.get("tags", []):  # Перебор всех тегов из данных команды
-            if not isinstance(tag_name, str) or not tag_name.strip():  # Проверка, что тег - непустая строка
-                continue  # Пропуск некорректных тегов
-            tag_name = tag_name.strip()  # Удаление пробелов по краям названия тега
-            tag = db.query(Tag).filter(Tag.name == tag_name).first()  # Поиск тега в БД по названию
-            if not tag:  # Проверка, существует ли тег в БД
-                tag = Tag(name=tag_name)  # Создание нового тега, если его нет
-                db.add(tag)  # Добавление тега в сессию БД
-                db.flush()  # Принудительная отправка SQL-запроса для получения ID тега
-            existing = db.query(TaskTag).filter(  # Поиск существующей связи задачи с тегом
-                TaskTag.task_id == new_task.id,  # Фильтр по ID задачи
-                TaskTag.tag_id == tag.id  # Фильтр по ID тега
-            ).first()
-            if not existing:  # Проверка, что связь еще не существует
-                db.add(TaskTag(task_id=new_task.id, tag_id=tag.id))  # Создание связи задачи с тегом
-                if tag_name not in attached_tags:  # Проверка, что тег еще не добавлен в список
-                    attached_tags.append(tag_name)  # Добавление названия тега в список для отчета
+            for tag_name in task_data.get("tags", []):  # Перебор всех тегов из данных команды
+                if not isinstance(tag_name, str) or not tag_name.strip():  # Проверка, что тег - непустая строка
+                    continue  # Пропуск некорректных тегов
+                tag_name = tag_name.strip()  # Удаление пробелов по краям названия тега
+                tag_id = created_tag_ids.get(tag_name) or tag_id_by_name(db, tag_name)  # Поиск тега среди созданных в этом запросе и в кэше справочников (при промахе кэш перечитывается)
+                if not tag_id:  # Проверка, существует ли тег
+                    tag = Tag(name=tag_name)  # Создание нового тега, если его нет
+                    db.add(tag)  # Добавление тега в сессию БД
+                    db.flush()  # Принудительная отправка SQL-запроса для получения ID тега
+                    notify_reference_changed(db)  # Уведомление воркеров об изменении справочников
+                    tag_id = created_tag_ids[tag_name] = tag.id  # Запоминаем ID созданного тега
+                existing = db.query(TaskTag).filter(  # Поиск существующей связи задачи с тегом
+                    TaskTag.task_id == new_task.id,  # Фильтр по ID задачи
+                    TaskTag.tag_id == tag_id  # Фильтр по ID тега
+                ).first()
+                if not existing:  # Проверка, что связь еще не существует
+                    db.add(TaskTag(task_id=new_task.id, tag_id=tag_id))  # Создание связи задачи с тегом
+                    if tag_name not in attached_tags:  # Проверка, что тег еще не добавлен в список
+                        attached_tags.append(tag_name)  # Добавление названия тега в список для отчета
         
-        created_tasks.append(new_task)  # Добавление созданной задачи в список
+            created_tasks.append(new_task)  # Добавление созданной задачи в список
 
-    db.commit()  # Сохранение всех изменений в БД (задачи, теги, связи)
+        db.commit()  # Сохранение всех изменений в БД (задачи, теги, связи)
     
-    for task in created_tasks:  # Перебор всех созданных задач
-        db.refresh(task)  # Обновление объектов задач из БД (получение актуальных данных, включая ID)
+        for task in created_tasks:  # Перебор всех созданных задач
+            db.refresh(task)  # Обновление объектов задач из БД (получение актуальных данных, включая ID)
 
     reply = f" Задача «{title}» создана"  # Начало формирования ответа с названием задачи
     if len(created_tasks) > 1:  # Проверка, создана ли задача для нескольких пользователей
@@ -256,7 +272,7 @@ def chat_with_ai(  # Определение функции обработки з
         reply += f" Срок: {due_date}."  # Добавление информации о сроке выполнения
     if attached_tags:  # Проверка наличия прикрепленных тегов
         reply += f" Теги: {', '.join(attached_tags)}."  # Добавление списка тегов через запятую
-    reply += f" Статус: {status_obj.name}."  # Добавление информации о статусе задачи
+    reply += f" Статус: {status_obj['name']}."  # Добавление информации о статусе задачи
 
     first_task = created_tasks[0] if created_tasks else None  # Получение первой созданной задачи (или None, если задач нет)
 
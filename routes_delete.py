@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from db import get_db
 from database import User, TaskStatus, Tag, Task, TaskTag, RewardType, Reward, Competition
 from dependencies import get_current_user, require_admin, require_manager
+from ledger import revoke_reward, notify_points_changed
+from reference_cache import notify_reference_changed, notify_competitions_changed
 
 router = APIRouter(prefix="", tags=["DELETE"])
 
@@ -51,6 +53,7 @@ def delete_user_by_admin(
 
     db.query(Task).filter(Task.user_id == user_id).delete()
 
+    notify_points_changed(db, user.cur_comp)
     db.delete(user)
     db.commit()
     return
@@ -86,6 +89,7 @@ def delete_task_status(
         raise HTTPException(status_code=404, detail="TaskStatus не найден")
 
     db.delete(status_obj)
+    notify_reference_changed(db)
     db.commit()
     return
 
@@ -120,6 +124,7 @@ def delete_tag(
     db.query(TaskTag).filter(TaskTag.tag_id == tag_id).delete()
 
     db.delete(tag)
+    notify_reference_changed(db)
     db.commit()
     return
 
@@ -165,11 +170,12 @@ def delete_reward(
     reward = db.query(Reward).filter(
         Reward.id == reward_id,
         Reward.user_id == current_user["user"].id
-    ).first()
+    ).with_for_update().first()
     if not reward:
         raise HTTPException(status_code=404, detail="Reward не найден или не принадлежит вам")
 
-    db.delete(reward)
+    # Удаление награды списывает её баллы в той же транзакции
+    revoke_reward(db, reward)
     db.commit()
     return
 
@@ -186,5 +192,6 @@ def delete_competition(
     db.query(User).filter(User.cur_comp == competition_id).update({User.cur_comp: None})
 
     db.delete(competition)
+    notify_competitions_changed(db)
     db.commit()
     return
\ No newline at end of file
@@ -1,23 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 
 from schemas import TaskTitleAndDate, UserLeaderboard
-from db import get_db
+from db import get_read_db
 from database import User, TaskStatus, Tag, Task, RewardType, Reward, Competition
+from reference_cache import competitions, competition_by_id
 from schemas import (
     UserResponse, TaskStatusResponse,
     TagResponse, TaskResponse, RewardTypeResponse, RewardResponse,
-    CompetitionResponse, CompetitionDatesResponse
+    CompetitionResponse, CompetitionDatesResponse, LeaderboardHistoryResponse
 )
 from dependencies import get_current_user, require_admin, require_manager
+from serialization import columns_for, rows_response
+from leaderboard_stream import broadcaster, competition_exists
+from leaderboard_history import HISTORY_BUCKETS, MAX_HISTORY_BUCKETS, rank_history
+from search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_tasks, search_users
 
 router = APIRouter()
 
+# Колонки списков в порядке полей схем ответа (строки отдаются без ORM-объектов и повторной валидации)
+USER_COLUMNS = columns_for(User, UserResponse, total_points=0)
+TASK_COLUMNS = columns_for(Task, TaskResponse, estimated_points=0, awarded_points=0)
+REWARD_COLUMNS = columns_for(Reward, RewardResponse)
+
 @router.get("/tasks/latest", response_model=list[TaskTitleAndDate])
 def get_tasks(
         current_user: dict = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     tasks = db.query(Task.title, Task.due_date).filter(
         Task.user_id == current_user["user"].id
@@ -28,31 +41,40 @@ def get_tasks(
 @router.get("/users", response_model=List[UserResponse])
 def get_all_users(
     current_user: dict = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    users = db.query(User).all()
-    return users
+    return rows_response(db.query(*USER_COLUMNS))
 
 @router.get("/competitions/{competition_id}/dates", response_model=CompetitionDatesResponse)
 def get_competition_dates(
     competition_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    competition = db.query(Competition).filter(Competition.id == competition_id).first()
+    competition = competition_by_id(db, competition_id)
     if not competition:
         raise HTTPException(status_code=404, detail="Соревнование не найдено")
 
-    return CompetitionDatesResponse(start_date=competition.start_date, end_date=competition.end_date)
+    return CompetitionDatesResponse(start_date=competition["start_date"], end_date=competition["end_date"])
 
 
 @router.get("/users/only", response_model=List[UserResponse])
 def get_all_users(
     current_user: dict = Depends(require_manager),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
+):
+    return rows_response(db.query(*USER_COLUMNS).filter(User.role == "user"))
+
+@router.get("/users/search", response_model=List[UserResponse])
+def find_users(
+    q: str = Query(..., min_length=2, max_length=200),
+    role: Optional[str] = None,
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(require_manager),
+    db: Session = Depends(get_read_db)
 ):
-    users = db.query(User).filter(User.role == "user").all()
-    return users
+    return rows_response(search_users(db, USER_COLUMNS, q.strip(), limit, offset, role))
 
 @router.get("/users/me", response_model=UserResponse)
 def read_own_info(current_user: dict = Depends(get_current_user)):
@@ -70,7 +92,7 @@ def read_own_info(current_user: dict = Depends(get_current_user)):
 #     return db.query(Board).filter(Board.user_id == current_user["user"].id).all()
 
 @router.get("/task-statuses", response_model=List[TaskStatusResponse])
-def get_task_statuses(db: Session = Depends(get_db)):
+def get_task_statuses(db: Session = Depends(get_read_db)):
     return db.query(TaskStatus).all()
 
 # @router.get("/categories", response_model=List[CategoryResponse])
@@ -78,38 +100,47 @@ def get_task_statuses(db: Session = Depends(get_db)):
 #     return db.query(Category).filter(Category.user_id == current_user["user"].id).all()
 
 @router.get("/tags", response_model=List[TagResponse])
-def get_tags(db: Session = Depends(get_db)):
+def get_tags(db: Session = Depends(get_read_db)):
     return db.query(Tag).all()
 
 @router.get("/tasks", response_model=List[TaskResponse])
-def get_tasks(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Task).filter(Task.user_id == current_user["user"].id).all()
+def get_tasks(current_user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return rows_response(db.query(*TASK_COLUMNS).filter(Task.user_id == current_user["user"].id))
+
+@router.get("/tasks/search", response_model=List[TaskResponse])
+def find_tasks(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    return rows_response(search_tasks(db, TASK_COLUMNS, current_user["user"].id, q.strip(), limit, offset))
 
 @router.get("/reward-types", response_model=List[RewardTypeResponse])
-def get_reward_types(db: Session = Depends(get_db)):
+def get_reward_types(db: Session = Depends(get_read_db)):
     return db.query(RewardType).all()
 
 @router.get("/rewards", response_model=List[RewardResponse])
-def get_rewards(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Reward).filter(Reward.user_id == current_user["user"].id).all()
+def get_rewards(current_user: dict = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return rows_response(db.query(*REWARD_COLUMNS).filter(Reward.user_id == current_user["user"].id))
 
 # Получение списка всех соревнований
 @router.get("/competitions", response_model=List[CompetitionResponse])
 def get_competitions(
     current_user: dict = Depends(require_manager),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    competitions = db.query(Competition).all()
-    return competitions
+    return competitions(db).competitions
 
 # Получение конкретного соревнования по ID
 @router.get("/competitions/{competition_id}", response_model=CompetitionResponse)
 def get_competition(
     competition_id: int,
     current_user: dict = Depends(get_current_user), # Только админ может получить конкретное
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    competition = db.query(Competition).filter(Competition.id == competition_id).first()
+    competition = competition_by_id(db, competition_id)
     if not competition:
         raise HTTPException(status_code=404, detail="Соревнование не найдено")
     return competition
@@ -119,20 +150,62 @@ def get_competition(
 def get_leaderboard(
     competition_id: int,
     #current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    comp = db.query(Competition).filter(Competition.id == competition_id).first()
+    comp = competition_by_id(db, competition_id)
     if not comp:
         raise HTTPException(status_code=404, detail="Соревнование не найдено")
 
     users = (
-        db.query(User.first_name, User.last_name, User.total_points)
+        db.query(*columns_for(User, UserLeaderboard, total_points=0))
         .filter(User.cur_comp == competition_id)
         .order_by(User.total_points.desc())
-        .all()
     )
-    leaderboard = [
-        UserLeaderboard(first_name=u.first_name, last_name=u.last_name, total_points=u.total_points)
-        for u in users
-    ]
-    return leaderboard
+    return rows_response(users)
+
+def _naive_utc(value: datetime) -> datetime:
+    """Время со смещением переводится в UTC, без смещения считается уже UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.replace(tzinfo=None)
+
+# История мест участников по снимкам лидерборда (from/to - UTC или со смещением, bucket - 5m, 15m, 1h или 1d)
+@router.get("/leaderboard/{competition_id}/history", response_model=LeaderboardHistoryResponse)
+def get_leaderboard_history(
+    competition_id: int,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    bucket: str = "1h",
+    top: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(require_manager),
+    db: Session = Depends(get_read_db)
+):
+    competition = competition_by_id(db, competition_id)
+    if not competition:
+        raise HTTPException(status_code=404, detail="Соревнование не найдено")
+    step = HISTORY_BUCKETS.get(bucket)
+    if not step:
+        raise HTTPException(status_code=400, detail=f"Недопустимый bucket, доступны: {', '.join(HISTORY_BUCKETS)}")
+
+    start = _naive_utc(from_ or competition["start_date"])
+    end = _naive_utc(to or min(datetime.utcnow(), competition["end_date"]))
+    if start > end:
+        raise HTTPException(status_code=400, detail="Начало периода позже его конца")
+    if (end - start) / step > MAX_HISTORY_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много интервалов (больше {MAX_HISTORY_BUCKETS}): увеличьте bucket или сократите период"
+        )
+    return rank_history(db, competition_id, start, end, step, top)
+
+# Лидерборд в реальном времени (SSE): снимок при подключении, затем изменения мест
+@router.get("/leaderboard/{competition_id}/stream")
+async def stream_leaderboard(competition_id: int):
+    if not await run_in_threadpool(competition_exists, competition_id):
+        raise HTTPException(status_code=404, detail="Соревнование не найдено")
+    return StreamingResponse(
+        broadcaster.stream(competition_id),
+        media_type="text/event-stream",
+        # Без буферизации в nginx и кэшей: события должны уходить клиенту сразу
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -4,7 +4,8 @@ from sqlalchemy.exc import IntegrityError
 from passlib.context import CryptContext
 from datetime import datetime
 import re
-from ml.ai_analyzer import analyze_task, YandexRateLimitError, YandexAPIError
+from ml.provider import analyze_task
+from ml.errors import YandexRateLimitError, YandexAPIError
 
 from db import get_db
 from database import (
@@ -14,7 +15,7 @@ from schemas import (
     UserCreate, UserResponse, Token, UserLogin,
     TaskStatusCreate, TaskStatusResponse,
     TagCreate, TagResponse,
-    TaskCreate, TaskResponse,
+    TaskCreate, TaskResponse, TaskCompleteResponse,
     RewardTypeCreate, RewardTypeResponse,
     RewardCreate, RewardResponse,
     TaskTagCreate, CompetitionCreate,
@@ -22,6 +23,11 @@ from schemas import (
 )
 from auth import verify_password, get_password_hash, create_access_token
 from dependencies import get_current_user, require_admin, require_manager
+from timing import span
+from ledger import award_points
+from reference_cache import (
+    competition_by_id, status_by_id, status_by_code, tag_by_id, notify_reference_changed, notify_competitions_changed
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -126,6 +132,7 @@ def create_task_status(
         raise HTTPException(status_code=400, detail="TaskStatus с таким code уже существует")
     db_status = TaskStatus(code=status_data.code, name=status_data.name)
     db.add(db_status)
+    notify_reference_changed(db)
     db.commit()
     db.refresh(db_status)
     return db_status
@@ -155,6 +162,7 @@ def create_tag(
         raise HTTPException(status_code=400, detail="Tag с таким именем уже существует")
     db_tag = Tag(name=tag.name)
     db.add(db_tag)
+    notify_reference_changed(db)
     db.commit()
     db.refresh(db_tag)
     return db_tag
@@ -175,11 +183,13 @@ def create_task(
     # if not category:
     #     raise HTTPException(status_code=404, detail="Category не найдена или не принадлежит пользователю")
 
-    if not db.query(TaskStatus).filter(TaskStatus.id == task.status_id).first():
-        raise HTTPException(status_code=404, detail="TaskStatus не найден")
+    with span("lookup"):
+        if not status_by_id(db, task.status_id):
+            raise HTTPException(status_code=404, detail="TaskStatus не найден")
 
     try:
-        ai_result = analyze_task(task.title, task.description or "")
+        with span("llm_estimate"):
+            ai_result = analyze_task(task.title, task.description or "")
     except YandexRateLimitError as e:
         # Пробрасываем ошибку rate limit, чтобы тесты могли её зафиксировать
         raise HTTPException(
@@ -215,9 +225,10 @@ def create_task(
         due_date=task.due_date,
         awarded_points=0
     )
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    with span("insert"):
+        db.add(db_task)
+        db.commit()
+        db.refresh(db_task)
     return db_task
 
 @router.post("/tasks/{user_id}", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
@@ -231,11 +242,13 @@ def create_task(
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    if not db.query(TaskStatus).filter(TaskStatus.id == task.status_id).first():
-        raise HTTPException(status_code=404, detail="TaskStatus не найден")
+    with span("lookup"):
+        if not status_by_id(db, task.status_id):
+            raise HTTPException(status_code=404, detail="TaskStatus не найден")
 
     try:
-        ai_result = analyze_task(task.title, task.description or "")
+        with span("llm_estimate"):
+            ai_result = analyze_task(task.title, task.description or "")
     except YandexRateLimitError as e:
         # Пробрасываем ошибку rate limit, чтобы тесты могли её зафиксировать
         raise HTTPException(
@@ -270,9 +283,10 @@ def create_task(
         due_date=task.due_date,
         awarded_points=0
     )
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    with span("insert"):
+        db.add(db_task)
+        db.commit()
+        db.refresh(db_task)
     return db_task
 
 
@@ -286,7 +300,7 @@ def create_task_tag(
     if not task:
         raise HTTPException(status_code=404, detail="Task не найдена или не принадлежит пользователю")
 
-    if not db.query(Tag).filter(Tag.id == task_tag.tag_id).first():
+    if not tag_by_id(db, task_tag.tag_id):
         raise HTTPException(status_code=404, detail="Tag не найден")
 
     existing = db.query(TaskTag).filter(
@@ -355,21 +369,72 @@ def create_reward(
                 # Если не удалось извлечь task_id или произошла ошибка, продолжаем как обычно
                 pass
 
-    db_reward = Reward(
-        user_id=current_user["user"].id,
-        type_id=reward.type_id,
-        points_amount=points_to_award,
-        reason=reward.reason
-    )
-    db.add(db_reward)
+    # Награда и начисление баллов - одна транзакция с инкрементом на стороне БД (см. ledger.py)
+    db_reward, _ = award_points(db, current_user["user"].id, reward.type_id, points_to_award, reward.reason)
     db.commit()
     db.refresh(db_reward)
 
-    current_user["user"].total_points += points_to_award
-    db.commit()
-
     return db_reward
 
+@router.post("/tasks/{task_id}/complete", response_model=TaskCompleteResponse)
+def complete_task(
+    task_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Завершает задачу и начисляет баллы за один запрос: статус "done", completed_at,
+    awarded_points и запись в журнале баллов коммитятся одной транзакцией.
+    После дедлайна задача завершается без начисления баллов.
+    """
+    user = current_user["user"]
+    # Блокируем задачу: повторное нажатие не должно начислить баллы дважды
+    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user.id).with_for_update().first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task не найдена или не принадлежит вам")
+
+    done_status = status_by_code(db, "done")
+    if not done_status:
+        raise HTTPException(status_code=400, detail='Статус "Выполнено" не найден')
+    if task.status_id == done_status["id"]:
+        raise HTTPException(status_code=409, detail="Задача уже выполнена")
+
+    now = datetime.utcnow()
+    if user.cur_comp:
+        competition = competition_by_id(db, user.cur_comp)
+        if competition:
+            start_date = competition["start_date"].replace(tzinfo=None)
+            end_date = competition["end_date"].replace(tzinfo=None)
+            if now < start_date:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Нельзя пометить задачу выполненной до начала соревнования. Соревнование начинается {start_date.strftime('%d.%m.%Y %H:%M')}"
+                )
+            if now > end_date:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Соревнование завершилось {end_date.strftime('%d.%m.%Y %H:%M')}, задачи больше не принимаются"
+                )
+
+    # Просроченная задача засчитывается без баллов
+    due_date = task.due_date.replace(tzinfo=None) if task.due_date else None
+    points = 0 if due_date and now > due_date else task.estimated_points or 0
+
+    task.status_id = done_status["id"]
+    task.completed_at = now
+    task.awarded_points = points
+
+    total_points = user.total_points or 0
+    if points > 0:
+        reward_type = db.query(RewardType).order_by(RewardType.id).first()
+        if not reward_type:
+            raise HTTPException(status_code=400, detail="Не найден тип награды для начисления баллов")
+        _, total_points = award_points(db, user.id, reward_type.id, points, f"Выполнена задача (ID: {task.id})")
+
+    db.commit()
+    db.refresh(task)
+    return {"task": task, "awarded_points": points, "total_points": total_points}
+
 @router.post("/competitions", response_model=CompetitionResponse, status_code=status.HTTP_201_CREATED)
 def create_competition(
     competition: CompetitionCreate,
@@ -393,6 +458,7 @@ def create_competition(
 
     db_competition = Competition(**competition_data)
     db.add(db_competition)
+    notify_competitions_changed(db)
     db.commit()
     db.refresh(db_competition)
     return db_competition
@@ -15,6 +15,9 @@ from schemas import (
 )
 from dependencies import get_current_user, require_admin, require_manager
 from auth import get_password_hash
+from archive import archive_user_tasks
+from ledger import change_reward_points, notify_points_changed
+from reference_cache import competition_by_id, status_by_id, notify_reference_changed, notify_competitions_changed
 
 router = APIRouter(prefix="", tags=["PUT"])
 
@@ -90,21 +93,20 @@ def assign_user_to_competition(
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
+    # Участник уходит из одного лидерборда и появляется в другом
+    notify_points_changed(db, user.cur_comp)
+    if payload.competition_id != user.cur_comp:
+        notify_points_changed(db, payload.competition_id)
+
     if payload.competition_id is not None:
         competition = db.query(Competition).filter(Competition.id == payload.competition_id).first()
         if not competition:
             raise HTTPException(status_code=404, detail="Соревнование не найдено")
         
-        # Удаляем старые задачи пользователя при назначении нового соревнования
+        # При назначении нового соревнования старые задачи пользователя уходят в tasks_archive
         # Проверяем, что это действительно новое соревнование (не то же самое)
         if user.cur_comp != payload.competition_id:
-            # Получаем все задачи пользователя
-            user_tasks = db.query(Task).filter(Task.user_id == user_id).all()
-            
-            # Удаляем связанные TaskTag записи и сами задачи
-            for task in user_tasks:
-                db.query(TaskTag).filter(TaskTag.task_id == task.id).delete()
-                db.delete(task)
+            archive_user_tasks(db, user_id, user.cur_comp)
         
         user.cur_comp = payload.competition_id
         user.total_points = 0
@@ -157,6 +159,7 @@ def update_task_status(
         if value is not None:
             setattr(status_obj, field, value)
 
+    notify_reference_changed(db)
     db.commit()
     db.refresh(status_obj)
     return status_obj
@@ -202,6 +205,7 @@ def update_tag(
         if value is not None:
             setattr(tag, field, value)
 
+    notify_reference_changed(db)
     db.commit()
     db.refresh(tag)
     return tag
@@ -237,19 +241,19 @@ def update_task(
     #         raise HTTPException(status_code=400, detail="Недопустимый category_id")
 
     if update_data.status_id and update_data.status_id != task.status_id:
-        if not db.query(TaskStatus).filter(TaskStatus.id == update_data.status_id).first():
+        new_status = status_by_id(db, update_data.status_id)
+        if not new_status:
             raise HTTPException(status_code=400, detail="Недопустимый status_id")
 
-        new_status = db.query(TaskStatus).filter(TaskStatus.id == update_data.status_id).first()
-        if new_status and new_status.code == "done":
-            # Проверяем есть ли у пользователя соревнование
-            user = db.query(User).filter(User.id == current_user["user"].id).first()
-            if user and user.cur_comp:
-                competition = db.query(Competition).filter(Competition.id == user.cur_comp).first()
+        if new_status["code"] == "done":
+            # Проверяем есть ли у пользователя соревнование (пользователь уже загружен при авторизации)
+            cur_comp = current_user["user"].cur_comp
+            if cur_comp:
+                competition = competition_by_id(db, cur_comp)
                 if competition:
                     now = datetime.utcnow()
                     # Если start_date имеет timezone info, убираем его для сравнения
-                    start_date = competition.start_date
+                    start_date = competition["start_date"]
                     if hasattr(start_date, 'replace') and start_date.tzinfo is not None:
                         start_date = start_date.replace(tzinfo=None)
                     
@@ -297,26 +301,24 @@ def update_reward(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    # Блокируем награду: две одновременные правки не должны считать разницу от одной старой суммы
     reward = db.query(Reward).filter(
         Reward.id == reward_id,
         Reward.user_id == current_user["user"].id
-    ).first()
+    ).with_for_update().first()
     if not reward:
         raise HTTPException(status_code=404, detail="Reward не найден или не принадлежит вам")
 
-    old_points = reward.points_amount
-
     if update_data.type_id and update_data.type_id != reward.type_id:
         if not db.query(RewardType).filter(RewardType.id == update_data.type_id).first():
             raise HTTPException(status_code=400, detail="Недопустимый type_id")
 
     for field, value in update_data.dict(exclude_unset=True).items():
-        if value is not None:
+        if value is not None and field != "points_amount":
             setattr(reward, field, value)
 
-    if update_data.points_amount is not None and update_data.points_amount != old_points:
-        delta = update_data.points_amount - old_points
-        current_user["user"].total_points += delta
+    if update_data.points_amount is not None:
+        change_reward_points(db, reward, update_data.points_amount)
 
     db.commit()
     db.refresh(reward)
@@ -348,6 +350,7 @@ def update_competition(
     for field, value in update_data.items():
         setattr(competition, field, value)
 
+    notify_competitions_changed(db)
     db.commit()
     db.refresh(competition)
 
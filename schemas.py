@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from typing import Optional, List
 
@@ -24,6 +24,26 @@ class UserLeaderboard(BaseModel):
     last_name: str
     total_points: int
 
+class LeaderboardHistoryUser(BaseModel):
+    user_id: int
+    first_name: str
+    last_name: str
+
+class LeaderboardHistoryEntry(BaseModel):
+    user_id: int
+    rank: int
+    total_points: int
+
+class LeaderboardHistoryPoint(BaseModel):
+    bucket: datetime
+    taken_at: datetime
+    standings: List[LeaderboardHistoryEntry]
+
+class LeaderboardHistoryResponse(BaseModel):
+    competition_id: int
+    users: List[LeaderboardHistoryUser]
+    series: List[LeaderboardHistoryPoint]
+
 class AllUsersResponse(BaseModel):
     users: List[UserLeaderboard]
 
@@ -93,13 +113,18 @@ class TaskResponse(BaseModel):
     title: str
     description: Optional[str]
     ai_analysis_metadata: Optional[dict]
-    estimated_points: int
-    awarded_points: int
+    estimated_points: Optional[int]
+    awarded_points: Optional[int]
     due_date: Optional[datetime]
     completed_at: Optional[datetime]
     created_at: datetime
     updated_at: datetime
 
+class TaskCompleteResponse(BaseModel):
+    task: TaskResponse
+    awarded_points: int
+    total_points: int
+
 class RewardTypeCreate(BaseModel):
     code: str
     name: str
@@ -177,3 +202,29 @@ class TaskTitleAndDate(BaseModel):
 class CompetitionDatesResponse(BaseModel):
     start_date: datetime
     end_date: datetime
+
+class UserImportRow(BaseModel):
+    row: int
+    status: str
+    email: Optional[str] = None
+    user_id: Optional[int] = None
+    error: Optional[str] = None
+
+class UserImportResponse(BaseModel):
+    created: int
+    exists: int
+    duplicate: int
+    invalid: int
+    rows: List[UserImportRow]
+
+class AIUsageResponse(BaseModel):
+    user_id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: str
+    day: date
+    requests: int
+    llm_calls: int
+    tokens: int
+    tokens_per_day: Optional[int] = None
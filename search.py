@@ -0,0 +1,73 @@
+"""
+Поиск задач и пользователей (GET /tasks/search, GET /users/search).
+
+Строка находится, если запрос совпадает по словам с search_vector (tsvector с русской
+морфологией: "задачи" находит "задача") или встречается подстрокой в названии задачи,
+имени, фамилии или email - это покрывает ввод по первым буквам и опечатки в окончаниях.
+Оба условия обслуживаются GIN-индексами (ix_*_search и pg_trgm ix_*_trgm), поэтому
+время запроса не зависит от размера таблиц.
+
+Порядок: сначала ts_rank (совпадения в названии или имени весят больше, чем в описании
+или email), затем сходство триграмм, затем новые строки выше.
+"""
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from database import User, Task
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_tasks(db: Session, columns: list, user_id: int, q: str, limit: int, offset: int):
+    """Задачи пользователя user_id, подходящие под запрос q, в порядке релевантности."""
+    query = func.websearch_to_tsquery("russian", q)
+    pattern = _like_pattern(q)
+    return (
+        db.query(*columns)
+        .filter(
+            Task.user_id == user_id,
+            or_(Task.search_vector.op("@@")(query), Task.title.ilike(pattern)),
+        )
+        .order_by(
+            func.ts_rank(Task.search_vector, query).desc(),
+            func.similarity(Task.title, q).desc(),
+            Task.id.desc(),
+        )
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def search_users(db: Session, columns: list, q: str, limit: int, offset: int, role: str = None):
+    """Пользователи по имени, фамилии или email в порядке релевантности."""
+    query = func.websearch_to_tsquery("russian", q)
+    pattern = _like_pattern(q)
+    filters = [or_(
+        User.search_vector.op("@@")(query),
+        User.first_name.ilike(pattern),
+        User.last_name.ilike(pattern),
+        User.email.ilike(pattern),
+    )]
+    if role is not None:
+        filters.append(User.role == role)
+    return (
+        db.query(*columns)
+        .filter(*filters)
+        .order_by(
+            func.ts_rank(User.search_vector, query).desc(),
+            func.greatest(
+                func.similarity(User.first_name, q),
+                func.similarity(User.last_name, q),
+                func.similarity(User.email, q),
+            ).desc(),
+            User.id.desc(),
+        )
+        .limit(limit)
+        .offset(offset)
+    )
@@ -4,23 +4,39 @@
 Гарантирует, что инициализация БД происходит только один раз до запуска приложения.
 """
 import os
+import shutil
+import logging
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
 if __name__ == "__main__":
     if os.getenv("INIT_DB", "false").lower() == "true":
+        # Тайминги этапов init_db идут в лог: настраивается так же, как в main.py (до uvicorn)
+        logging.basicConfig(
+            level=os.getenv("LOG_LEVEL", "INFO"),
+            format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
         print("Инициализация базы данных...")
         from database import init_db
         init_db()
         print("Инициализация завершена.")
     
+    # Общий каталог метрик для всех воркеров uvicorn (очищается при каждом запуске)
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "gamification_metrics")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
     cmd = [
         "uvicorn",
         "main:app",
         "--host", "0.0.0.0",
         "--port", "8000",
-        "--workers", "6"
+        "--workers", "6",
+        # Потоки лидерборда (SSE) не завершаются сами: без таймаута остановка ждала бы всех зрителей
+        "--timeout-graceful-shutdown", "10"
     ]
     
     os.execvp("uvicorn", cmd)
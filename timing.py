@@ -0,0 +1,46 @@
+"""
+Лёгкие спаны для замера этапов обработки запроса.
+
+    with span("llm_parse"):
+        ai_response = analyze_task_with_commands(...)
+
+Спаны текущего HTTP-запроса попадают в заголовок Server-Timing и в одну
+структурированную JSON-строку лога (логгер "timing"), которые формирует
+MetricsMiddleware. Вне HTTP-запроса span() ничего не записывает.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+class RequestTimings:
+    """Длительности этапов одного HTTP-запроса в порядке завершения."""
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, name: str, seconds: float):
+        self.spans.append((name, seconds))
+
+    def as_dict(self) -> dict:
+        """Этапы в миллисекундах; повторяющиеся этапы суммируются."""
+        result = {}
+        for name, seconds in self.spans:
+            result[name] = round(result.get(name, 0.0) + seconds * 1000, 2)
+        return result
+
+
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Замеряет длительность блока и записывает её в спаны текущего запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings.get()
+        if timings is not None:
+            timings.record(name, time.perf_counter() - started)
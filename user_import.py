@@ -0,0 +1,169 @@
+"""
+Массовое создание пользователей из CSV или NDJSON (POST /admin/users/import).
+
+Тело запроса читается потоком и обрабатывается пачками по IMPORT_CHUNK_ROWS строк:
+    1. каждая строка проверяется схемой UserCreate, повторы email в файле отбрасываются;
+    2. email, уже занятые в базе, отсеиваются одним запросом - на них не тратится bcrypt;
+    3. пароли хэшируются в пуле процессов (bcrypt держит GIL, потоки не помогают);
+    4. пачка вставляется одним INSERT ... ON CONFLICT (email) DO NOTHING RETURNING.
+По каждой строке файла в отчёт попадает результат: created, exists, duplicate или invalid.
+
+CSV - строка заголовка (first_name,last_name,email,password) и одна запись на строку;
+NDJSON - по JSON-объекту с теми же полями на строку.
+"""
+import os
+import csv
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from auth import get_password_hash
+from database import User
+from schemas import UserCreate
+
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "500"))
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", "0")) or os.cpu_count()
+
+IMPORT_FIELDS = ["first_name", "last_name", "email", "password"]
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [get_password_hash(password) for password in passwords]
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=IMPORT_HASH_WORKERS)
+    return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(cancel_futures=True)
+        _hash_pool = None
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """Хэши в исходном порядке; пароли делятся между процессами пула поровну."""
+    if not passwords:
+        return []
+    loop = asyncio.get_running_loop()
+    size = -(-len(passwords) // IMPORT_HASH_WORKERS)
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(_pool(), _hash_passwords, passwords[start:start + size])
+        for start in range(0, len(passwords), size)
+    ))
+    return [hashed for part in parts for hashed in part]
+
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Непустые строки тела запроса по мере поступления."""
+    tail = b""
+    async for chunk in body:
+        tail += chunk
+        *lines, tail = tail.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line.decode("utf-8-sig").rstrip("\r")
+    if tail.strip():
+        yield tail.decode("utf-8-sig").rstrip("\r")
+
+
+def _validation_error(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    field = ".".join(str(part) for part in error["loc"])
+    return f"{field}: {error['msg']}" if field else error["msg"]
+
+
+def _parse_record(line: str, fmt: str, header: Optional[list]):
+    if fmt == "ndjson":
+        record = orjson.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("ожидается JSON-объект")
+        return record
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise ValueError(f"ожидается {len(header)} полей, получено {len(values)}")
+    return dict(zip(header, values))
+
+
+async def _insert_chunk(db: Session, chunk: list, report: list):
+    """Хэширует и вставляет проверенные строки пачки, дописывая результаты в report."""
+    emails = [user.email for _, user in chunk]
+    existing = set(await run_in_threadpool(
+        lambda: [email for (email,) in db.query(User.email).filter(User.email.in_(emails))]
+    ))
+    fresh = [(row, user) for row, user in chunk if user.email not in existing]
+    hashes = await hash_passwords([user.password for _, user in fresh])
+
+    created = {}
+    if fresh:
+        statement = insert(User).values([
+            {"first_name": user.first_name, "last_name": user.last_name, "email": user.email,
+             "password_hash": hashed, "total_points": 0, "role": "user"}
+            for (_, user), hashed in zip(fresh, hashes)
+        ]).on_conflict_do_nothing(index_elements=["email"]).returning(User.id, User.email)
+
+        def execute():
+            rows = db.execute(statement).all()
+            db.commit()
+            return rows
+
+        created = {email: user_id for user_id, email in await run_in_threadpool(execute)}
+
+    for row, user in chunk:
+        if user.email in created:
+            report.append({"row": row, "email": user.email, "status": "created", "user_id": created[user.email]})
+        else:
+            report.append({"row": row, "email": user.email, "status": "exists"})
+
+
+async def import_users(db: Session, body: AsyncIterator[bytes], fmt: str) -> dict:
+    """Импортирует пользователей из потока body; возвращает сводку и отчёт по строкам."""
+    report = []
+    chunk = []
+    seen = set()
+    header = None
+    row = 0
+    async for line in _lines(body):
+        if fmt == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            missing = [name for name in IMPORT_FIELDS if name not in header]
+            if missing:
+                raise ValueError(f"в заголовке CSV нет полей: {', '.join(missing)}")
+            continue
+        row += 1
+        try:
+            user = UserCreate.model_validate(_parse_record(line, fmt, header))
+        except ValidationError as exc:
+            report.append({"row": row, "status": "invalid", "error": _validation_error(exc)})
+            continue
+        except ValueError as exc:
+            report.append({"row": row, "status": "invalid", "error": str(exc)})
+            continue
+        if user.email in seen:
+            report.append({"row": row, "email": user.email, "status": "duplicate"})
+            continue
+        seen.add(user.email)
+        chunk.append((row, user))
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            await _insert_chunk(db, chunk, report)
+            chunk = []
+    if chunk:
+        await _insert_chunk(db, chunk, report)
+
+    report.sort(key=lambda item: item["row"])
+    summary = {status: 0 for status in ("created", "exists", "duplicate", "invalid")}
+    for item in report:
+        summary[item["status"]] += 1
+    return {**summary, "rows": report}